@@ -0,0 +1,3 @@
+"""
+MiniAgent 基准测试与测试辅助工具
+"""
@@ -0,0 +1,67 @@
+"""
+连接复用基准：每次新建客户端 vs 共享客户端注册表（本地模拟服务器）
+
+    python -m benchmarks.bench_client_pool
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+from openai import AsyncOpenAI
+
+from benchmarks.stub_server import FakeOpenAIServer, completion
+from mini_agent.clients import ClientRegistry
+from mini_agent.llm import SimpleLLM
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+async def per_instance_client(base_url: str) -> None:
+    """旧行为：每个 SimpleLLM 自带一个新客户端"""
+    client = AsyncOpenAI(api_key="bench", base_url=base_url)
+    llm = SimpleLLM(api_key="bench", base_url=base_url, client=client)
+    await llm.chat(MESSAGES)
+    await client.close()
+
+
+def shared_registry(registry: ClientRegistry) -> Callable[[str], Awaitable[None]]:
+    """新行为：每次新建 SimpleLLM，但都从同一个注册表借用客户端"""
+    async def run(base_url: str) -> None:
+        llm = SimpleLLM(api_key="bench", base_url=base_url, registry=registry)
+        await llm.chat(MESSAGES)
+    return run
+
+
+async def measure(name: str, request: Callable[[str], Awaitable[None]], total: int, concurrency: int) -> None:
+    async with FakeOpenAIServer(lambda body: completion(content="pong")) as server:
+        latencies: List[float] = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one() -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await request(server.base_url)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(
+            f"{name:<10} | {total / elapsed:>8.0f} req/s | "
+            f"p50 {latencies[len(latencies) // 2] * 1000:>6.2f}ms | "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:>6.2f}ms | "
+            f"连接数 {server.connections:>4}"
+        )
+
+
+async def main(total: int = 500, concurrency: int = 10) -> None:
+    print(f"{total} 个请求，并发 {concurrency}")
+    await measure("每次新建", per_instance_client, total, concurrency)
+    registry = ClientRegistry()
+    await measure("共享注册表", shared_registry(registry), total, concurrency)
+    await registry.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+对冲请求基准：长尾延迟的端点上，对冲前后的延迟分位数和额外请求数
+
+    python -m benchmarks.bench_hedging
+
+两个本地模拟端点的延迟相互独立：大多数请求 20ms，10% 的请求 400ms（长尾）。
+比较只请求主端点、以及主端点超过自身延迟的 p90 分位数后请求备用端点两种方式。
+"""
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.stub_server import FakeOpenAIServer, completion
+from mini_agent.llm import SimpleLLM
+from mini_agent.router import HedgedLLM
+
+
+def long_tail(seed: int) -> Any:
+    rng = random.Random(seed)
+
+    async def handler(request: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(0.4 if rng.random() < 0.1 else 0.02)
+        return completion(content="ok")
+
+    return handler
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def measure(llm: Any, requests: int, concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await llm.chat([{"role": "user", "content": "ping"}])
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+async def run(requests: int = 400, concurrency: int = 8) -> None:
+    async with FakeOpenAIServer(long_tail(1)) as primary, FakeOpenAIServer(long_tail(2)) as backup:
+        cases = [
+            ("只用主端点", SimpleLLM(api_key="bench", base_url=primary.base_url)),
+            ("对冲 (p90)", HedgedLLM(
+                SimpleLLM(api_key="bench", base_url=primary.base_url),
+                SimpleLLM(api_key="bench", base_url=backup.base_url),
+                percentile=0.9, min_samples=20, initial_delay=0.1,
+            )),
+        ]
+        print(f"{'方式':<12} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9} | {'额外请求':>8}")
+        print("-" * 60)
+        for name, llm in cases:
+            latencies = await measure(llm, requests, concurrency)
+            extra = getattr(llm, "hedges", 0) / requests
+            print(
+                f"{name:<12} | {percentile(latencies, 0.5) * 1000:>9.1f} | {percentile(latencies, 0.95) * 1000:>9.1f} | "
+                f"{percentile(latencies, 0.99) * 1000:>9.1f} | {extra:>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
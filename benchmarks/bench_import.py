@@ -0,0 +1,87 @@
+"""
+冷启动导入时间基准：在新进程中用 `python -X importtime` 测量各模块的导入耗时
+
+    python -m benchmarks.bench_import            # 打印各模块的导入耗时
+    python -m benchmarks.bench_import --check    # 超出预算或导入了重量级依赖时返回非零（CI使用）
+
+工作进程、命令行和测试都会启动大量短命的进程，每个进程都要付出导入时间。每个模块测量
+--repeat 次取最小值（冷启动的噪声只会让耗时变长）。除了耗时预算，还检查不需要发送请求的
+模块没有导入 openai / httpx——它们单独就要数百毫秒，是最容易被无意中带回来的依赖。
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+# 模块 -> 导入耗时预算（毫秒），预算按较慢的CI机器留有余量
+BUDGETS: Dict[str, float] = {
+    "mini_agent": 20,
+    "mini_agent.schema": 400,
+    "mini_agent.tools": 500,
+    "mini_agent.agent": 600,
+    "mini_agent.llm": 500,
+}
+
+# 只在第一次发送请求时才应导入的依赖
+HEAVY = ("openai", "httpx")
+
+
+def measure(module: str) -> Tuple[float, Set[str]]:
+    """在新进程中导入模块，返回 (累计导入耗时毫秒, 导入的全部模块名)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    imported: Set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit():
+            continue  # 表头
+        imported.add(name)
+        if name == module:
+            total = int(cumulative) / 1000
+    return total, imported
+
+
+def bench(modules: List[str], repeat: int = 5) -> Dict[str, Tuple[float, Set[str]]]:
+    results: Dict[str, Tuple[float, Set[str]]] = {}
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        results[module] = (min(elapsed for elapsed, _ in runs), runs[0][1])
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="冷启动导入时间基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块测量的次数（取最小值）")
+    parser.add_argument("--check", action="store_true", help="超出预算或导入了重量级依赖时返回非零")
+    args = parser.parse_args(argv)
+
+    results = bench(list(BUDGETS) + list(HEAVY), args.repeat)
+    failures = []
+    print(f"{'模块':<20} | {'导入 (ms)':>10} | {'预算 (ms)':>10} | 重量级依赖")
+    print("-" * 64)
+    for module, (elapsed, imported) in results.items():
+        budget = BUDGETS.get(module)
+        heavy = [name for name in HEAVY if name in imported and not module.startswith(name)]
+        print(f"{module:<20} | {elapsed:>10.1f} | {budget if budget is not None else '-':>10} | {', '.join(heavy) or '-'}")
+        if budget is not None and elapsed > budget:
+            failures.append(f"{module} 导入耗时 {elapsed:.1f}ms 超出预算 {budget}ms")
+        if budget is not None and heavy:
+            failures.append(f"{module} 导入了 {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if args.check and failures:
+        return 1
+    if not failures:
+        print("✅ 全部在预算之内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Memory.get_messages 微基准：历史增长时每一步的序列化开销
+
+    python -m benchmarks.bench_memory
+"""
+import gc
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from mini_agent.schema import Memory, Message
+
+
+def legacy_get_messages(history: List[Message]) -> List[Dict[str, Any]]:
+    """旧实现：每一步都重新遍历整个历史"""
+    result = []
+    for msg in history:
+        message_dict = {"role": msg.role.value}
+        if msg.content:
+            message_dict["content"] = msg.content
+        if msg.tool_calls:
+            message_dict["tool_calls"] = msg.tool_calls
+        if msg.tool_call_id:
+            message_dict["tool_call_id"] = msg.tool_call_id
+        result.append(message_dict)
+    return result
+
+
+def make_step(index: int) -> List[Message]:
+    """一个典型的工具调用步骤：助手消息 + 工具结果"""
+    tool_call = {
+        "id": f"call_{index}",
+        "type": "function",
+        "function": {"name": "bash_execute", "arguments": '{"command": "ls -la"}'},
+    }
+    return [
+        Message.assistant_message(content=f"第 {index} 步", tool_calls=[tool_call]),
+        Message.tool_message(content="x" * 2000, tool_call_id=f"call_{index}"),
+    ]
+
+
+def grow(memory: Memory, history: List[Message], target: int) -> None:
+    """把历史填充到目标长度（旧实现的 Message 列表同步增长）"""
+    step = len(memory)
+    while len(memory) < target:
+        for message in make_step(step):
+            memory.add_message(message)
+            history.append(message)
+        step += 1
+
+
+Builder = Callable[[Memory, List[Message]], Any]
+
+
+def time_steps(memory: Memory, history: List[Message], build: Builder, samples: int) -> float:
+    """模拟若干步：每步追加一轮消息并构建请求，返回平均每步耗时（秒）"""
+    step = len(memory)
+    start = time.perf_counter()
+    for offset in range(samples):
+        for message in make_step(step + offset):
+            memory.add_message(message)
+            history.append(message)
+        build(memory, history)
+    return (time.perf_counter() - start) / samples
+
+
+def bench(checkpoints: List[int], samples: int = 50) -> None:
+    builders: List[Tuple[str, Builder]] = [
+        ("旧实现", lambda memory, history: legacy_get_messages(history)),
+        ("增量缓存", lambda memory, history: memory.get_messages()),
+        ("JSON字节", lambda memory, history: memory.get_messages_json()),
+    ]
+    header = " | ".join(f"{name + ' (µs/步)':>14}" for name, _ in builders)
+    print(f"{'历史消息数':>8} | {header}")
+    print("-" * (12 + 17 * len(builders)))
+
+    for target in checkpoints:
+        row = []
+        for _, build in builders:
+            memory = Memory()
+            history = [Message.user_message("基准测试任务")]
+            memory.add_message(history[0])
+            grow(memory, history, target)
+            build(memory, history)  # 预热缓存
+            row.append(time_steps(memory, history, build, samples))
+        cells = " | ".join(f"{cost * 1e6:>14.1f}" for cost in row)
+        print(f"{target:>10} | {cells}")
+
+
+if __name__ == "__main__":
+    # 关闭GC，避免大历史下的回收停顿混入测量
+    gc.disable()
+    bench([100, 1000, 2000, 5000, 10000])
@@ -0,0 +1,97 @@
+"""
+消息存储微基准：每条消息占用的内存和追加耗时
+
+    python -m benchmarks.bench_message_store
+
+旧实现为每条消息保留一个经过校验的 pydantic Message，外加一份API格式字典缓存；
+新实现只保留API格式字典，框架内部的消息通过 Memory.add() 写入，不再经过校验。
+"""
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from mini_agent.schema import Memory, Message, Role
+from mini_agent.tokens import count_message_tokens
+
+
+class LegacyMemory:
+    """旧的存储方式：Message 列表 + API格式缓存 + token数列表"""
+
+    def __init__(self) -> None:
+        self.messages: List[Message] = []
+        self._wire: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+
+    def add_message(self, message: Message) -> None:
+        self.messages.append(message)
+        message_dict = message.to_dict()
+        self._wire.append(message_dict)
+        self._tokens.append(count_message_tokens(message_dict))
+
+
+def step_payload(index: int) -> Tuple[str, Dict[str, Any], str, str]:
+    """一个典型步骤的数据：助手文本、工具调用、工具结果、调用ID"""
+    call_id = f"call_{index}"
+    tool_call = {
+        "id": call_id,
+        "type": "function",
+        "function": {"name": "file_editor", "arguments": '{"action": "read", "path": "a.txt"}'},
+    }
+    return f"第 {index} 步", tool_call, f"结果 {index}", call_id
+
+
+def fill_legacy(store: LegacyMemory, steps: int) -> None:
+    for index in range(steps):
+        content, tool_call, output, call_id = step_payload(index)
+        store.add_message(Message.assistant_message(content=content, tool_calls=[tool_call]))
+        store.add_message(Message.tool_message(content=output, tool_call_id=call_id))
+
+
+def fill_compact(store: Memory, steps: int) -> None:
+    for index in range(steps):
+        content, tool_call, output, call_id = step_payload(index)
+        store.add(Role.ASSISTANT, content=content, tool_calls=[tool_call])
+        store.add(Role.TOOL, content=output, tool_call_id=call_id)
+
+
+def fill_payload_only(store: List[Any], steps: int) -> None:
+    """只保留消息数据本身，作为两种存储共同的下限"""
+    for index in range(steps):
+        store.append(step_payload(index))
+
+
+def measure(make: Callable[[], Any], fill: Callable[[Any, int], None], steps: int) -> Tuple[float, float]:
+    """返回 (每条消息的内存字节数, 每条消息的追加耗时秒数)"""
+    gc.collect()
+    tracemalloc.start()
+    store = make()
+    fill(store, steps)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+
+    gc.collect()
+    store = make()
+    start = time.perf_counter()
+    fill(store, steps)
+    elapsed = time.perf_counter() - start
+    return size / (steps * 2), elapsed / (steps * 2)
+
+
+def bench(steps: int = 20000) -> None:
+    payload_bytes, _ = measure(list, fill_payload_only, steps)
+    cases = [
+        ("旧实现 (Message)", LegacyMemory, fill_legacy),
+        ("紧凑存储 (add)", Memory, fill_compact),
+    ]
+    print(f"{steps * 2} 条消息，消息数据本身约 {payload_bytes:.0f} 字节/条")
+    print(f"{'存储':<18} | {'内存 (字节/条)':>14} | {'存储开销 (字节/条)':>18} | {'追加 (µs/条)':>12}")
+    print("-" * 74)
+    for name, make, fill in cases:
+        size, cost = measure(make, fill, steps)
+        print(f"{name:<18} | {size:>14.0f} | {size - payload_bytes:>18.0f} | {cost * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    bench()
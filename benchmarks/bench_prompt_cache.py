@@ -0,0 +1,50 @@
+"""
+请求前缀稳定性基准：长任务超出上下文预算后，每次请求有多少前缀与上一次相同
+
+    python -m benchmarks.bench_prompt_cache
+
+服务端的提示缓存按前缀命中，表中“稳定前缀”是每次请求中与上一次请求相同的前缀token
+占全部提示token的比例，可以看作提示缓存命中率的上限。headroom=0 时策略每一步只淘汰
+刚好够用的部分，几乎每一步都改写前缀；默认余量下淘汰一次之后的几步只在末尾追加。
+"""
+import asyncio
+import time
+from typing import Tuple
+
+from mini_agent.context import ContextManager, SlidingWindowPolicy, TruncateToolOutputPolicy
+from mini_agent.schema import Memory, Message
+from mini_agent.tokens import count_messages_tokens
+
+
+async def replay(headroom: float, steps: int, max_tokens: int) -> Tuple[float, int, float]:
+    """返回 (稳定前缀比例, 提示token总数, 每次构建耗时)"""
+    manager = ContextManager(max_tokens=max_tokens, reserve_tokens=1000, policies=[
+        TruncateToolOutputPolicy(headroom=headroom), SlidingWindowPolicy(headroom=headroom)])
+    memory = Memory()
+    memory.add_message(Message.user_message("分析服务日志并定位错误"))
+    stable = total = 0
+    elapsed = 0.0
+    for index in range(steps):
+        call = {"id": f"call_{index}", "type": "function",
+                "function": {"name": "bash_execute", "arguments": f'{{"command": "tail -n 200 app.log.{index}"}}'}}
+        memory.add_message(Message.assistant_message(content=f"查看第{index}个日志文件", tool_calls=[call]))
+        memory.add_message(Message.tool_message(content=f"{index} INFO request handled\n" * (40 + index % 7 * 20),
+                                                tool_call_id=call["id"]))
+        start = time.perf_counter()
+        window = await manager.build(memory)
+        elapsed += time.perf_counter() - start
+        stable += count_messages_tokens(window[:manager.stable_prefix])
+        total += count_messages_tokens(window)
+    return stable / total, total, elapsed / steps
+
+
+def bench(steps: int = 200, max_tokens: int = 16000) -> None:
+    print(f"{'headroom':<10} | {'稳定前缀':>8} | {'提示token':>10} | {'构建 (µs)':>10}")
+    print("-" * 50)
+    for headroom in (0.0, 0.1, 0.2, 0.3):
+        ratio, total, per_build = asyncio.run(replay(headroom, steps, max_tokens))
+        print(f"{headroom:<10} | {ratio:>8.0%} | {total:>11} | {per_build * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,81 @@
+"""
+工具结果落盘存储基准：工具密集的运行中每一步发送给模型的请求大小
+
+    python -m benchmarks.bench_result_store
+
+用脚本化的模拟LLM反复读取大文件和执行输出很多的命令，比较不落盘（结果原样写入记忆）
+和落盘（记忆中只保留预览）时每次请求的消息字节数。
+"""
+import asyncio
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_llm import ScriptedLLM, Turn
+from mini_agent.agent import MiniAgent
+from mini_agent.context import ContextManager
+from mini_agent.events import EventBus, NullSink
+from mini_agent.llm import LLMResponse
+from mini_agent.results import ResultStore
+
+
+class MeasuringLLM(ScriptedLLM):
+    """记录每次请求的消息字节数"""
+
+    def __init__(self, turns: List[Turn], **kwargs: Any):
+        super().__init__(turns, **kwargs)
+        self.request_bytes: List[int] = []
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> LLMResponse:
+        self.request_bytes.append(len(json.dumps(messages, ensure_ascii=False).encode("utf-8")))
+        return await super().chat(messages, system_prompt, tools)
+
+
+def script(workdir: str, steps: int) -> List[Turn]:
+    path = os.path.join(workdir, "big.log")
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(3000):
+            f.write(f"{index:05d} INFO request handled in {index % 97} ms\n")
+    turns: List[Turn] = []
+    for index in range(steps):
+        if index % 2:
+            turns.append({"tool_calls": [{"name": "bash_execute", "arguments": {"command": f"seq 1 {8000 + index}"}}]})
+        else:
+            turns.append({"tool_calls": [{"name": "file_editor", "arguments": {"action": "read", "path": path}}]})
+    return turns
+
+
+async def run(turns: List[Turn], store: ResultStore) -> List[int]:
+    llm = MeasuringLLM(turns)
+    # 上下文窗口足够大，只比较落盘本身的效果
+    agent = MiniAgent(
+        llm, max_steps=len(turns) + 1, events=EventBus([NullSink()]),
+        context_manager=ContextManager(max_tokens=10_000_000), result_store=store,
+    )
+    await agent.run("分析日志")
+    await agent.tools.close()
+    return llm.request_bytes
+
+
+def bench(steps: int = 20) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        turns = script(workdir, steps)
+        verbatim = asyncio.run(run(turns, ResultStore(os.path.join(workdir, "off"), threshold=None)))
+        store = ResultStore(os.path.join(workdir, "results"))
+        spilled = asyncio.run(run(turns, store))
+
+    print(f"{'方式':<10} | {'最后一次请求 (KB)':>16} | {'全部请求合计 (KB)':>16}")
+    print("-" * 50)
+    for name, sizes in (("原样写入", verbatim), ("落盘+预览", spilled)):
+        print(f"{name:<12} | {sizes[-1] / 1024:>16.1f} | {sum(sizes) / 1024:>16.1f}")
+    print(f"\n落盘 {store.spilled} 个结果，请求总量减少到 {sum(spilled) / sum(verbatim):.1%}")
+
+
+if __name__ == "__main__":
+    bench()
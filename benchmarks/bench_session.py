@@ -0,0 +1,95 @@
+"""
+会话恢复微基准：长会话的恢复耗时
+
+    python -m benchmarks.bench_session
+
+比较三种恢复方式：读取索引 + 尾部、没有索引时全量扫描日志、逐条校验重放（相当于把
+每条消息重新构造成 Message 再加入记忆）。
+"""
+import asyncio
+import os
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from mini_agent import fastjson
+from mini_agent.schema import Memory, Message, Role
+from mini_agent.session import SessionLog
+
+
+def fill(memory: Memory, steps: int) -> None:
+    memory.add(Role.USER, content="长任务")
+    for index in range(steps):
+        call = {"id": f"call_{index}", "type": "function",
+                "function": {"name": "file_editor", "arguments": '{"action": "read", "path": "a.txt"}'}}
+        memory.add(Role.ASSISTANT, content=f"第 {index} 步", tool_calls=[call])
+        memory.add(Role.TOOL, content=f"结果 {index} " + "x" * 500, tool_call_id=f"call_{index}")
+
+
+async def write_session(path: str, steps: int, checkpoint_every: int, compress: bool) -> Memory:
+    """按步写入会话日志，每 checkpoint_every 步一个检查点"""
+    source = Memory()
+    fill(source, steps)
+    messages = source.get_messages()
+    memory = Memory()
+    session = SessionLog(path, sync="never", compress=compress)
+    for start in range(0, len(messages), checkpoint_every * 2):
+        for message in messages[start:start + checkpoint_every * 2]:
+            memory.add(message["role"], message.get("content"), message.get("tool_calls"), message.get("tool_call_id"))
+        await session.checkpoint(memory, start // 2, "running")
+    session.close()
+    return memory
+
+
+def restore_indexed(path: str) -> Memory:
+    memory = Memory()
+    SessionLog(path).restore(memory)
+    return memory
+
+
+def restore_full_scan(path: str) -> Memory:
+    if os.path.exists(path + ".idx"):
+        os.remove(path + ".idx")
+    return restore_indexed(path)
+
+
+def replay_validated(messages_path: str) -> Memory:
+    """逐条校验重放：每条消息都重新构造 Message 并计算token数"""
+    memory = Memory()
+    with open(messages_path, "rb") as f:
+        for line in f:
+            memory.add_message(Message(**fastjson.loads(line)))
+    return memory
+
+
+def timed(fn: Callable[[], Memory]) -> Tuple[float, Memory]:
+    start = time.perf_counter()
+    memory = fn()
+    return time.perf_counter() - start, memory
+
+
+def bench(steps_list: List[int], compress: bool = False) -> None:
+    print(f"{'消息数':>8} | {'索引+尾部 (ms)':>14} | {'全量扫描 (ms)':>14} | {'校验重放 (ms)':>14} | {'日志大小 (MB)':>12}")
+    print("-" * 78)
+    for steps in steps_list:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "session.log")
+            expected = asyncio.run(write_session(path, steps, checkpoint_every=1, compress=compress))
+            messages_path = os.path.join(workdir, "messages.jsonl")
+            with open(messages_path, "wb") as f:
+                f.write(b"".join(fastjson.dumps(message) + b"\n" for message in expected.get_messages()))
+            size_mb = os.path.getsize(path) / 1024 / 1024
+
+            indexed, memory = timed(lambda: restore_indexed(path))
+            assert memory.get_messages() == expected.get_messages()
+            full, memory = timed(lambda: restore_full_scan(path))
+            assert memory.get_total_tokens() == expected.get_total_tokens()
+            replay, _ = timed(lambda: replay_validated(messages_path))
+            print(
+                f"{len(expected):>10} | {indexed * 1e3:>14.1f} | {full * 1e3:>14.1f} | "
+                f"{replay * 1e3:>14.1f} | {size_mb:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    bench([1000, 10000, 50000])
@@ -0,0 +1,106 @@
+"""
+只读工具调用的结果缓存和提前执行基准
+
+    python -m benchmarks.bench_tool_memo
+
+1. 缓存：模拟LLM反复列目录、搜索同一个大文件（代理经常重复同样的只读操作），比较
+   关闭缓存（memo_size=0）和开启缓存时工具执行的总耗时。
+2. 提前执行：本地模拟服务器流式返回多个只读工具调用，比较整轮响应结束后才执行和
+   参数完整后立即执行时每次运行的耗时。
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_llm import ScriptedLLM, Turn
+from benchmarks.stub_server import FakeOpenAIServer, stream_chunks
+from mini_agent.agent import MiniAgent
+from mini_agent.context import ContextManager
+from mini_agent.events import EventBus, NullSink
+from mini_agent.llm import SimpleLLM
+from mini_agent.tools import ToolCollection
+
+
+def write_log(workdir: str, lines: int) -> str:
+    path = os.path.join(workdir, "app.log")
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(lines):
+            level = "ERROR" if index % 997 == 0 else "INFO"
+            f.write(f"{index:07d} {level} request handled in {index % 97} ms\n")
+    return path
+
+
+async def run_memo(turns: List[Turn], memo_size: int) -> float:
+    tools = ToolCollection(memo_size=memo_size)
+    agent = MiniAgent(
+        ScriptedLLM(turns), max_steps=len(turns) + 1, tools=tools, events=EventBus([NullSink()]),
+        context_manager=ContextManager(max_tokens=10_000_000),
+    )
+    start = time.perf_counter()
+    await agent.run("排查错误")
+    elapsed = time.perf_counter() - start
+    await tools.close()
+    return elapsed
+
+
+async def run_speculative(workdir: str, path: str, speculative: bool, runs: int) -> float:
+    calls = [
+        {"id": f"call_{index}", "type": "function", "function": {
+            "name": "bash_execute" if index % 2 else "file_editor",
+            "arguments": json.dumps(
+                {"command": f"wc -l {path}"} if index % 2
+                else {"action": "grep", "path": path, "pattern": f"ERROR.* {index} ms"}
+            ),
+        }}
+        for index in range(4)
+    ]
+
+    def handler(request: Dict[str, Any]) -> Any:
+        if request["messages"][-1]["role"] == "tool":
+            return stream_chunks(["完成"])
+        return stream_chunks(["先搜索日志"], tool_calls=calls)
+
+    async with FakeOpenAIServer(handler, chunk_delay=0.001) as server:
+        llm = SimpleLLM(api_key="bench", base_url=server.base_url)
+        start = time.perf_counter()
+        for _ in range(runs):
+            # 关闭缓存，只比较提前执行的效果
+            agent = MiniAgent(
+                llm, stream=True, speculative_tools=speculative,
+                tools=ToolCollection(memo_size=0), events=EventBus([NullSink()]),
+            )
+            await agent.run("排查错误")
+            await agent.tools.close()
+        return (time.perf_counter() - start) / runs
+
+
+def bench(steps: int = 30, runs: int = 10) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_log(workdir, 400_000)
+        turns: List[Turn] = []
+        for index in range(steps):
+            if index % 3 == 0:
+                turns.append({"tool_calls": [{"name": "file_editor", "arguments": {"action": "list", "path": workdir}}]})
+            else:
+                turns.append({"tool_calls": [
+                    {"name": "file_editor", "arguments": {"action": "grep", "path": path, "pattern": "ERROR"}},
+                    {"name": "bash_execute", "arguments": {"command": f"wc -l {path}"}},
+                ]})
+
+        print(f"{'缓存':<8} | {'运行耗时 (ms)':>14}")
+        print("-" * 28)
+        for name, memo_size in (("关闭", 0), ("开启", 128)):
+            print(f"{name:<10} | {asyncio.run(run_memo(turns, memo_size)) * 1000:>14.1f}")
+
+        print(f"\n{'提前执行':<8} | {'每次运行 (ms)':>14}")
+        print("-" * 28)
+        for name, speculative in (("关闭", False), ("开启", True)):
+            elapsed = asyncio.run(run_speculative(workdir, path, speculative, runs))
+            print(f"{name:<10} | {elapsed * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,39 @@
+"""
+工具注册表微基准：每次思考获取工具定义、每次调用解析参数的开销
+
+    python -m benchmarks.bench_tool_registry
+"""
+import json
+import time
+from typing import Callable
+
+from mini_agent.tools import ResultReader, ToolCollection
+
+
+def per_call(fn: Callable[[], object], iterations: int) -> float:
+    """平均每次调用耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def bench(iterations: int = 100000) -> None:
+    tools = ToolCollection()
+    tools.register_tool(ResultReader())
+    arguments = json.dumps({"action": "read", "path": "logs/app.log", "start_line": 1200, "max_lines": 200})
+
+    cases = [
+        ("工具定义: 每次重建", lambda: [tool.to_function_def() for tool in tools.tools.values()]),
+        ("工具定义: 缓存", tools.get_tool_definitions),
+        ("参数: json.loads", lambda: json.loads(arguments)),
+        ("参数: 解析+校验", lambda: tools.parse_arguments("file_editor", arguments)),
+    ]
+    print(f"{'操作':<20} | {'每次耗时 (µs)':>14}")
+    print("-" * 38)
+    for name, fn in cases:
+        print(f"{name:<20} | {per_call(fn, iterations) * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,47 @@
+"""
+追踪开销微基准：关闭追踪时每个 Span 的成本应接近于零
+
+    python -m benchmarks.bench_tracing
+"""
+import time
+from typing import Callable
+
+from mini_agent.tracing import InMemoryExporter, NoopTracer, Tracer
+
+
+def per_call(fn: Callable[[], None], iterations: int) -> float:
+    """平均每次调用耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def nested_spans(tracer: Tracer) -> Callable[[], None]:
+    """模拟一步：step > think > llm.chat 三层嵌套，每层设置一个属性"""
+    def step() -> None:
+        with tracer.span("agent.step", step=1):
+            with tracer.span("agent.think") as think:
+                with tracer.span("llm.chat", model="stub") as chat:
+                    chat.set_attribute("prompt_tokens", 100)
+                think.set_attribute("tool_calls", 1)
+    return step
+
+
+def bench(iterations: int = 100000) -> None:
+    baseline = per_call(lambda: None, iterations)
+    exporter = InMemoryExporter()
+    cases = [
+        ("关闭 (NoopTracer)", NoopTracer()),
+        ("开启 (内存导出)", Tracer([exporter])),
+    ]
+    print(f"{'追踪器':<20} | {'每步耗时 (µs)':>14} | {'每个Span (µs)':>14}")
+    print("-" * 56)
+    for name, tracer in cases:
+        cost = per_call(nested_spans(tracer), iterations) - baseline
+        exporter.clear()
+        print(f"{name:<20} | {cost * 1e6:>14.2f} | {cost / 3 * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,79 @@
+"""
+多进程吞吐量基准：工作进程数从 1 增加到CPU核心数时每秒完成的任务数
+
+    python -m benchmarks.bench_workers
+    python -m benchmarks.bench_workers --tasks 400 --workers 1 2 4 8
+
+模拟LLM每次调用除了等待（网络延迟）还占用一段CPU时间，代表响应解析、上下文组装和
+代理编排在进程内的开销。单个进程中这部分开销受 GIL 限制只能用一个核心，吞吐量在
+核心数以内应随工作进程数近似线性增长。
+"""
+import argparse
+import os
+import tempfile
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_llm import ScriptedLLM
+from mini_agent.batch import BatchTask
+from mini_agent.events import EventBus, NullSink
+from mini_agent.llm import LLMResponse
+from mini_agent.taskqueue import TaskQueue
+from mini_agent.workers import Supervisor
+
+TURNS = [
+    {"tool_calls": [{"name": "file_editor", "arguments": {"action": "list", "path": "."}}]},
+    {"tool_calls": [{"name": "bash_execute", "arguments": {"command": "echo ok"}}]},
+]
+
+
+class BusyLLM(ScriptedLLM):
+    """每次调用先占用 cpu 秒的CPU时间，再按 latency 等待"""
+
+    def __init__(self, turns: List[Dict[str, Any]], cpu: float = 0.01, **kwargs: Any):
+        super().__init__(turns, **kwargs)
+        self.cpu = cpu
+
+    async def chat(self, messages: List[Dict[str, Any]], *args: Any, **kwargs: Any) -> LLMResponse:
+        deadline = time.process_time() + self.cpu
+        while time.process_time() < deadline:
+            pass
+        return await super().chat(messages, *args, **kwargs)
+
+
+def bench(tasks: int, workers: int, cpu: float, latency: float, concurrency: int) -> float:
+    """返回每秒完成的任务数"""
+    path = os.path.join(tempfile.mkdtemp(), "queue.db")
+    TaskQueue(path).put(BatchTask(id=str(index), task=f"任务 {index}") for index in range(tasks))
+    supervisor = Supervisor(
+        path, partial(BusyLLM, TURNS, cpu=cpu, latency=latency),
+        workers=workers, concurrency=concurrency, poll_interval=0.05, events=EventBus([NullSink()]),
+    )
+    stats = supervisor.run()
+    assert stats.done == tasks, stats
+    return stats.processed / stats.elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="多进程吞吐量基准")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, cores} & set(range(1, cores + 1))))
+    parser.add_argument("--cpu", type=float, default=0.01, help="每次LLM调用占用的CPU时间（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次LLM调用的等待时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个工作进程同时执行的任务数")
+    args = parser.parse_args(argv)
+
+    print(f"CPU核心数: {cores}，任务数: {args.tasks}")
+    print(f"{'工作进程':>8} | {'任务/秒':>8} | {'加速比':>6}")
+    print("-" * 32)
+    baseline = None
+    for workers in args.workers:
+        throughput = bench(args.tasks, workers, args.cpu, args.latency, args.concurrency)
+        baseline = baseline or throughput
+        print(f"{workers:>8} | {throughput:>8.1f} | {throughput / baseline:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+可编排的模拟LLM：按脚本回放工具调用轨迹，延迟可配置且可复现
+"""
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+from mini_agent.llm import LLMResponse
+
+# 一轮回复: {"content": "...", "tool_calls": [{"name": "file_editor", "arguments": {...}}]}
+Turn = Dict[str, Any]
+
+
+class ScriptedLLM:
+    """按脚本回放的LLM
+
+    回放进度编码在工具调用ID中（call_<轮次>_<序号>），根据请求里最近一次工具调用决定
+    下一轮，即使上下文管理淘汰了早期消息也不会错位。因此同一个实例可以被任意多个代理
+    并发使用，每个代理都从头回放同一条轨迹；脚本用完后返回 final_answer。
+
+    Args:
+        turns: 轨迹，每轮一个回复
+        latency: 每次调用的平均延迟（秒）
+        jitter: 延迟的随机浮动比例，0 表示固定延迟
+        seed: 随机种子，保证延迟序列可复现
+        final_answer: 脚本用完后的最终回答
+    """
+
+    def __init__(
+        self,
+        turns: List[Turn],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        final_answer: str = "任务完成",
+        model: str = "scripted",
+    ):
+        self.turns = turns
+        self.latency = latency
+        self.jitter = jitter
+        self.final_answer = final_answer
+        self.model = model
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "ScriptedLLM":
+        """从JSON文件加载录制的轨迹（一个 Turn 列表）"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> LLMResponse:
+        self.calls += 1
+        delay = self.latency * (1 + self.jitter * self._random.uniform(-1, 1))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        index = self._next_turn(messages)
+        if index >= len(self.turns):
+            return LLMResponse(content=self.final_answer)
+
+        turn = self.turns[index]
+        tool_calls = [
+            {
+                "id": f"call_{index}_{position}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["arguments"], ensure_ascii=False)},
+            }
+            for position, call in enumerate(turn.get("tool_calls", []))
+        ]
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 3
+        return LLMResponse(
+            content=turn.get("content"),
+            tool_calls=tool_calls or None,
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": 20, "total_tokens": prompt_tokens + 20},
+        )
+
+    @staticmethod
+    def _next_turn(messages: List[Dict[str, Any]]) -> int:
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                return 0
+            for tool_call in message.get("tool_calls") or []:
+                parts = tool_call["id"].split("_")
+                if len(parts) == 3 and parts[0] == "call" and parts[1].isdigit():
+                    return int(parts[1]) + 1
+        return 0
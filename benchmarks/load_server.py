@@ -0,0 +1,194 @@
+"""
+多会话服务器的压力测试：大量客户端同时创建会话并流式执行任务
+
+    python -m benchmarks.load_server                          # 在进程内启动服务器（模拟LLM）
+    python -m benchmarks.load_server --sessions 500 --runs 3
+    python -m benchmarks.load_server --connect 127.0.0.1:8765 # 压测已经启动的服务器
+
+每个客户端使用一个 keep-alive 连接：创建会话，依次执行 --runs 个任务并读取全部事件，
+最后删除会话。报告任务延迟分位数、吞吐量、收到的事件数、被拒绝的请求数（429/503）
+以及进程的峰值内存。
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_llm import ScriptedLLM, Turn
+from mini_agent import fastjson
+from mini_agent.events import EventBus, NullSink
+from mini_agent.server import AgentServer
+
+
+class HTTPClient:
+    """极简的 keep-alive HTTP/1.1 客户端，支持分块传输的NDJSON响应"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None) -> "HTTPClient":
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(
+        self, method: str, path: str, body: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, Dict[str, str], List[Dict[str, Any]]]:
+        """发送请求，返回 (状态码, 响应头, JSON对象列表)；NDJSON响应每行一个对象"""
+        data = fastjson.dumps(body) if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                parts.append(chunk[:-2])
+            payload = b"".join(parts)
+        else:
+            payload = await self.reader.readexactly(int(headers.get("content-length", "0")))
+        return status, headers, [fastjson.loads(line) for line in payload.splitlines() if line.strip()]
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, AttributeError):
+            pass
+
+
+def script(steps: int) -> List[Turn]:
+    """每步写一个文件再列出工作目录（相对路径，落在会话自己的目录中）"""
+    turns: List[Turn] = []
+    for index in range(steps):
+        turns.append({"tool_calls": [
+            {"name": "file_editor", "arguments": {"action": "append", "path": "notes.txt", "content": f"step {index}\n"}},
+            {"name": "file_editor", "arguments": {"action": "list", "path": "."}},
+        ]})
+    return turns
+
+
+async def create_session(http: HTTPClient, counters: Dict[str, int]) -> str:
+    status, headers, body = await http.request("POST", "/sessions", {})
+    while status == 503:
+        counters["rejected"] += 1
+        await asyncio.sleep(float(headers.get("retry-after", "0.1")))
+        status, headers, body = await http.request("POST", "/sessions", {})
+    return body[0]["id"]
+
+
+async def client(
+    address: Dict[str, Any], runs: int, latencies: List[float], counters: Dict[str, int]
+) -> None:
+    http = await HTTPClient.connect(**address)
+    try:
+        session_id = await create_session(http, counters)
+        done = 0
+        while done < runs:
+            start = time.perf_counter()
+            status, headers, events = await http.request("POST", f"/sessions/{session_id}/run", {"task": "整理笔记"})
+            if status == 429:
+                counters["rejected"] += 1
+                await asyncio.sleep(float(headers.get("retry-after", "0.1")))
+                continue
+            if status == 404:
+                # 会话数达到上限时空闲会话会被淘汰（没有会话日志时不可恢复），重新创建
+                counters["evicted"] += 1
+                session_id = await create_session(http, counters)
+                continue
+            latencies.append(time.perf_counter() - start)
+            counters["events"] += len(events) - 1
+            counters["failed" if status != 200 or "error" in events[-1] else "completed"] += 1
+            done += 1
+        await http.request("DELETE", f"/sessions/{session_id}")
+    finally:
+        await http.close()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def run(args: argparse.Namespace) -> None:
+    server: Optional[AgentServer] = None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        address: Dict[str, Any] = {"host": host or "127.0.0.1", "port": int(port)}
+    else:
+        llm = ScriptedLLM(script(args.steps), latency=args.latency, jitter=0.5, seed=3)
+        server = AgentServer(
+            llm,
+            max_sessions=args.max_sessions,
+            max_active_runs=args.max_active_runs,
+            max_queued_runs=args.max_queued_runs,
+            events=EventBus([NullSink()]),
+            agent_kwargs={"max_steps": args.steps + 1},
+        )
+        await server.start()
+        address = {"host": server.address[0], "port": server.address[1]}
+
+    latencies: List[float] = []
+    counters = {"completed": 0, "failed": 0, "rejected": 0, "evicted": 0, "events": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(address, args.runs, latencies, counters) for _ in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        stats = server.stats
+        await server.close()
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    print(f"会话: {args.sessions}  每个会话任务数: {args.runs}  每个任务步数: {args.steps}  LLM延迟: {args.latency * 1000:.0f}ms")
+    print(
+        f"完成: {counters['completed']}  失败: {counters['failed']}  "
+        f"被拒绝(429/503): {counters['rejected']}  会话被淘汰: {counters['evicted']}"
+    )
+    print(f"耗时: {elapsed:.2f}s  吞吐: {counters['completed'] / elapsed:.1f} 任务/秒  收到事件: {counters['events']}")
+    print(
+        f"任务延迟: p50 {percentile(latencies, 0.5) * 1000:.0f}ms  p95 {percentile(latencies, 0.95) * 1000:.0f}ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f}ms"
+    )
+    print(f"峰值内存: {peak_kb / 1024:.1f} MB (pid {os.getpid()})")
+    if server is not None:
+        print(f"服务器: 创建 {stats.created}  淘汰 {stats.evicted}  拒绝 {stats.rejected}  丢弃事件 {stats.dropped_events}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="多会话服务器压力测试")
+    parser.add_argument("--sessions", type=int, default=200, help="并发的客户端（会话）数")
+    parser.add_argument("--runs", type=int, default=2, help="每个会话执行的任务数")
+    parser.add_argument("--steps", type=int, default=4, help="每个任务的工具调用轮数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟LLM的平均延迟（秒）")
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--max-active-runs", type=int, default=64)
+    parser.add_argument("--max-queued-runs", type=int, default=256)
+    parser.add_argument("--connect", default=None, help="压测已启动的服务器 host:port，不在进程内启动")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,183 @@
+"""
+本地模拟的 OpenAI 兼容服务器，用于测试和基准测试（无需网络）
+"""
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+# 处理函数: 请求体 -> 完整响应(dict) 或 流式分片列表(list)，也可以是返回它们的协程
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+def completion(
+    content: Optional[str] = None,
+    tool_calls: Optional[List[Dict[str, Any]]] = None,
+    model: str = "stub-model",
+    usage: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """构造非流式的 chat.completion 响应"""
+    message: Dict[str, Any] = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+        }],
+        "usage": usage or {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, model: str = "stub-model") -> Dict[str, Any]:
+    """构造一个流式 chat.completion.chunk"""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def stream_chunks(
+    content_parts: Optional[List[str]] = None,
+    tool_calls: Optional[List[Dict[str, Any]]] = None,
+    fragment_size: int = 8,
+    usage: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """把文本和工具调用拆成流式分片，工具参数按 fragment_size 切碎
+
+    指定 usage 时追加一个 choices 为空、只带用量的分片（同 stream_options.include_usage）。
+    """
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    for part in content_parts or []:
+        chunks.append(chunk({"content": part}))
+    for index, tool_call in enumerate(tool_calls or []):
+        arguments = tool_call["function"]["arguments"]
+        chunks.append(chunk({"tool_calls": [{
+            "index": index,
+            "id": tool_call["id"],
+            "type": "function",
+            "function": {"name": tool_call["function"]["name"], "arguments": ""},
+        }]}))
+        for start in range(0, len(arguments), fragment_size):
+            chunks.append(chunk({"tool_calls": [{
+                "index": index,
+                "function": {"arguments": arguments[start:start + fragment_size]},
+            }]}))
+    chunks.append(chunk({}, finish_reason="tool_calls" if tool_calls else "stop"))
+    if usage is not None:
+        chunks.append(dict(chunk({}), choices=[], usage=usage))
+    return chunks
+
+
+class FakeOpenAIServer:
+    """极简的 HTTP/1.1 服务器，模拟 /v1/chat/completions 接口
+
+    支持 keep-alive 和分块传输的 SSE 流式响应，并记录收到的请求和建立的连接数。
+    """
+
+    def __init__(self, handler: Handler, delay: float = 0.0, chunk_delay: float = 0.0):
+        self.handler = handler
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def start(self) -> "FakeOpenAIServer":
+        self._server = await asyncio.start_server(self._handle_connection, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> "FakeOpenAIServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        task = asyncio.current_task()
+        if task is not None:
+            self._handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                payload = json.loads(body) if body else {}
+                self.requests.append(payload)
+
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                result = self.handler(payload)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if isinstance(result, list):
+                    await self._write_stream(writer, result)
+                else:
+                    await self._write_json(writer, result)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _write_json(self, writer: asyncio.StreamWriter, data: Dict[str, Any]) -> None:
+        status = data.pop("_status", 200)
+        extra_headers = data.pop("_headers", {})
+        body = json.dumps(data).encode()
+        head = [
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        head += [f"{key}: {value}" for key, value in extra_headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _write_stream(self, writer: asyncio.StreamWriter, chunks: List[Dict[str, Any]]) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        events = [f"data: {json.dumps(item)}\n\n" for item in chunks] + ["data: [DONE]\n\n"]
+        for event in events:
+            data = event.encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
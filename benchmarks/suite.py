@@ -0,0 +1,252 @@
+"""
+离线基准测试套件：用脚本化的模拟LLM回放工具调用轨迹，测量 MiniAgent.run 的开销
+
+    python -m benchmarks.suite                      # 运行全部场景并与基线比较，退化时退出码为1
+    python -m benchmarks.suite --scenario multi_tool
+    python -m benchmarks.suite --update-baseline    # 重新生成 benchmarks/baseline.json
+
+每个场景在独立的子进程中运行，峰值内存互不影响。不需要网络和API密钥。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fake_llm import ScriptedLLM, Turn
+from mini_agent.agent import MiniAgent
+from mini_agent.events import EventBus, NullSink
+from mini_agent.schema import Message
+from mini_agent.tracing import InMemoryExporter, Span, Tracer
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 场景: 工作目录 -> [(代理, 任务)]
+AgentFactory = Callable[..., MiniAgent]
+Scenario = Callable[[str, AgentFactory], Awaitable[List[Tuple[MiniAgent, str]]]]
+
+
+def read_call(path: str) -> Dict[str, Any]:
+    return {"name": "file_editor", "arguments": {"action": "read", "path": path}}
+
+
+def write_files(directory: str, count: int, size: int) -> List[str]:
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"file_{index}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"line {index}\n" * (size // 8))
+        paths.append(path)
+    return paths
+
+
+async def long_history(workdir: str, make_agent: AgentFactory) -> List[Tuple[MiniAgent, str]]:
+    """很长的历史（3000条消息，超出上下文窗口）上再执行20步"""
+    (path,) = write_files(workdir, 1, 2000)
+    agent = make_agent(ScriptedLLM([{"tool_calls": [read_call(path)]}] * 20))
+    agent.memory.add_message(Message.user_message("之前的任务"))
+    for index in range(1500):
+        call = {"id": f"old_{index}", "type": "function",
+                "function": {"name": "file_editor", "arguments": json.dumps({"action": "read", "path": path})}}
+        agent.memory.add_message(Message.assistant_message(content=f"第 {index} 步", tool_calls=[call]))
+        agent.memory.add_message(Message.tool_message(content=f"结果 {index} " + "x" * 1500, tool_call_id=f"old_{index}"))
+    return [(agent, "继续处理")]
+
+
+async def multi_tool(workdir: str, make_agent: AgentFactory) -> List[Tuple[MiniAgent, str]]:
+    """每轮8个并发的工具调用，共40轮"""
+    paths = write_files(workdir, 8, 4000)
+    turn: Turn = {"content": "同时读取所有文件", "tool_calls": [read_call(path) for path in paths]}
+    return [(make_agent(ScriptedLLM([turn] * 40, latency=0.005, jitter=0.5, seed=1)), "读取全部文件")]
+
+
+async def large_file_read(workdir: str, make_agent: AgentFactory) -> List[Tuple[MiniAgent, str]]:
+    """反复读取一个4MB的文件，共20次"""
+    (path,) = write_files(workdir, 1, 4 * 1024 * 1024)
+    return [(make_agent(ScriptedLLM([{"tool_calls": [read_call(path)]}] * 20)), "分析大文件")]
+
+
+async def concurrent_agents(workdir: str, make_agent: AgentFactory) -> List[Tuple[MiniAgent, str]]:
+    """64个代理并发，各执行8步，LLM延迟约20ms"""
+    turns: List[Turn] = [{"tool_calls": [{"name": "file_editor", "arguments": {"action": "list", "path": workdir}}]}] * 8
+    llm = ScriptedLLM(turns, latency=0.02, jitter=0.5, seed=2)
+    return [(make_agent(llm, name=f"Agent-{index}"), "列出目录") for index in range(64)]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "long_history": long_history,
+    "multi_tool": multi_tool,
+    "large_file_read": large_file_read,
+    "concurrent_agents": concurrent_agents,
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def phase_breakdown(spans: List[Span]) -> Dict[str, float]:
+    """按阶段汇总耗时（毫秒）：上下文构建、LLM、工具执行、其余的框架开销"""
+    totals: Dict[str, float] = {}
+    for span in spans:
+        totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+    think = totals.get("agent.think", 0.0)
+    act = totals.get("agent.act", 0.0)
+    context = totals.get("context.build", 0.0)
+    return {
+        "context_ms": round(context, 2),
+        "llm_ms": round(think - context, 2),
+        "tools_ms": round(act, 2),
+        "overhead_ms": round(totals.get("agent.step", 0.0) - think - act, 2),
+    }
+
+
+async def run_scenario(name: str) -> Dict[str, Any]:
+    """在当前进程中运行一个场景并返回指标"""
+    exporter = InMemoryExporter()
+    tracer = Tracer([exporter])
+    events = EventBus([NullSink()])
+
+    def make_agent(llm: ScriptedLLM, name: str = "BenchAgent") -> MiniAgent:
+        return MiniAgent(llm, name=name, max_steps=100, tracer=tracer, events=events)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = await SCENARIOS[name](workdir, make_agent)
+        start = time.perf_counter()
+        await asyncio.gather(*(agent.run(task) for agent, task in runs))
+        elapsed = time.perf_counter() - start
+        for agent, _ in runs:
+            await agent.tools.close()
+
+    step_ms = [span.duration_ms for span in exporter.find("agent.step")]
+    return {
+        "steps": len(step_ms),
+        "elapsed_s": round(elapsed, 4),
+        "steps_per_sec": round(len(step_ms) / elapsed, 2),
+        "p50_step_ms": round(percentile(step_ms, 0.5), 3),
+        "p99_step_ms": round(percentile(step_ms, 0.99), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "phases": phase_breakdown(exporter.spans),
+    }
+
+
+def run_isolated(name: str) -> Dict[str, Any]:
+    """在子进程中运行场景"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--child", name],
+        cwd=root, capture_output=True, text=True, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"场景 {name} 运行失败:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# 越大越好的指标和越小越好的指标
+HIGHER_IS_BETTER = ("steps_per_sec",)
+LOWER_IS_BETTER = ("p50_step_ms", "p99_step_ms", "peak_rss_mb")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """返回超出容差的退化项"""
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        # 步数由脚本决定，不一致说明代理行为变了
+        if metrics["steps"] != expected["steps"]:
+            regressions.append(f"{name}.steps: {metrics['steps']} != 基线 {expected['steps']}")
+        for key in HIGHER_IS_BETTER:
+            if expected.get(key) and metrics[key] < expected[key] * (1 - tolerance):
+                regressions.append(f"{name}.{key}: {metrics[key]} < 基线 {expected[key]}")
+        for key in LOWER_IS_BETTER:
+            if expected.get(key) and metrics.get(key) and metrics[key] > expected[key] * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {metrics[key]} > 基线 {expected[key]}")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'场景':<18} | {'步数':>5} | {'步/秒':>9} | {'p50(ms)':>8} | {'p99(ms)':>8} | {'峰值内存(MB)':>10} | 阶段耗时(ms)")
+    print("-" * 120)
+    for name, metrics in results.items():
+        phases = " ".join(f"{key[:-3]}={value:.0f}" for key, value in metrics["phases"].items())
+        rss = metrics["peak_rss_mb"]
+        print(
+            f"{name:<18} | {metrics['steps']:>5} | {metrics['steps_per_sec']:>9.1f} | "
+            f"{metrics['p50_step_ms']:>8.2f} | {metrics['p99_step_ms']:>8.2f} | "
+            f"{rss if rss is None else round(rss, 1):>10} | {phases}"
+        )
+        expected = baseline.get(name)
+        if expected:
+            print(
+                f"{'  基线':<18} | {expected['steps']:>5} | {expected['steps_per_sec']:>9.1f} | "
+                f"{expected['p50_step_ms']:>8.2f} | {expected['p99_step_ms']:>8.2f} | "
+                f"{expected.get('peak_rss_mb') or '-':>10} |"
+            )
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["scenarios"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="MiniAgent 离线基准测试")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="只运行指定场景（可重复）")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许的相对退化比例")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_scenario(args.child))))
+        return 0
+
+    names = args.scenario or list(SCENARIOS)
+    results = {name: run_isolated(name) for name in names}
+    baseline = load_baseline(args.baseline)
+    print_report(results, baseline)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "scenarios": {**baseline, **results}},
+                      f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n💾 基线已更新: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ 性能退化超过 {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+    print("\n✅ 没有超出容差的退化" if baseline else "\n⚠️ 没有基线，使用 --update-baseline 生成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
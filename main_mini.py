@@ -2,8 +2,12 @@
 MiniAgent 主运行文件
 """
 import asyncio
+import os
 from mini_agent import MiniAgent
+from mini_agent.events import get_event_bus
 from mini_agent.llm import SimpleLLM
+from mini_agent.schema import AgentState
+from mini_agent.session import SessionLog
 
 
 async def main():
@@ -22,12 +26,24 @@ async def main():
         model="gpt-4o-mini"  # 使用更便宜的模型
     )
     
+    # 设置 MINI_AGENT_SESSION 时把会话保存到该文件，重启后从中恢复
+    session_path = os.getenv("MINI_AGENT_SESSION")
+    session = SessionLog(session_path) if session_path else None
+    
     # 创建代理
     agent = MiniAgent(
         llm=llm,
         name="MiniAgent",
-        max_steps=10
+        max_steps=10,
+        session=session
     )
+    if session is not None and session.snapshot is not None:
+        print(f"💾 已从 {session_path} 恢复 {len(agent.memory)} 条消息")
+        if agent.state == AgentState.RUNNING:
+            print("⏩ 继续上次未完成的任务...")
+            result = await agent.resume()
+            get_event_bus().flush()
+            print(f"\n📋 执行结果:\n{result}")
     
     print("🤖 MiniAgent 已启动!")
     print("💡 该Agent支持以下功能:")
@@ -53,6 +69,7 @@ async def main():
             
             # 执行任务
             result = await agent.run(user_input)
+            get_event_bus().flush()  # 等运行过程输出完再打印结果
             print(f"\n📋 执行结果:\n{result}")
             
         except KeyboardInterrupt:
@@ -60,6 +77,9 @@ async def main():
             break
         except Exception as e:
             print(f"❌ 发生错误: {e}")
+    
+    if session is not None:
+        session.close()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,53 @@
 """
 MiniAgent - 一个轻量级的智能代理框架
+
+包级别的名字按需加载（PEP 562）：`import mini_agent` 不导入任何子模块，
+第一次访问 `mini_agent.MiniAgent` 等属性时才导入对应的模块。
 """
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .agent import MiniAgent
+    from .llm import SimpleLLM
+    from .tools import ToolCollection, PythonExecutor, FileEditor, BashExecutor
+    from .schema import Message, Memory, AgentState
 
-from .agent import MiniAgent
-from .llm import SimpleLLM
-from .tools import ToolCollection, PythonExecutor, FileEditor, BashExecutor
-from .schema import Message, Memory, AgentState
+# 名字 -> 定义它的子模块
+_LAZY = {
+    "MiniAgent": "agent",
+    "SimpleLLM": "llm",
+    "ToolCollection": "tools",
+    "PythonExecutor": "tools",
+    "FileEditor": "tools",
+    "BashExecutor": "tools",
+    "Message": "schema",
+    "Memory": "schema",
+    "AgentState": "schema",
+}
 
 __all__ = [
     "MiniAgent",
-    "SimpleLLM", 
+    "SimpleLLM",
     "ToolCollection",
     "PythonExecutor",
-    "FileEditor", 
+    "FileEditor",
     "BashExecutor",
     "Message",
     "Memory",
     "AgentState"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 之后的访问不再经过 __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
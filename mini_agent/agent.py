@@ -1,32 +1,122 @@
 """
 智能代理核心实现
 """
-import json
-from typing import Optional
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from mini_agent.schema import Message, AgentState, Memory, Role
-from mini_agent.llm import SimpleLLM
-from mini_agent.tools import ToolCollection
+from pydantic import BaseModel
+
+from mini_agent.context import ContextManager
+from mini_agent.deadline import deadline_scope
+from mini_agent.errors import LLMDeadlineError, LLMError
+from mini_agent.events import EventBus, EventType, get_event_bus
+from mini_agent.schema import Message, AgentState, Memory, Role, StopReason
+from mini_agent.llm import LLMResponse, SimpleLLM, UsageStats, close_stream
+from mini_agent.results import ResultStore, get_result_store
+from mini_agent.session import SessionLog
+from mini_agent.tools import RESULT_READER_NAME, ResultReader, ToolCollection, ToolResult
+from mini_agent.tracing import Tracer, get_tracer
+
+
+class RunResult(BaseModel):
+    """一次运行的结果，提前停止时包含已经完成的部分"""
+    stop_reason: StopReason
+    state: AgentState
+    steps: int = 0
+    answer: Optional[str] = None  # 最后一条助手回复的内容，提前停止时不一定是最终回答
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    usage: UsageStats = UsageStats()
+    
+    @property
+    def completed(self) -> bool:
+        return self.stop_reason == StopReason.COMPLETED
 
 
 class MiniAgent:
     """最小化智能代理实现"""
     
+    # 事件中携带的工具输出预览长度，完整输出只写入记忆
+    EVENT_OUTPUT_PREVIEW = 1000
+    
+    # LLM调用和工具调用在截止时间自行停止，超过宽限期仍未结束的步骤被强制取消
+    DEADLINE_GRACE = 0.5
+    
     def __init__(
         self, 
         llm: SimpleLLM,
         name: str = "MiniAgent",
         system_prompt: Optional[str] = None,
-        max_steps: int = 10
+        max_steps: int = 10,
+        parallel_tool_calls: bool = True,
+        max_tool_concurrency: int = 4,
+        stream: bool = False,
+        context_manager: Optional[ContextManager] = None,
+        tools: Optional[ToolCollection] = None,
+        tracer: Optional[Tracer] = None,
+        events: Optional[EventBus] = None,
+        session: Optional[SessionLog] = None,
+        result_store: Optional[ResultStore] = None,
+        speculative_tools: bool = True,
+        run_timeout: Optional[float] = None,
+        step_timeout: Optional[float] = None
     ):
         self.name = name
         self.llm = llm
-        self.tools = ToolCollection()
+        self.tools = tools if tools is not None else ToolCollection()
         self.memory = Memory()
         self.state = AgentState.IDLE
         self.max_steps = max_steps
         self.current_step = 0
         
+        # 本次运行的token用量（含命中提示缓存的token数）
+        self.usage = UsageStats()
+        
+        # 整次运行和每一步的时间预算（秒），None 表示不限制；超出时停止运行，进行中的
+        # LLM请求和工具调用（包括子进程）被取消，result 中记录停止原因和已完成的部分
+        self.run_timeout = run_timeout
+        self.step_timeout = step_timeout
+        self.result: Optional[RunResult] = None
+        self._error: Optional[str] = None
+        
+        # 同一轮多个工具调用的并发执行配置
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_tool_concurrency = max_tool_concurrency
+        
+        # 是否使用流式响应（需要LLM提供 chat_stream）
+        self.stream = stream
+        
+        # 流式响应中参数已完整的只读工具调用立即开始执行，不等整轮响应结束
+        self.speculative_tools = speculative_tools
+        self._speculative: Dict[str, Tuple[Dict[str, Any], "asyncio.Task[ToolResult]"]] = {}
+        self._speculation_open = False
+        
+        # 上下文窗口管理，默认按模型的上下文窗口大小控制请求长度
+        self.context_manager = context_manager or ContextManager(model=getattr(llm, "model", None))
+        
+        # 追踪器：记录每一步、每次思考和每次工具执行的耗时，默认使用全局追踪器（默认关闭）
+        self.tracer = tracer if tracer is not None else get_tracer()
+        
+        # 事件总线：运行过程以事件形式输出，默认使用全局事件总线（输出到控制台）
+        self.events = events if events is not None else get_event_bus()
+        
+        # 超大工具结果落盘存储：记忆中只保留预览和句柄，模型通过 read_result 工具查看完整内容
+        # 设置了会话日志时结果保存在日志旁边，恢复的会话中的句柄依然有效
+        if result_store is None and session is not None:
+            result_store = ResultStore(session.path + ".results")
+        self.result_store = result_store if result_store is not None else get_result_store()
+        if self.result_store.enabled and RESULT_READER_NAME not in self.tools.tools:
+            self.tools.register_tool(ResultReader(self.result_store))
+        
+        # 会话日志：每一步结束时持久化记忆和进度，日志中已有内容时从中恢复
+        self.session = session
+        if session is not None:
+            snapshot = session.restore(self.memory)
+            if snapshot is not None:
+                self.current_step = snapshot.step
+                self.state = AgentState(snapshot.state)
+        
         # 默认系统提示词
         self.system_prompt = system_prompt or """
 你是一个有用的AI助手，可以使用各种工具来帮助用户完成任务。
@@ -39,56 +129,188 @@ class MiniAgent:
 请根据用户的需求，选择合适的工具来完成任务。每次只调用一个工具，然后根据结果决定下一步行动。
 """
     
-    async def run(self, user_input: str) -> str:
-        """执行用户请求"""
-        print(f"\n🚀 {self.name} 开始执行任务: {user_input}")
+    async def run(self, user_input: str, timeout: Optional[float] = None) -> str:
+        """执行用户请求，返回执行摘要，停止原因和最后的回复见 self.result
+        
+        timeout 覆盖 run_timeout。LLM调用最终失败时抛出 LLMError。
+        """
+        self.events.emit(EventType.RUN_STARTED, self.name, task=user_input)
         
         # 初始化
         self.state = AgentState.RUNNING
         self.current_step = 0
+        self.usage = UsageStats()
+        self.tools.clear_memo()
         
         # 添加用户消息到记忆
         self.memory.add_message(Message.user_message(user_input))
+        await self._checkpoint()
         
-        # 执行循环
-        while self.state == AgentState.RUNNING and self.current_step < self.max_steps:
-            self.current_step += 1
-            print(f"\n--- 第 {self.current_step} 步 ---")
-            
-            # Think: 思考下一步行动
-            should_continue = await self.think()
-            if not should_continue:
-                break
+        return await self._run_loop(timeout)
+    
+    async def resume(self, timeout: Optional[float] = None) -> str:
+        """从会话日志恢复后继续未完成的任务（上次运行中断或LLM调用失败时）"""
+        if self.state not in (AgentState.RUNNING, AgentState.ERROR):
+            return self._generate_summary()
+        
+        task = next(
+            (message.get("content") for message in reversed(self.memory.get_messages()) if message["role"] == Role.USER.value),
+            None,
+        )
+        self.events.emit(EventType.RUN_STARTED, self.name, task=task, resumed_from=self.current_step)
+        self.state = AgentState.RUNNING
+        self.usage = UsageStats()
+        self.tools.clear_memo()
+        return await self._run_loop(timeout)
+    
+    async def _run_loop(self, timeout: Optional[float] = None) -> str:
+        start = time.monotonic()
+        run_timeout = timeout if timeout is not None else self.run_timeout
+        run_deadline = start + run_timeout if run_timeout is not None else None
+        stop_reason = StopReason.MAX_STEPS
+        self._error = None
+        
+        with self.tracer.span("agent.run", agent=self.name) as run_span:
+            try:
+                # 执行循环
+                while self.state == AgentState.RUNNING and self.current_step < self.max_steps:
+                    if run_deadline is not None and time.monotonic() >= run_deadline:
+                        stop_reason = StopReason.DEADLINE
+                        break
+                    step_deadline = run_deadline
+                    if self.step_timeout is not None:
+                        step_deadline = min(time.monotonic() + self.step_timeout, run_deadline or float("inf"))
+                    
+                    self.current_step += 1
+                    self.events.emit(EventType.STEP_STARTED, self.name, step=self.current_step)
+                    
+                    with self.tracer.span("agent.step", step=self.current_step) as step_span:
+                        try:
+                            should_continue = await self._step(step_deadline)
+                        except (asyncio.TimeoutError, LLMDeadlineError):
+                            should_continue = True
+                            self._close_pending_tool_calls("超出截止时间，调用已取消")
+                        if should_continue and step_deadline is not None and time.monotonic() >= step_deadline:
+                            # 超时的工具调用已经以错误结果写入记忆，记忆保持完整
+                            step_span.set_attribute("deadline_exceeded", True)
+                            stop_reason = StopReason.DEADLINE if step_deadline == run_deadline else StopReason.STEP_DEADLINE
+                            self.events.emit(
+                                EventType.WARNING, self.name,
+                                message=f"第 {self.current_step} 步超出截止时间 ({stop_reason.value})，停止运行"
+                            )
+                            break
+                    
+                    if not should_continue:
+                        stop_reason = StopReason.ERROR if self.state == AgentState.ERROR else StopReason.COMPLETED
+                        break
+                    await self._checkpoint()
+            except LLMError as e:
+                # 会话日志停在上一步结束时，之后可以 resume()
+                self._finish(StopReason.LLM_ERROR, start, f"{type(e).__name__}: {e}")
+                raise
+            except asyncio.CancelledError:
+                # 记忆中补齐未完成的工具调用，之后可以 resume()
+                self._cancel_speculative()
+                self._close_pending_tool_calls("运行被取消")
+                self._finish(StopReason.CANCELLED, start)
+                raise
             
-            # Act: 执行行动
-            await self.act()
+            self._finish(stop_reason, start, self._error)
+            run_span.set_attribute("steps", self.current_step)
+            run_span.set_attribute("stop_reason", stop_reason.value)
+        await self._checkpoint()
         
-        self.state = AgentState.FINISHED
-        result = self._generate_summary()
-        print(f"\n✅ 任务完成! 总共执行了 {self.current_step} 步")
-        return result
+        summary = self._generate_summary()
+        self.events.emit(
+            EventType.RUN_FINISHED, self.name,
+            steps=self.current_step, state=self.state.value, stop_reason=stop_reason.value, usage=self.usage.model_dump()
+        )
+        return summary
+    
+    async def _step(self, step_deadline: Optional[float]) -> bool:
+        """执行一步（思考 + 行动），返回是否继续"""
+        with deadline_scope(deadline=step_deadline) as effective:
+            if effective is None:
+                return await self._think_and_act()
+            # LLM调用和工具调用自行遵守截止时间；不遵守的LLM或工具在宽限期后被强制取消
+            return await asyncio.wait_for(self._think_and_act(), effective - time.monotonic() + self.DEADLINE_GRACE)
+    
+    async def _think_and_act(self) -> bool:
+        # Think: 思考下一步行动
+        if not await self.think():
+            return False
+        # Act: 执行行动
+        await self.act()
+        return True
+    
+    def _finish(self, stop_reason: StopReason, start: float, error: Optional[str] = None) -> None:
+        """记录本次运行的结果"""
+        if stop_reason in (StopReason.LLM_ERROR, StopReason.ERROR, StopReason.CANCELLED):
+            self.state = AgentState.ERROR
+        else:
+            self.state = AgentState.FINISHED
+        answer = next((
+            message.get("content") for message in reversed(self.memory.get_messages())
+            if message["role"] == Role.ASSISTANT.value and message.get("content")
+        ), None)
+        self.result = RunResult(
+            stop_reason=stop_reason,
+            state=self.state,
+            steps=self.current_step,
+            answer=answer,
+            error=error,
+            elapsed=time.monotonic() - start,
+            usage=self.usage.model_copy(),
+        )
+    
+    def _close_pending_tool_calls(self, reason: str) -> None:
+        """最后一轮中没有结果的工具调用补上错误结果，保持 assistant/tool 消息成对"""
+        self._cancel_speculative()
+        messages = self.memory.get_messages()
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index]["role"] != Role.ASSISTANT.value:
+                continue
+            answered = {m.get("tool_call_id") for m in messages[index + 1:] if m["role"] == Role.TOOL.value}
+            for tool_call in messages[index].get("tool_calls") or []:
+                if tool_call["id"] not in answered:
+                    self.memory.add(Role.TOOL, content=f"错误: {reason}", tool_call_id=tool_call["id"])
+            return
+    
+    async def _checkpoint(self) -> None:
+        """把记忆和进度写入会话日志"""
+        if self.session is not None:
+            await self.session.checkpoint(self.memory, self.current_step, self.state.value)
     
     async def think(self) -> bool:
         """思考阶段：分析当前状态，决定下一步行动"""
-        print("🤔 正在思考...")
-        
+        with self.tracer.span("agent.think"):
+            return await self._think()
+    
+    async def _think(self) -> bool:
         try:
             # 获取LLM响应
-            response = await self.llm.chat(
-                messages=self.memory.get_messages(),
-                system_prompt=self.system_prompt,
-                tools=self.tools.get_tool_definitions()
-            )
-            
-            print(f"💭 思考结果: {response.content}")
+            tools = self.tools.get_tool_definitions()
+            with self.tracer.span("context.build") as span:
+                messages = await self.context_manager.build(self.memory, self.system_prompt, tools)
+                span.set_attribute("messages", len(messages))
+                span.set_attribute("stable_prefix", getattr(self.context_manager, "stable_prefix", 0))
+            if self.stream and hasattr(self.llm, "chat_stream"):
+                response = await self._think_stream(messages, tools)
+            else:
+                response = await self.llm.chat(
+                    messages=messages,
+                    system_prompt=self.system_prompt,
+                    tools=tools
+                )
+                self.events.emit(
+                    EventType.LLM_RESPONSE, self.name,
+                    content=response.content, tool_calls=len(response.tool_calls or []), usage=response.usage
+                )
+            self.usage.record(response)  # 从响应缓存重放的响应不计入调用数和token
             
             # 保存助手消息
-            self.memory.add_message(
-                Message.assistant_message(
-                    content=response.content,
-                    tool_calls=response.tool_calls
-                )
-            )
+            # LLM响应来自框架内部，直接写入记忆，跳过 Message 校验
+            self.memory.add(Role.ASSISTANT, content=response.content, tool_calls=response.tool_calls)
             
             # 检查是否需要调用工具
             if response.tool_calls:
@@ -98,74 +320,226 @@ class MiniAgent:
                 self.state = AgentState.FINISHED
                 return False
                 
+        except LLMDeadlineError:
+            raise  # 超出截止时间，由运行循环处理
+        except LLMError as e:
+            # 重试后仍失败，交给调用方处理，而不是当作最终回答
+            self.events.emit(EventType.ERROR, self.name, message=f"LLM调用失败: {e}")
+            self.state = AgentState.ERROR
+            raise
         except Exception as e:
-            print(f"❌ 思考过程出错: {e}")
-            self.state = AgentState.FINISHED
+            # 不能当作任务完成：停止运行，停止原因为 error
+            self.events.emit(EventType.ERROR, self.name, message=f"思考过程出错: {e}")
+            self.state = AgentState.ERROR
+            self._error = f"{type(e).__name__}: {e}"
             return False
     
+    async def _think_stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> LLMResponse:
+        """以流式方式获取LLM响应，边接收边输出文本并校验工具调用"""
+        self._cancel_speculative()
+        self._speculation_open = self.speculative_tools
+        stream = self.llm.chat_stream(
+            messages=messages,
+            system_prompt=self.system_prompt,
+            tools=tools
+        )
+        
+        try:
+            async for event in stream:
+                if event.type == "content":
+                    self.events.emit(EventType.LLM_DELTA, self.name, delta=event.delta)
+                elif event.type == "tool_call":
+                    self._on_tool_call_ready(event.tool_call)
+            response = await stream.get_response()
+        finally:
+            # 步骤被取消或超出截止时间时关闭HTTP响应，而不是等到垃圾回收
+            await close_stream(stream)
+        self.events.emit(
+            EventType.LLM_RESPONSE, self.name,
+            content=response.content, tool_calls=len(response.tool_calls or []), usage=response.usage, streamed=True
+        )
+        return response
+    
+    def _on_tool_call_ready(self, tool_call: Dict[str, Any]) -> None:
+        """流式响应中某个工具调用的参数已完整，提前校验，只读调用提前开始执行"""
+        function_name = tool_call["function"]["name"]
+        arguments, error = self.tools.parse_arguments(function_name, tool_call["function"]["arguments"])
+        if arguments is None:
+            self.events.emit(EventType.WARNING, self.name, message=f"工具调用 {function_name} 无效: {error}")
+            return
+        speculative = False
+        if self._speculation_open:
+            if self.tools.is_read_only(function_name, arguments):
+                task = asyncio.ensure_future(self.tools.execute_tool(function_name, **arguments))
+                self._speculative[tool_call.get("id") or ""] = (arguments, task)
+                speculative = True
+            else:
+                # 之后的调用可能读取这次调用将要修改的内容，不再提前执行
+                self._speculation_open = False
+        self.events.emit(EventType.TOOL_CALL_READY, self.name, tool=function_name, speculative=speculative)
+    
+    def _take_speculative(self, tool_call: Dict[str, Any], arguments: Dict[str, Any]) -> "Optional[asyncio.Task[ToolResult]]":
+        """取出该调用提前开始的执行，参数不一致时丢弃"""
+        entry = self._speculative.pop(tool_call.get("id") or "", None)
+        if entry is None:
+            return None
+        if entry[0] != arguments:
+            entry[1].cancel()
+            return None
+        return entry[1]
+    
+    def _cancel_speculative(self) -> None:
+        """取消没有被用到的提前执行"""
+        for _, task in self._speculative.values():
+            if task.done() and not task.cancelled():
+                task.exception()  # 已结束的不再报告未取回的异常
+            task.cancel()
+        self._speculative.clear()
+        self._speculation_open = False
+    
     async def act(self) -> None:
         """行动阶段：执行工具调用"""
-        print("⚡ 正在执行行动...")
-        
         # 获取最后一条消息的工具调用
-        last_message = self.memory.messages[-1]
-        if not last_message.tool_calls:
+        messages = self.memory.get_messages()
+        tool_calls = messages[-1].get("tool_calls") if messages else None
+        if not tool_calls:
             return
         
         # 执行所有工具调用
-        for tool_call in last_message.tool_calls:
-            tool_id = tool_call["id"]
+        with self.tracer.span("agent.act", tool_calls=len(tool_calls)):
+            # 在分发之前解析并校验全部参数，无效的调用直接把错误返回给模型
+            parse_start = time.perf_counter()
+            parsed = [
+                self.tools.parse_arguments(call["function"]["name"], call["function"]["arguments"]) for call in tool_calls
+            ]
+            parse_ms = (time.perf_counter() - parse_start) * 1000 / len(tool_calls)
+            
+            if self.parallel_tool_calls and len(tool_calls) > 1:
+                results = await self._execute_tool_calls_parallel(tool_calls, parsed, parse_ms)
+            else:
+                results = [
+                    await self._execute_tool_call(tool_call, arguments, error, parse_ms)
+                    for tool_call, (arguments, error) in zip(tool_calls, parsed)
+                ]
+        
+        self._cancel_speculative()
+        
+        # 按原始顺序保存工具结果
+        for tool_call, result_content in zip(tool_calls, results):
+            self.memory.add(Role.TOOL, content=result_content, tool_call_id=tool_call["id"])
+    
+    async def _execute_tool_calls_parallel(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        parsed: List[Tuple[Optional[Dict[str, Any]], Optional[str]]],
+        parse_ms: float
+    ) -> List[str]:
+        """并发执行同一轮的工具调用
+        
+        连续的可并发调用组成一批同时执行，其中资源标识相同的调用按原顺序依次执行；
+        不可并发的调用单独执行，作为前后两批之间的屏障。
+        """
+        results: List[str] = [""] * len(tool_calls)
+        semaphore = asyncio.Semaphore(self.max_tool_concurrency)
+        batch: Dict[Any, List[int]] = {}
+        
+        async def run_chain(indices: List[int]) -> None:
+            for index in indices:
+                async with semaphore:
+                    results[index] = await self._execute_tool_call(tool_calls[index], *parsed[index], parse_ms)
+        
+        async def flush() -> None:
+            if batch:
+                await asyncio.gather(*(run_chain(indices) for indices in batch.values()))
+                batch.clear()
+        
+        for index, tool_call in enumerate(tool_calls):
             function_name = tool_call["function"]["name"]
+            arguments, error = parsed[index]
             
+            if arguments is not None and self.tools.is_parallel_safe(function_name, arguments):
+                key = self.tools.conflict_key(function_name, arguments)
+                batch.setdefault(("key", key) if key else ("call", index), []).append(index)
+            else:
+                await flush()
+                results[index] = await self._execute_tool_call(tool_call, arguments, error, parse_ms)
+        
+        await flush()
+        return results
+    
+    async def _execute_tool_call(
+        self,
+        tool_call: Dict[str, Any],
+        arguments: Optional[Dict[str, Any]],
+        error: Optional[str],
+        parse_ms: float = 0.0
+    ) -> str:
+        """执行单个工具调用（参数已解析和校验），返回写入记忆的结果文本"""
+        function_name = tool_call["function"]["name"]
+        
+        with self.tracer.span("tool.execute", tool=function_name) as span:
+            span.set_attribute("parse_ms", parse_ms)
+            if arguments is None:
+                # 参数无效：不分发，把精确的错误返回给模型
+                span.set_attribute("success", False)
+                span.set_attribute("invalid_arguments", True)
+                self.events.emit(
+                    EventType.TOOL_FINISHED, self.name, tool=function_name, success=False,
+                    output="", output_chars=0, error=error
+                )
+                return f"错误: {error}"
             try:
-                # 解析参数
-                arguments = json.loads(tool_call["function"]["arguments"])
-                print(f"🔧 执行工具: {function_name} with {arguments}")
+                self.events.emit(EventType.TOOL_STARTED, self.name, tool=function_name, arguments=arguments)
                 
-                # 执行工具
-                result = await self.tools.execute_tool(function_name, **arguments)
-                
-                # 准备结果消息
-                if result.success:
-                    result_content = result.output
-                    print(f"✅ 工具执行成功: {result_content[:100]}...")
+                # 执行工具，流式响应中已提前开始的直接等待其结果
+                speculative = self._take_speculative(tool_call, arguments)
+                if speculative is not None:
+                    span.set_attribute("speculative", True)
+                    result = await speculative
                 else:
-                    result_content = f"错误: {result.error}"
-                    print(f"❌ 工具执行失败: {result.error}")
+                    result = await self.tools.execute_tool(function_name, **arguments)
+                span.set_attribute("success", result.success)
+                if result.cached:
+                    span.set_attribute("cached", True)
                 
-                # 保存工具结果
-                self.memory.add_message(
-                    Message.tool_message(
-                        content=result_content,
-                        tool_call_id=tool_id
-                    )
+                # 准备结果消息
+                result_content = result.output if result.success else f"错误: {result.error}"
+                span.set_attribute("output_chars", len(result_content or ""))
+                if function_name != RESULT_READER_NAME:
+                    result_content, handle = await self.result_store.acompact(result_content or "")
+                    if handle is not None:
+                        span.set_attribute("spilled", handle)
+                self.events.emit(
+                    EventType.TOOL_FINISHED, self.name, tool=function_name, success=result.success,
+                    output=(result.output or "")[:self.EVENT_OUTPUT_PREVIEW], output_chars=len(result.output or ""),
+                    error=result.error, cached=result.cached
                 )
+                return result_content
                 
             except Exception as e:
+                span.record_error(e)
                 error_msg = f"工具执行异常: {str(e)}"
-                print(f"❌ {error_msg}")
-                self.memory.add_message(
-                    Message.tool_message(
-                        content=error_msg,
-                        tool_call_id=tool_id
-                    )
-                )
+                self.events.emit(EventType.ERROR, self.name, message=error_msg)
+                return error_msg
     
     def _generate_summary(self) -> str:
         """生成任务执行摘要"""
-        messages = self.memory.messages
+        messages = self.memory.get_messages()
         if not messages:
             return "没有执行任何操作"
         
         # 提取关键信息
-        user_requests = [msg.content for msg in messages if msg.role == Role.USER]
-        assistant_responses = [msg.content for msg in messages if msg.role == Role.ASSISTANT and msg.content]
+        user_requests = [msg.get("content") for msg in messages if msg["role"] == Role.USER.value]
+        assistant_responses = [
+            msg["content"] for msg in messages if msg["role"] == Role.ASSISTANT.value and msg.get("content")
+        ]
         
         summary = f"""
 任务执行摘要:
 - 用户请求: {user_requests[0] if user_requests else '未知'}
 - 执行步数: {self.current_step}
 - 最终状态: {self.state.value}
+- 停止原因: {self.result.stop_reason.value if self.result is not None else '未知'}
 - 主要响应: {assistant_responses[-1] if assistant_responses else '无响应'}
 """
         return summary
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+批量任务执行：从JSONL读取任务，并发运行，结果实时写入JSONL
+
+    python -m mini_agent.batch tasks.jsonl -o results.jsonl --concurrency 8 --rpm 600
+
+每行任务格式: {"id": "task-1", "task": "任务描述"}，可选字段 max_steps、system_prompt。
+输出文件中已成功的任务会被跳过，中断后用同样的命令即可继续；失败的任务（例如遇到限流或
+服务端错误）续跑时重新执行，新结果追加在后面（--skip-failed 则同样跳过）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from pydantic import BaseModel
+
+from mini_agent.agent import MiniAgent
+from mini_agent.schema import AgentState, Role, StopReason
+from mini_agent.tools import ToolCollection
+
+
+class BatchTask(BaseModel):
+    """一个批量任务"""
+    id: str
+    task: str
+    max_steps: Optional[int] = None
+    system_prompt: Optional[str] = None
+    timeout: Optional[float] = None  # 秒，超过后停止并返回已有的结果
+
+
+class BatchResult(BaseModel):
+    """一个任务的执行结果"""
+    id: str
+    task: str
+    state: str
+    result: Optional[str] = None
+    steps: int = 0
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    stop_reason: Optional[str] = None
+
+
+class BatchStats(BaseModel):
+    """批量执行统计"""
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def tasks_per_hour(self) -> float:
+        done = self.completed + self.failed
+        return done / self.elapsed * 3600 if self.elapsed else 0.0
+
+
+def read_tasks(path: str) -> Iterator[BatchTask]:
+    """逐行读取任务文件，缺少 id 时使用行号"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            data.setdefault("id", str(line_number))
+            data["id"] = str(data["id"])
+            yield BatchTask(**data)
+
+
+def read_completed_ids(path: str, include_failed: bool = False) -> Set[str]:
+    """读取输出文件中已完成的任务ID，忽略中断时写了一半的行
+
+    include_failed 为 False 时不包含失败（error 非空）的任务，续跑时会重新执行它们。
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                if include_failed or not row.get("error"):
+                    completed.add(str(row["id"]))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+    return completed
+
+
+class BatchRunner:
+    """并发执行批量任务
+
+    每个任务使用独立的 MiniAgent（独立的记忆和工具会话），任务之间互不影响。
+    所有任务共享同一个 LLM 实例（可在其上配置全局限流）和一个工具并发上限。
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        concurrency: int = 8,
+        max_tool_concurrency: int = 16,
+        agent_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.llm = llm
+        self.concurrency = concurrency
+        self.max_tool_concurrency = max_tool_concurrency
+        self.agent_kwargs = agent_kwargs or {}
+        self.stats = BatchStats()
+
+    async def run(
+        self, tasks: Iterable[BatchTask], output_path: str, resume: bool = True, retry_failed: bool = True
+    ) -> BatchStats:
+        """执行任务并把结果逐条追加到 output_path
+
+        resume 时跳过输出文件中已成功的任务；retry_failed 为 False 时失败的任务也跳过。
+        """
+        self.stats = BatchStats()
+        start = time.monotonic()
+        completed = read_completed_ids(output_path, include_failed=not retry_failed) if resume else set()
+        tool_semaphore = asyncio.Semaphore(self.max_tool_concurrency)
+        write_lock = asyncio.Lock()
+
+        mode = "a" if resume else "w"
+        with open(output_path, mode, encoding="utf-8") as output:
+            if resume and output.tell() > 0 and not self._ends_with_newline(output_path):
+                output.write("\n")
+
+            pending = iter(tasks)
+
+            async def worker() -> None:
+                # 各个 worker 从同一个迭代器取任务，任务文件不必一次性读入内存
+                for task in pending:
+                    if task.id in completed:
+                        self.stats.skipped += 1
+                        continue
+                    completed.add(task.id)
+                    result = await self.run_task(task, tool_semaphore)
+                    if result.error:
+                        self.stats.failed += 1
+                    else:
+                        self.stats.completed += 1
+                    async with write_lock:
+                        output.write(result.model_dump_json() + "\n")
+                        output.flush()
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+        self.stats.elapsed = time.monotonic() - start
+        return self.stats
+
+    async def run_task(self, task: BatchTask, tool_semaphore: Optional[asyncio.Semaphore] = None) -> BatchResult:
+        """用一个全新的代理执行单个任务"""
+        kwargs = dict(self.agent_kwargs)
+        if task.max_steps is not None:
+            kwargs["max_steps"] = task.max_steps
+        if task.system_prompt is not None:
+            kwargs["system_prompt"] = task.system_prompt
+        agent = MiniAgent(
+            llm=self.llm,
+            name=f"Task-{task.id}",
+            tools=ToolCollection(semaphore=tool_semaphore),
+            **kwargs,
+        )
+
+        start = time.monotonic()
+        try:
+            summary = await agent.run(task.task, timeout=task.timeout)
+            return BatchResult(
+                id=task.id,
+                task=task.task,
+                state=agent.state.value,
+                result=self._final_answer(agent) or summary,
+                steps=agent.current_step,
+                elapsed=time.monotonic() - start,
+                stop_reason=self._stop_reason(agent),
+                error=self._error(agent),
+            )
+        except Exception as e:
+            return BatchResult(
+                id=task.id,
+                task=task.task,
+                state="error",
+                steps=agent.current_step,
+                error=f"{type(e).__name__}: {e}",
+                elapsed=time.monotonic() - start,
+                stop_reason=self._stop_reason(agent),
+            )
+        finally:
+            await agent.tools.close()
+
+    @staticmethod
+    def _stop_reason(agent: MiniAgent) -> Optional[str]:
+        return agent.result.stop_reason.value if agent.result is not None else None
+
+    @staticmethod
+    def _error(agent: MiniAgent) -> Optional[str]:
+        """代理因错误停止（例如LLM返回了无法处理的响应）时 run() 正常返回，错误记录在运行结果中"""
+        if agent.result is not None and agent.result.stop_reason in (StopReason.ERROR, StopReason.LLM_ERROR):
+            return agent.result.error or agent.result.stop_reason.value
+        return None
+
+    @staticmethod
+    def _final_answer(agent: MiniAgent) -> Optional[str]:
+        if agent.state == AgentState.FINISHED and agent.memory.messages:
+            last = agent.memory.messages[-1]
+            if last.role == Role.ASSISTANT and not last.tool_calls:
+                return last.content
+        return None
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批量执行 MiniAgent 任务")
+    parser.add_argument("tasks", help="任务文件 (JSONL)")
+    parser.add_argument("-o", "--output", required=True, help="结果文件 (JSONL)，已有结果会被跳过")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时执行的任务数")
+    parser.add_argument("--tool-concurrency", type=int, default=16, help="全局工具并发上限")
+    parser.add_argument("--rpm", type=float, default=None, help="每分钟最多的LLM请求数")
+    parser.add_argument("--tpm", type=float, default=None, help="每分钟最多的LLM token数")
+    parser.add_argument("--max-llm-concurrency", type=int, default=None, help="同时进行的LLM请求上限")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+    parser.add_argument("--max-steps", type=int, default=10)
+    parser.add_argument("--task-timeout", type=float, default=None, help="每个任务的截止时间（秒），任务文件中的 timeout 优先")
+    parser.add_argument("--step-timeout", type=float, default=None, help="每一步的截止时间（秒）")
+    parser.add_argument("--no-resume", action="store_true", help="覆盖输出文件，从头执行")
+    parser.add_argument("--skip-failed", action="store_true", help="续跑时不重新执行已失败的任务")
+    parser.add_argument("--events", default=None, help="把运行事件写入该文件 (JSONL)")
+    parser.add_argument("--quiet", action="store_true", help="不在控制台输出运行过程")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口"""
+    from mini_agent.events import ConsoleSink, EventBus, EventSink, JSONLSink, NullSink, set_event_bus
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.ratelimit import RateLimiter
+
+    args = parse_args(argv)
+    sinks: List[EventSink] = [] if args.quiet else [ConsoleSink()]
+    if args.events:
+        sinks.append(JSONLSink(args.events))
+    bus = EventBus(sinks or [NullSink()])
+    set_event_bus(bus)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ 请设置环境变量 OPENAI_API_KEY")
+        return
+
+    llm = SimpleLLM(
+        api_key=api_key,
+        model=args.model,
+        base_url=args.base_url,
+        rate_limiter=RateLimiter(
+            requests_per_minute=args.rpm,
+            max_concurrent=args.max_llm_concurrency,
+            tokens_per_minute=args.tpm,
+        ),
+    )
+    runner = BatchRunner(
+        llm,
+        concurrency=args.concurrency,
+        max_tool_concurrency=args.tool_concurrency,
+        agent_kwargs={"max_steps": args.max_steps, "run_timeout": args.task_timeout, "step_timeout": args.step_timeout},
+    )
+    stats = await runner.run(
+        read_tasks(args.tasks), args.output, resume=not args.no_resume, retry_failed=not args.skip_failed
+    )
+    bus.close()
+    print(
+        f"\n📊 完成 {stats.completed}，失败 {stats.failed}，跳过 {stats.skipped}，"
+        f"耗时 {stats.elapsed:.1f}s（{stats.tasks_per_hour:.0f} 任务/小时）"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
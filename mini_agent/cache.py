@@ -0,0 +1,213 @@
+"""
+LLM响应缓存：内存LRU + 可选的SQLite持久化存储
+
+异步代码中使用 aget/aput：内存命中直接返回，SQLite 读写在线程池中执行，不阻塞事件循环。
+读取不提交事务，命中条目的访问时间攒到下一次写入时一起提交。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    """缓存命中统计"""
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    bypassed: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """按规范化请求缓存LLM响应
+
+    键是请求参数（模型、消息、工具定义、采样参数等）规范化JSON的SHA-256，
+    内容完全相同的请求才会命中。提供 path 时同时写入SQLite，跨进程、跨运行复用。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # 连接在线程池的多个线程中使用
+        self._touched: Dict[str, float] = {}  # 尚未写入磁盘的访问时间
+        self._puts_since_trim = 0
+        if path:
+            self._open_db(path)
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """计算请求的稳定哈希（与字典键顺序无关）"""
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，未命中或已过期时返回None"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = self._disk_hit(key, self._read_disk(key, now))
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """异步查询：内存未命中时在线程池中查询磁盘"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key, now)
+            value = self._disk_hit(key, row)
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """写入缓存"""
+        now = time.time()
+        self._remember(key, now, value)
+        if self._db is not None:
+            self._put_disk(key, value, now)
+
+    async def aput(self, key: str, value: Dict[str, Any]) -> None:
+        """异步写入：磁盘写入在线程池中执行"""
+        now = time.time()
+        self._remember(key, now, value)
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._put_disk, key, value, now)
+
+    def clear(self) -> None:
+        """清空内存和磁盘中的缓存"""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._touched.clear()
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._flush_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _get_memory(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created, value = entry
+        if self._expired(created, now):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        self.stats.hits += 1
+        self.stats.memory_hits += 1
+        return value
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """查询磁盘（可在线程池中执行）；过期的条目留给 _trim_disk 删除，读取不写磁盘"""
+        assert self._db is not None
+        with self._db_lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                return None
+            self._touched[key] = now
+        return json.loads(row[0]), row[1]
+
+    def _disk_hit(self, key: str, row: Optional[Tuple[Dict[str, Any], float]]) -> Optional[Dict[str, Any]]:
+        """磁盘命中的条目放入内存（在调用方的线程中执行）"""
+        if row is None:
+            return None
+        value, created = row
+        self._remember(key, created, value)
+        self.stats.hits += 1
+        self.stats.disk_hits += 1
+        return value
+
+    def _put_disk(self, key: str, value: Dict[str, Any], now: float) -> None:
+        assert self._db is not None
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._db.commit()
+            self._puts_since_trim += 1
+            if self._puts_since_trim >= 100:
+                self._trim_disk()
+
+    def _flush_touched(self) -> None:
+        """把攒下的访问时间随下一次提交写入磁盘（调用方持有锁）"""
+        if self._touched and self._db is not None:
+            self._db.executemany(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def _trim_disk(self) -> None:
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目"""
+        assert self._db is not None
+        self._puts_since_trim = 0
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (overflow,),
+            )
+            self.stats.evictions += overflow
+        self._db.commit()
@@ -0,0 +1,116 @@
+"""
+共享的API客户端注册表
+
+同一个 (base_url, api_key) 只创建一个 AsyncOpenAI 客户端，所有 SimpleLLM 实例
+共用它的HTTP连接池，避免每个实例都重新建立TCP/TLS连接。
+openai / httpx 在第一次创建客户端时才导入。
+"""
+import asyncio
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+def http2_available() -> bool:
+    """是否安装了HTTP/2支持（h2）"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ClientRegistry:
+    """按 (base_url, api_key) 复用 AsyncOpenAI 客户端
+
+    Args:
+        max_connections: 每个客户端的最大连接数
+        max_keepalive_connections: 保持空闲的最大连接数
+        keepalive_expiry: 空闲连接的保持时间（秒）
+        http2: 是否启用HTTP/2，None表示安装了 h2 时自动启用
+        timeout: 请求超时（秒）
+        max_retries: openai SDK 自身的重试次数，默认为0，由 SimpleLLM 的重试策略负责重试
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: Optional[bool] = None,
+        timeout: float = 60.0,
+        max_retries: int = 0,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2_available() if http2 is None else http2
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._clients: Dict[Tuple[str, str], "AsyncOpenAI"] = {}
+
+    def get(self, api_key: str, base_url: str) -> "AsyncOpenAI":
+        """获取（必要时创建）共享客户端"""
+        key = (base_url.rstrip("/"), api_key)
+        client = self._clients.get(key)
+        if client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                http2=self.http2,
+                timeout=self.timeout,
+            )
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=self.max_retries,
+            )
+            self._clients[key] = client
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        """关闭所有客户端及其连接"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.close()
+
+
+# HTTP连接绑定在创建它的事件循环上，因此默认注册表按事件循环区分
+_default_registries: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_fallback_registry: Optional[ClientRegistry] = None
+
+
+def get_default_registry() -> ClientRegistry:
+    """获取当前事件循环的默认注册表（不在事件循环中时返回一个全局注册表）"""
+    global _fallback_registry
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        if _fallback_registry is None:
+            _fallback_registry = ClientRegistry()
+        return _fallback_registry
+    registry = _default_registries.get(loop)
+    if registry is None:
+        registry = ClientRegistry()
+        _default_registries[loop] = registry
+    return registry
+
+
+async def close_default_registry() -> None:
+    """关闭当前事件循环的默认注册表（程序退出前调用）"""
+    registry = _default_registries.pop(asyncio.get_running_loop(), None)
+    if registry is not None:
+        await registry.aclose()
@@ -0,0 +1,398 @@
+"""
+上下文窗口管理：把对话历史控制在模型的token预算之内
+
+服务端的提示缓存按前缀匹配，每一步都改写较早的消息会让缓存全部失效。因此淘汰策略
+一旦动手就多腾出一部分余量（headroom），并记住已经做过的截断和丢弃，之后的几步只在
+末尾追加新消息，请求的前缀保持不变，直到再次超出预算。
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from mini_agent import fastjson
+from mini_agent.events import EventType, get_event_bus
+from mini_agent.schema import Memory
+from mini_agent.tokens import count_message_tokens, count_tokens
+
+
+# 常见模型的上下文窗口大小（按前缀匹配，越具体的放越前面）
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+    "deepseek": 65536,
+    "qwen": 32768,
+}
+
+DEFAULT_CONTEXT_WINDOW = 32768
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """查询模型的上下文窗口大小，未知模型返回默认值"""
+    if model:
+        for prefix, window in MODEL_CONTEXT_WINDOWS.items():
+            if model.startswith(prefix):
+                return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+class ContextUnit:
+    """不可拆分的消息组：一条消息及紧随其后的工具结果
+
+    淘汰策略只能整组保留或丢弃，保证 tool 消息不会和发起调用的 assistant 消息分离。
+    """
+    __slots__ = ("start", "messages", "tokens")
+
+    def __init__(self, start: int, messages: List[Dict[str, Any]], tokens: int):
+        self.start = start
+        self.messages = messages
+        self.tokens = tokens
+
+    @property
+    def is_user(self) -> bool:
+        """是否为真实的用户请求（摘要等合成的消息组 start 为 -1）"""
+        return self.start >= 0 and self.messages[0]["role"] == "user"
+
+
+def group_units(messages: List[Dict[str, Any]], token_counts: Sequence[int]) -> List[ContextUnit]:
+    """把消息列表按调用关系分组"""
+    units: List[ContextUnit] = []
+    for index, (message, tokens) in enumerate(zip(messages, token_counts)):
+        if message["role"] == "tool" and units:
+            unit = units[-1]
+            unit.messages.append(message)
+            unit.tokens += tokens
+        else:
+            units.append(ContextUnit(index, [message], tokens))
+    return units
+
+
+def total_tokens(units: List[ContextUnit]) -> int:
+    return sum(unit.tokens for unit in units)
+
+
+def _pinned_index(units: List[ContextUnit]) -> int:
+    """当前任务的用户请求所在的组，始终保留"""
+    for index in range(len(units) - 1, -1, -1):
+        if units[index].is_user:
+            return index
+    return -1
+
+
+def _truncate_text(text: str, max_tokens: int) -> str:
+    """保留文本首尾，中间替换为截断提示"""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(1, int(len(text) * max_tokens / tokens) // 2)
+    omitted = len(text) - 2 * keep
+    return f"{text[:keep]}\n...[已截断 {omitted} 个字符]...\n{text[-keep:]}"
+
+
+class EvictionPolicy(ABC):
+    """淘汰策略基类
+
+    策略可以带有状态（记住之前的决定以保持请求前缀稳定），记忆被删改时通过 reset() 清空。
+    """
+
+    @abstractmethod
+    async def apply(self, units: List[ContextUnit], budget: int) -> List[ContextUnit]:
+        """返回调整后的消息组列表，应尽量使总token数不超过 budget"""
+        pass
+
+    def reset(self) -> None:
+        """清空状态（记忆发生非追加的修改时调用）"""
+        pass
+
+
+class TruncateToolOutputPolicy(EvictionPolicy):
+    """截断较早轮次中过长的工具输出
+
+    截断过的消息组会被记住，之后每一步都以同样的方式截断，不会恢复原文；需要继续截断时
+    一次截断到预算的 (1 - headroom) 以内，留出之后几步追加消息的空间。
+    """
+
+    def __init__(self, max_tokens: int = 256, keep_recent: int = 2, headroom: float = 0.2):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.headroom = headroom
+        # 消息组起点 -> 截断后的消息组，起点不大于 _through 的消息组都已处理过
+        self._truncated: Dict[int, ContextUnit] = {}
+        self._through = -1
+
+    def reset(self) -> None:
+        self._truncated.clear()
+        self._through = -1
+
+    async def apply(self, units: List[ContextUnit], budget: int) -> List[ContextUnit]:
+        total = total_tokens(units)
+        end = max(0, len(units) - self.keep_recent)
+        result = list(units)
+        index = 0
+        # 重放之前的截断，保持前缀不变
+        while index < end and units[index].start <= self._through:
+            unit = units[index]
+            cached = self._truncated.get(unit.start) if unit.start >= 0 else None
+            if cached is not None:
+                total -= unit.tokens - cached.tokens
+                result[index] = cached
+            index += 1
+        if total <= budget:
+            return result
+
+        pending = [(i, self._truncate_unit(units[i])) for i in range(index, end)]
+        savings = sum(units[i].tokens - unit.tokens for i, unit in pending)
+        if total - savings > budget and savings < budget * self.headroom:
+            # 全部截断也放不下，交给后面的策略丢弃；攒够一批再截断，避免每一步都改写中间的消息
+            return result
+        target = int(budget * (1 - self.headroom))
+        for index, truncated in pending:
+            if total <= target:
+                break
+            unit = units[index]
+            if unit.start >= 0:
+                self._through = max(self._through, unit.start)
+            if truncated is unit:
+                continue
+            total -= unit.tokens - truncated.tokens
+            result[index] = truncated
+            if unit.start >= 0:
+                self._truncated[unit.start] = truncated
+        return result
+
+    def _truncate_unit(self, unit: ContextUnit) -> ContextUnit:
+        if not any(m["role"] == "tool" and (m.get("content") or "") for m in unit.messages):
+            return unit
+        messages = []
+        for message in unit.messages:
+            if message["role"] == "tool" and message.get("content"):
+                message = dict(message, content=_truncate_text(message["content"], self.max_tokens))
+            messages.append(message)
+        return ContextUnit(unit.start, messages, sum(count_message_tokens(m) for m in messages))
+
+
+class SlidingWindowPolicy(EvictionPolicy):
+    """丢弃最早的消息组，保留当前任务的用户请求和尽可能多的最近轮次
+
+    窗口的起点会被记住，之后的步骤沿用同一个起点；再次超出预算时一次丢弃到预算的
+    (1 - headroom) 以内，而不是每一步都只丢弃最早的一组（那样每一步的前缀都不同）。
+    """
+
+    def __init__(self, headroom: float = 0.2):
+        self.headroom = headroom
+        self._cut = 0  # 保留起点不小于它的消息组
+
+    def reset(self) -> None:
+        self._cut = 0
+
+    async def apply(self, units: List[ContextUnit], budget: int) -> List[ContextUnit]:
+        if not units:
+            return units
+        pinned = _pinned_index(units)
+        kept = [
+            index for index, unit in enumerate(units)
+            if index == pinned or unit.start < 0 or unit.start >= self._cut
+        ]
+        if sum(units[index].tokens for index in kept) <= budget:
+            return [units[index] for index in kept]
+
+        target = int(budget * (1 - self.headroom))
+        selected = {pinned} if pinned >= 0 else set()
+        used = units[pinned].tokens if pinned >= 0 else 0
+        for index in range(len(units) - 1, -1, -1):
+            if index == pinned:
+                continue
+            # 最近一组总是保留，其余按预算从新到旧保留
+            if len(selected) > (pinned >= 0) and used + units[index].tokens > target:
+                break
+            selected.add(index)
+            used += units[index].tokens
+            if units[index].start >= 0:
+                self._cut = units[index].start
+        return [units[index] for index in sorted(selected)]
+
+
+class SummarizePolicy(EvictionPolicy):
+    """把较早的轮次压缩成一条摘要消息
+
+    提供 llm 时调用模型生成摘要，否则生成抽取式摘要。摘要会被缓存，只有再次超出
+    预算时才把上次的摘要和之后的轮次一起重新压缩，因此大部分步骤不会产生额外调用。
+    策略对象带有状态，每个 Memory 应使用单独的实例。
+    """
+
+    SUMMARY_PROMPT = "请用简洁的要点总结以下对话中已完成的操作、得到的关键结果和尚未完成的事项。"
+
+    def __init__(self, llm: Any = None, keep_recent: int = 4, max_summary_tokens: int = 512):
+        self.llm = llm
+        self.keep_recent = keep_recent
+        self.max_summary_tokens = max_summary_tokens
+        self._summary: Optional[str] = None
+        self._boundary = 0
+
+    def reset(self) -> None:
+        self._summary = None
+        self._boundary = 0
+
+    async def apply(self, units: List[ContextUnit], budget: int) -> List[ContextUnit]:
+        pinned = _pinned_index(units)
+        pinned_start = units[pinned].start if pinned >= 0 else -1
+
+        # 用缓存的摘要替换已经压缩过的轮次
+        if self._summary is not None:
+            units = self._with_summary(units, pinned_start)
+            if total_tokens(units) <= budget:
+                return units
+        elif total_tokens(units) <= budget:
+            return units
+
+        candidates = [
+            unit for unit in units[:max(0, len(units) - self.keep_recent)]
+            if unit.start != pinned_start
+        ]
+        if not any(unit.start >= 0 for unit in candidates):
+            # 只剩上次的摘要，没有新的轮次可以压缩
+            return units
+
+        self._summary = await self._summarize(candidates)
+        self._boundary = max(unit.start for unit in candidates) + 1
+        return self._with_summary(units, pinned_start)
+
+    def _with_summary(self, units: List[ContextUnit], pinned_start: int) -> List[ContextUnit]:
+        message = {"role": "user", "content": f"[早期对话摘要]\n{self._summary}"}
+        summary = ContextUnit(-1, [message], count_message_tokens(message))
+        kept = [u for u in units if u.start >= self._boundary or u.start == pinned_start]
+        # 摘要放在被压缩的轮次原本的位置
+        position = next((i for i, u in enumerate(kept) if u.start >= self._boundary), len(kept))
+        return kept[:position] + [summary] + kept[position:]
+
+    async def _summarize(self, units: List[ContextUnit]) -> str:
+        transcript = "\n".join(
+            f"{m['role']}: {self._describe(m)}" for unit in units for m in unit.messages
+        )
+        if self.llm is not None:
+            try:
+                response = await self.llm.chat(
+                    messages=[{"role": "user", "content": transcript}],
+                    system_prompt=self.SUMMARY_PROMPT,
+                )
+                if response.content:
+                    return _truncate_text(response.content, self.max_summary_tokens)
+            except Exception as e:
+                get_event_bus().emit(EventType.WARNING, message=f"生成摘要失败，改用抽取式摘要: {e}")
+        return _truncate_text(transcript, self.max_summary_tokens)
+
+    @staticmethod
+    def _describe(message: Dict[str, Any]) -> str:
+        parts = []
+        if message.get("content"):
+            parts.append(message["content"][:200])
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call["function"]
+            parts.append(f"调用 {function['name']}({function['arguments'][:200]})")
+        return " ".join(parts)
+
+
+class ContextManager:
+    """上下文窗口管理器
+
+    在每次请求前检查历史的token总数，超出预算时依次应用淘汰策略。
+    Memory 本身保留完整历史，这里只决定发送给模型的窗口。
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        reserve_tokens: int = 4096,
+        policies: Optional[List[EvictionPolicy]] = None,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens or get_context_window(model)
+        self.reserve_tokens = reserve_tokens
+        self.policies = policies if policies is not None else [
+            TruncateToolOutputPolicy(),
+            SlidingWindowPolicy(),
+        ]
+        # 与上一次请求相同的前缀消息数，用于确认请求前缀是否稳定
+        self.stable_prefix = 0
+        # 上一次请求：消息列表（不复制）、当时的长度，以及它是否就是记忆的存储列表（记录记忆的版本）
+        self._previous: List[Dict[str, Any]] = []
+        self._previous_length = 0
+        self._previous_source: Optional[Tuple[int, int]] = None
+        self._memory_key: Optional[Tuple[int, int]] = None
+
+    @property
+    def budget(self) -> int:
+        """留给请求（系统提示、工具定义和历史）的token数，预留部分用于模型输出"""
+        return max(0, self.max_tokens - self.reserve_tokens)
+
+    async def build(
+        self,
+        memory: Memory,
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """返回不超过预算的消息列表"""
+        fixed = self._tools_cost(tools)
+        if system_prompt:
+            fixed += count_message_tokens({"role": "system", "content": system_prompt})
+        budget = max(0, self.budget - fixed)
+
+        # 记忆被删改后，策略记住的截断和窗口起点都不再适用
+        memory_key = (id(memory), memory.revision)
+        if memory_key != self._memory_key:
+            self._memory_key = memory_key
+            for policy in self.policies:
+                policy.reset()
+
+        # 快速路径：未超预算时直接使用缓存的完整历史
+        if memory.get_total_tokens() <= budget:
+            return self._track_prefix(memory.get_messages(), memory_key)
+
+        units = group_units(memory.get_messages(), memory.get_token_counts())
+        for policy in self.policies:
+            units = await policy.apply(units, budget)
+            if total_tokens(units) <= budget:
+                break
+        else:
+            # 所有策略都无法满足预算时的兜底：截断全部工具输出并使用滑动窗口
+            units = await TruncateToolOutputPolicy(keep_recent=0).apply(units, budget)
+            units = await SlidingWindowPolicy().apply(units, budget)
+
+        return self._track_prefix([message for unit in units for message in unit.messages])
+
+    def _track_prefix(
+        self, messages: List[Dict[str, Any]], source: Optional[Tuple[int, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """统计与上一次请求相同的前缀消息数
+
+        快速路径直接发送记忆的存储列表（source 为记忆的版本）：版本不变时记忆只追加过消息，
+        上一次请求整体就是这次的前缀，不必逐条比较，也不复制列表。
+        """
+        previous, length = self._previous, self._previous_length
+        if self._previous_source is not None and messages is previous and source == self._previous_source:
+            common = length
+        elif self._previous_source is not None and self._previous_source != self._memory_key:
+            common = 0  # 记忆在上一次请求之后被原地删改，保存的列表已经不是当时发送的内容
+        else:
+            common = 0
+            for index in range(min(length, len(messages))):
+                old, new = previous[index], messages[index]
+                if old is not new and old != new:
+                    break
+                common += 1
+        self.stable_prefix = common
+        self._previous, self._previous_length, self._previous_source = messages, len(messages), source
+        return messages
+
+    @staticmethod
+    def _tools_cost(tools: Optional[List[Dict[str, Any]]]) -> int:
+        if not tools:
+            return 0
+        return count_tokens(fastjson.dumps(tools).decode("utf-8"))
@@ -0,0 +1,51 @@
+"""
+截止时间的传递
+
+代理为每次运行、每一步设置截止时间（单调时钟），通过 contextvars 传递给其中的LLM调用和
+工具调用，不需要修改 chat / execute_tool 的参数，嵌套的路由器和提前执行的工具任务
+（创建时复制上下文）也能看到：
+
+    with deadline_scope(timeout=30):
+        await llm.chat(...)             # 请求超时不超过剩余时间，不会在截止时间之后重试
+        await tools.execute_tool(...)   # 超过剩余时间时取消，子进程随之终止
+
+嵌套的作用域只能缩短截止时间，不能延长。
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("mini_agent_deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    """当前的截止时间（time.monotonic() 时刻），没有时返回None"""
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """距截止时间的秒数（可能为负），没有截止时间时返回None"""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float] = None, deadline: Optional[float] = None) -> Iterator[Optional[float]]:
+    """在作用域内设置截止时间（timeout 秒后，或绝对时刻 deadline，取较早者），返回生效的截止时间"""
+    candidates = [value for value in (
+        _deadline.get(),
+        deadline,
+        time.monotonic() + timeout if timeout is not None else None,
+    ) if value is not None]
+    effective = min(candidates) if candidates else None
+    token = _deadline.set(effective)
+    try:
+        yield effective
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,125 @@
+"""
+LLM调用的错误类型
+
+openai / httpx 抛出的异常统一转换为 LLMError 的子类，调用方按类型区分
+可重试的错误（限流、超时、连接失败、服务端错误）和不可重试的错误（请求本身有误）。
+
+openai / httpx 只在转换异常时才导入：只用到错误类型的模块（代理、工具、工作进程）
+不必为它们付出数百毫秒的导入时间。
+"""
+import email.utils
+import time
+from typing import Mapping, Optional, Tuple
+
+
+class LLMError(Exception):
+    """LLM调用失败"""
+
+    retryable = False
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        attempts: int = 1,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.attempts = attempts
+
+
+class LLMRateLimitError(LLMError):
+    """被服务端限流 (429)"""
+    retryable = True
+
+
+class LLMTimeoutError(LLMError):
+    """请求超时"""
+    retryable = True
+
+
+class LLMDeadlineError(LLMTimeoutError):
+    """超出了调用方设置的截止时间（mini_agent.deadline），剩余时间不足以再次重试"""
+    retryable = False
+
+
+class LLMConnectionError(LLMError):
+    """网络连接失败"""
+    retryable = True
+
+
+class LLMServerError(LLMError):
+    """服务端错误 (5xx，以及 408/409)"""
+    retryable = True
+
+
+class LLMAPIError(LLMError):
+    """请求被拒绝（参数错误、认证失败等），重试无意义"""
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """解析 retry-after-ms / Retry-After（秒数或HTTP日期），返回等待秒数"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def to_llm_error(error: BaseException) -> LLMError:
+    """把 openai / httpx 的异常转换为对应的 LLMError"""
+    if isinstance(error, LLMError):
+        return error
+    import httpx
+    import openai
+
+    message = str(error) or type(error).__name__
+
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        retry_after = parse_retry_after(error.response.headers)
+        if status == 429:
+            return LLMRateLimitError(message, status, retry_after)
+        if status >= 500 or status in (408, 409):
+            return LLMServerError(message, status, retry_after)
+        return LLMAPIError(message, status)
+    # APITimeoutError 是 APIConnectionError 的子类，需要先判断
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException)):
+        return LLMTimeoutError(message)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return LLMConnectionError(message)
+    return LLMAPIError(message)
+
+
+_transport_errors: Optional[Tuple[type, ...]] = None
+
+
+def transport_errors() -> Tuple[type, ...]:
+    """需要转换为 LLMError 的异常类型，其余异常（程序错误）原样抛出
+
+    在 except 子句中调用：只有异常发生时才求值，此时 openai 早已被客户端导入。
+    """
+    global _transport_errors
+    if _transport_errors is None:
+        import httpx
+        import openai
+
+        _transport_errors = (openai.OpenAIError, httpx.HTTPError)
+    return _transport_errors
@@ -0,0 +1,280 @@
+"""
+代理事件总线
+
+代理和LLM不再直接 print，而是把结构化事件放入有界队列，由后台线程批量交给输出端
+（控制台、JSONL文件等）。emit() 只做一次入队操作，终端或管道再慢也不会阻塞代理循环；
+所有输出由同一个线程按顺序写出，多个代理并发时每行都是完整的。
+
+    from mini_agent.events import ConsoleSink, EventBus, JSONLSink, set_event_bus
+    set_event_bus(EventBus([ConsoleSink(), JSONLSink("events.jsonl")]))
+"""
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import IO, Any, Deque, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from mini_agent import fastjson
+
+
+class EventType(str, Enum):
+    """事件类型"""
+    RUN_STARTED = "run_started"
+    STEP_STARTED = "step_started"
+    LLM_DELTA = "llm_delta"
+    LLM_RESPONSE = "llm_response"
+    LLM_RETRY = "llm_retry"
+    TOOL_CALL_READY = "tool_call_ready"
+    TOOL_STARTED = "tool_started"
+    TOOL_FINISHED = "tool_finished"
+    RUN_FINISHED = "run_finished"
+    WARNING = "warning"
+    ERROR = "error"
+
+
+class AgentEvent(BaseModel):
+    """一个事件"""
+    type: EventType
+    agent: Optional[str] = None
+    timestamp: float
+    data: Dict[str, Any] = {}
+
+
+class EventSink:
+    """输出端基类，handle 在后台线程中按批调用"""
+
+    def handle(self, events: List[AgentEvent]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class NullSink(EventSink):
+    """丢弃所有事件"""
+
+    def handle(self, events: List[AgentEvent]) -> None:
+        pass
+
+
+class ConsoleSink(EventSink):
+    """渲染为人类可读的文本
+
+    Args:
+        stream: 输出流，默认每次写入时取当前的 sys.stdout
+        show_agent: 是否在每行前加上代理名称，None表示出现多个代理时自动加上
+        preview_chars: 工具输出预览的长度
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, show_agent: Optional[bool] = None, preview_chars: int = 100):
+        self.stream = stream
+        self.show_agent = show_agent
+        self.preview_chars = preview_chars
+        self._agents: set = set()
+        self._open_line: Optional[str] = None  # 流式输出中尚未换行的代理
+
+    def handle(self, events: List[AgentEvent]) -> None:
+        parts: List[str] = []
+        for event in events:
+            self._render(event, parts)
+        stream = self.stream or sys.stdout
+        stream.write("".join(parts))
+        stream.flush()
+
+    def _render(self, event: AgentEvent, parts: List[str]) -> None:
+        if event.agent is not None:
+            self._agents.add(event.agent)
+        prefix = self._prefix(event.agent)
+        data = event.data
+
+        if event.type == EventType.LLM_DELTA:
+            if self._open_line != event.agent:
+                self._end_line(parts)
+                parts.append(f"{prefix}💭 思考结果: ")
+                self._open_line = event.agent
+            parts.append(data["delta"])
+            return
+        self._end_line(parts)
+
+        if event.type == EventType.RUN_STARTED:
+            line = f"\n{prefix}🚀 {event.agent} 开始执行任务: {data['task']}"
+        elif event.type == EventType.STEP_STARTED:
+            line = f"\n{prefix}--- 第 {data['step']} 步 ---\n{prefix}🤔 正在思考..."
+        elif event.type == EventType.LLM_RESPONSE:
+            if data.get("streamed"):
+                return
+            line = f"{prefix}💭 思考结果: {data.get('content')}"
+        elif event.type == EventType.LLM_RETRY:
+            line = f"{prefix}⏳ LLM调用失败 ({data['error']})，{data['delay']:.1f}秒后第 {data['attempt']} 次重试"
+        elif event.type == EventType.TOOL_CALL_READY:
+            line = f"{prefix}🧩 工具调用就绪: {data['tool']}"
+        elif event.type == EventType.TOOL_STARTED:
+            line = f"{prefix}🔧 执行工具: {data['tool']} with {data['arguments']}"
+        elif event.type == EventType.TOOL_FINISHED:
+            if data["success"]:
+                line = f"{prefix}✅ 工具执行成功: {data['output'][:self.preview_chars]}..."
+            else:
+                line = f"{prefix}❌ 工具执行失败: {data['error']}"
+        elif event.type == EventType.RUN_FINISHED:
+            reason = data.get("stop_reason")
+            if reason in (None, "completed", "max_steps"):
+                line = f"\n{prefix}✅ 任务完成! 总共执行了 {data['steps']} 步"
+            else:
+                line = f"\n{prefix}⏹️ 任务提前停止 ({reason})，执行了 {data['steps']} 步"
+            usage = data.get("usage")
+            if usage and usage.get("prompt_tokens"):
+                line += (
+                    f"，提示 {usage['prompt_tokens']} tokens（缓存命中 {usage['cached_tokens'] / usage['prompt_tokens']:.0%}），"
+                    f"输出 {usage['completion_tokens']} tokens"
+                )
+        elif event.type == EventType.WARNING:
+            line = f"{prefix}⚠️ {data['message']}"
+        else:
+            line = f"{prefix}❌ {data['message']}"
+        parts.append(line + "\n")
+
+    def _prefix(self, agent: Optional[str]) -> str:
+        show = self.show_agent if self.show_agent is not None else len(self._agents) > 1
+        return f"[{agent}] " if show and agent else ""
+
+    def _end_line(self, parts: List[str]) -> None:
+        if self._open_line is not None:
+            parts.append("\n")
+            self._open_line = None
+
+
+class JSONLSink(EventSink):
+    """每个事件写成一行JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: IO[bytes] = open(path, "ab")
+
+    def handle(self, events: List[AgentEvent]) -> None:
+        self._file.write(b"".join(fastjson.dumps(event.model_dump(mode="json")) + b"\n" for event in events))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class EventBus:
+    """有界事件队列 + 后台输出线程
+
+    Args:
+        sinks: 输出端，默认输出到控制台
+        max_queue: 队列容量
+        overflow: 队列满时的处理方式，"drop_oldest" 丢弃最早的事件，"drop_newest" 丢弃新事件
+    """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+    def __init__(self, sinks: Optional[List[EventSink]] = None, max_queue: int = 10000, overflow: str = "drop_oldest"):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink()]
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.dropped = 0
+        self._unreported = 0
+        # 全是 NullSink 时 emit 直接返回，不构造事件
+        self._active = any(not isinstance(sink, NullSink) for sink in self.sinks)
+        self._queue: Deque[AgentEvent] = deque()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def emit(self, event_type: EventType, agent: Optional[str] = None, **data: Any) -> None:
+        """发出一个事件，不等待输出"""
+        if not self._active or self._closed:
+            return
+        event = AgentEvent.model_construct(type=event_type, agent=agent, timestamp=time.time(), data=data)
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                self._unreported += 1
+                if self.overflow == "drop_newest":
+                    return
+                self._queue.popleft()
+            self._queue.append(event)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._consume, name="mini-agent-events", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已发出的事件全部写出，返回是否在超时前完成（不要在事件循环中频繁调用）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        """写出剩余事件并关闭所有输出端"""
+        if self._closed:
+            return
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        for sink in self.sinks:
+            sink.close()
+
+    def _consume(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                dropped, self._unreported = self._unreported, 0
+                self._busy = True
+            if dropped:
+                batch.insert(0, AgentEvent.model_construct(
+                    type=EventType.WARNING, agent=None, timestamp=time.time(),
+                    data={"message": f"事件队列已满，丢弃了 {dropped} 个事件"},
+                ))
+            for sink in self.sinks:
+                try:
+                    sink.handle(batch)
+                except Exception as e:  # 输出端出错不能影响代理
+                    sys.stderr.write(f"事件输出失败: {type(e).__name__}: {e}\n")
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """全局默认事件总线（输出到控制台）"""
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus()
+    return _event_bus
+
+
+def set_event_bus(bus: EventBus) -> None:
+    """设置全局默认事件总线（在创建代理之前设置）"""
+    global _event_bus
+    _event_bus = bus
+
+
+@atexit.register
+def _flush_default_bus() -> None:
+    if _event_bus is not None:
+        _event_bus.flush(timeout=5)
@@ -0,0 +1,24 @@
+"""
+JSON编解码，安装了 orjson 时自动使用
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为紧凑的UTF-8 JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """解码JSON字符串或字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
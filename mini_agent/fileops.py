@@ -0,0 +1,306 @@
+"""
+面向大文件的文件操作
+
+所有读取操作都只读取需要的部分并受输出上限约束，不会把整个文件读进内存：按行或按字节
+范围读取、head/tail、基于 mmap 的正则搜索；写入分块进行并通过临时文件原子替换。
+这些函数都是同步的：FileEditor 把写入和大文件上的操作放到线程池中执行，小文件直接在
+事件循环中读取。
+"""
+import mmap
+import os
+import re
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_OUTPUT = 64 * 1024
+
+
+def decode(data: bytes) -> str:
+    """解码UTF-8，范围边界切断的字符替换为占位符"""
+    return data.decode("utf-8", errors="replace")
+
+
+def cap_output(data: bytes, max_output: int, hint: str = "") -> Tuple[str, bool]:
+    """把输出限制在 max_output 字节以内，返回 (文本, 是否截断)"""
+    if len(data) <= max_output:
+        return decode(data), False
+    # 在字符边界处截断
+    text = data[:max_output].decode("utf-8", errors="ignore")
+    return text + f"\n...[输出超过 {max_output} 字节，已截断{hint}]", True
+
+
+def _seek_line(f, line: int) -> int:
+    """把文件位置移到第 line 行（从1开始）的开头，返回该位置；行数不足时停在文件末尾"""
+    remaining = line - 1
+    position = 0
+    f.seek(0)
+    while remaining > 0:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        count = chunk.count(b"\n")
+        if count < remaining:
+            remaining -= count
+            position += len(chunk)
+            continue
+        index = -1
+        for _ in range(remaining):
+            index = chunk.index(b"\n", index + 1)
+        position += index + 1
+        remaining = 0
+    f.seek(position)
+    return position
+
+
+def _read_lines(f, max_lines: Optional[int], max_output: int) -> bytes:
+    """从当前位置读取至多 max_lines 行，最多比上限多读一个字节用于判断截断"""
+    parts: List[bytes] = []
+    size = 0
+    lines = 0
+    while size <= max_output:
+        chunk = f.read(min(CHUNK_SIZE, max_output + 1 - size))
+        if not chunk:
+            break
+        if max_lines is not None:
+            count = chunk.count(b"\n")
+            if lines + count >= max_lines:
+                index = -1
+                for _ in range(max_lines - lines):
+                    index = chunk.index(b"\n", index + 1)
+                parts.append(chunk[:index + 1])
+                size += index + 1
+                break
+            lines += count
+        parts.append(chunk)
+        size += len(chunk)
+    return b"".join(parts)
+
+
+def read(
+    path: str,
+    start_line: Optional[int] = None,
+    max_lines: Optional[int] = None,
+    byte_offset: Optional[int] = None,
+    byte_length: Optional[int] = None,
+    max_output: int = DEFAULT_MAX_OUTPUT,
+) -> Tuple[str, bool]:
+    """按行范围或字节范围读取文件，都不指定时从头读取"""
+    with open(path, "rb") as f:
+        if byte_offset is not None or byte_length is not None:
+            f.seek(max(0, byte_offset or 0))
+            length = max_output + 1 if byte_length is None else min(byte_length, max_output + 1)
+            data = f.read(max(0, length))
+        else:
+            if start_line is not None and start_line > 1:
+                _seek_line(f, start_line)
+            data = _read_lines(f, max_lines, max_output)
+        file_size = os.fstat(f.fileno()).st_size
+    return cap_output(data, max_output, f"，文件共 {file_size} 字节，可用 start_line/max_lines 或 byte_offset/byte_length 分段读取")
+
+
+def head(path: str, lines: int = 20, max_output: int = DEFAULT_MAX_OUTPUT) -> Tuple[str, bool]:
+    """读取前 lines 行"""
+    with open(path, "rb") as f:
+        data = _read_lines(f, max(0, lines), max_output)
+    return cap_output(data, max_output)
+
+
+def tail(path: str, lines: int = 20, max_output: int = DEFAULT_MAX_OUTPUT) -> Tuple[str, bool]:
+    """从文件末尾向前分块读取最后 lines 行"""
+    if lines <= 0:
+        return "", False
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        chunks: List[bytes] = []
+        newlines = 0
+        size = 0
+        # 末尾的换行不算作一行的分隔
+        f.seek(max(0, end - 1))
+        needed = lines + (1 if end and f.read(1) == b"\n" else 0)
+        while position > 0 and newlines < needed and size <= max_output:
+            step = min(CHUNK_SIZE, position)
+            position -= step
+            f.seek(position)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+            size += step
+    data = b"".join(reversed(chunks))
+    # 去掉多读的行
+    excess = newlines - needed
+    if excess >= 0:
+        index = -1
+        for _ in range(excess + 1):
+            index = data.index(b"\n", index + 1)
+        data = data[index + 1:]
+    if len(data) > max_output:
+        # 超出上限时保留最靠近末尾的部分
+        text = data[-max_output:].decode("utf-8", errors="ignore")
+        return f"...[输出超过 {max_output} 字节，已截断开头]\n" + text, True
+    return decode(data), False
+
+
+def _line_bounds(view: mmap.mmap, start: int, end: int) -> Tuple[int, int]:
+    """包含 [start, end) 的整行范围（不含行尾换行）"""
+    line_start = view.rfind(b"\n", 0, start) + 1
+    line_end = view.find(b"\n", end)
+    return line_start, len(view) if line_end < 0 else line_end
+
+
+def _search_lines(view: mmap.mmap, regex: "re.Pattern[bytes]") -> Iterator[Tuple[int, int, int]]:
+    """逐个产出匹配行 (行号, 行首, 行尾)，同一行的多个匹配只产出一次"""
+    line_number = 1
+    counted = 0  # 已统计换行数的位置
+    position = 0
+    size = len(view)
+    while position <= size:
+        match = regex.search(view, position)
+        if match is None:
+            return
+        line_start, line_end = _line_bounds(view, match.start(), match.start())
+        line_number += view[counted:line_start].count(b"\n")
+        counted = line_start
+        yield line_number, line_start, line_end
+        position = line_end + 1
+
+
+def grep(
+    path: str,
+    pattern: str,
+    context: int = 0,
+    max_matches: int = 100,
+    ignore_case: bool = False,
+    max_output: int = DEFAULT_MAX_OUTPUT,
+) -> Tuple[str, bool]:
+    """在映射的文件中搜索正则表达式，返回匹配行及其上下文（格式同 grep -n）"""
+    # 按行匹配：^ 和 $ 匹配每一行的开头和结尾
+    regex = re.compile(pattern.encode("utf-8"), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return "没有匹配的行", False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            parts: List[bytes] = []
+            size = 0
+            matches = 0
+            last_printed = 0  # 已输出的最后一行
+            truncated = False
+            for line_number, line_start, line_end in _search_lines(view, regex):
+                if matches >= max_matches or size > max_output:
+                    truncated = True
+                    break
+                matches += 1
+                first_part = len(parts)
+                # 前文：从匹配行向前找 context 行，跳过已经输出过的
+                before: List[Tuple[int, bytes]] = []
+                cursor = line_start
+                for offset in range(1, context + 1):
+                    if cursor == 0 or line_number - offset <= last_printed:
+                        break
+                    previous_start = view.rfind(b"\n", 0, cursor - 1) + 1
+                    before.append((line_number - offset, view[previous_start:cursor - 1]))
+                    cursor = previous_start
+                if last_printed and line_number - len(before) > last_printed + 1:
+                    parts.append(b"--\n")
+                for number, text in reversed(before):
+                    parts.append(b"%d-%s\n" % (number, text))
+                parts.append(b"%d:%s\n" % (line_number, view[line_start:line_end]))
+                last_printed = line_number
+                # 后文：最多 context 行，遇到下一个匹配行时停下，留给下一次循环输出
+                cursor = line_end + 1
+                for offset in range(1, context + 1):
+                    if cursor >= len(view):
+                        break
+                    next_end = view.find(b"\n", cursor)
+                    next_end = len(view) if next_end < 0 else next_end
+                    if regex.search(view, cursor, next_end) is not None:
+                        break  # 下一行本身是匹配行，留给下一次输出
+                    parts.append(b"%d-%s\n" % (line_number + offset, view[cursor:next_end]))
+                    last_printed = line_number + offset
+                    cursor = next_end + 1
+                size += sum(len(part) for part in parts[first_part:])
+    if not matches:
+        return "没有匹配的行", False
+    text, capped = cap_output(b"".join(parts), max_output)
+    if truncated and not capped:
+        text += f"...[已显示前 {matches} 个匹配，结果已截断]"
+    return text, truncated or capped
+
+
+def append(path: str, content: str) -> int:
+    """在文件末尾追加内容，返回写入的字节数"""
+    data = content.encode("utf-8")
+    with open(path, "ab") as f:
+        f.write(data)
+    return len(data)
+
+
+def _new_file_mode(temp_path: str) -> int:
+    """新建文件的默认权限：以 0666 创建一个探测文件，由系统按 umask 决定权限
+
+    umask 只能通过 os.umask 设置来读取，那会影响其他线程同时创建的文件。
+    """
+    probe = temp_path + ".mode"
+    fd = os.open(probe, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        return os.fstat(fd).st_mode & 0o7777
+    finally:
+        os.close(fd)
+        os.remove(probe)
+
+
+def atomic_write(path: str, content: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """分块写入同目录下的临时文件后原子替换目标文件，返回写入的字节数
+
+    写入过程中崩溃不会留下只写了一半的目标文件；已存在的文件保留原来的权限。
+    目标是符号链接时写入它指向的文件，链接本身保留。
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    data = content.encode("utf-8")
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            view = memoryview(data)
+            for start in range(0, len(data), chunk_size):
+                f.write(view[start:start + chunk_size])
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = _new_file_mode(temp_path)
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return len(data)
+
+
+def list_dir(path: str, offset: int = 0, limit: int = 200, max_output: int = DEFAULT_MAX_OUTPUT) -> Tuple[str, bool]:
+    """流式遍历目录，返回从 offset 开始的至多 limit 个条目（目录名后加 /）"""
+    names: List[str] = []
+    size = 0
+    has_more = False
+    with os.scandir(path) as entries:
+        for index, entry in enumerate(entries):
+            if index < offset:
+                continue
+            if len(names) >= limit or size > max_output:
+                has_more = True
+                break
+            try:
+                name = entry.name + "/" if entry.is_dir() else entry.name
+            except OSError:
+                name = entry.name
+            names.append(name)
+            size += len(name.encode("utf-8")) + 1
+    output = "\n".join(names)
+    if has_more:
+        output += f"\n...[还有更多条目，使用 offset={offset + len(names)} 继续列出]"
+    return output, has_more
@@ -1,50 +1,324 @@
 """
 LLM接口实现
+
+openai SDK 在第一次发送请求（创建客户端）时才导入，只构造 SimpleLLM 的进程不付出导入开销。
 """
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+import asyncio
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
 from pydantic import BaseModel
 
+from mini_agent import deadline, fastjson
+from mini_agent.cache import ResponseCache
+from mini_agent.clients import ClientRegistry, get_default_registry
+from mini_agent.errors import LLMDeadlineError, LLMError, LLMRateLimitError, to_llm_error, transport_errors
+from mini_agent.events import EventBus, EventType, get_event_bus
+from mini_agent.ratelimit import RateLimiter
+from mini_agent.retry import RetryPolicy
+from mini_agent.tokens import count_messages_tokens
+from mini_agent.tracing import Tracer, current_span, get_tracer
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 
 class LLMResponse(BaseModel):
-    """LLM响应结果"""
+    """LLM响应结果
+    
+    usage 包含 prompt_tokens、completion_tokens、total_tokens 和 cached_tokens
+    （提示中命中服务端前缀缓存的token数）。replayed 表示响应从响应缓存重放，没有发送请求。
+    """
     content: Optional[str] = None
     tool_calls: Optional[List[Dict[str, Any]]] = None
+    usage: Optional[Dict[str, int]] = None
+    replayed: bool = False
+
+
+def parse_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """把响应中的 usage 转换为字典，兼容不同服务商报告缓存命中的字段"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)  # DeepSeek
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "total_tokens": usage.total_tokens or 0,
+        "cached_tokens": cached or 0,
+    }
+
+
+class UsageStats(BaseModel):
+    """多次LLM调用的token用量合计"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    replayed: int = 0  # 从响应缓存重放、没有发送请求的调用数（不计入 calls 和 token）
+    
+    def add(self, usage: Optional[Dict[str, int]]) -> None:
+        self.calls += 1
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_tokens += usage.get("cached_tokens", 0)
+    
+    def record(self, response: LLMResponse) -> None:
+        """计入一次调用的响应，重放的响应只计入 replayed"""
+        if response.replayed:
+            self.replayed += 1
+        else:
+            self.add(response.usage)
+    
+    @property
+    def cache_hit_rate(self) -> float:
+        """提示token中命中前缀缓存的比例"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class StreamEvent(BaseModel):
+    """流式响应事件
+    
+    type 为 "content" 时 delta 是新到达的文本片段；
+    type 为 "tool_call" 时 tool_call 是一个参数已完整的工具调用。
+    """
+    type: str
+    delta: Optional[str] = None
+    tool_call: Optional[Dict[str, Any]] = None
+
+
+class LLMStream:
+    """流式响应
+    
+    异步迭代得到 StreamEvent，迭代结束后 get_response() 返回与 chat() 相同的 LLMResponse。
+    调用失败时迭代过程中抛出 LLMError。没有读完就放弃时调用 aclose() 关闭底层的HTTP响应。
+    """
+    
+    def __init__(
+        self,
+        open_stream: Callable[[], Awaitable[Any]],
+        tracer: Optional[Tracer] = None,
+        model: Optional[str] = None,
+        on_usage: Optional[Callable[[Optional[Dict[str, int]]], None]] = None
+    ):
+        self._open_stream = open_stream
+        self._on_usage = on_usage
+        self._tracer = tracer if tracer is not None else get_tracer()
+        self._model = model
+        self._content: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, Any]] = {}
+        self._emitted: set = set()
+        self._usage: Optional[Dict[str, int]] = None
+        self._response: Optional[LLMResponse] = None
+        self._iterator: Optional[AsyncIterator[StreamEvent]] = None
+        self._stream: Any = None
+    
+    def __aiter__(self) -> AsyncIterator[StreamEvent]:
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+    
+    async def get_response(self) -> LLMResponse:
+        """消费剩余的事件并返回完整响应"""
+        async for _ in self:
+            pass
+        assert self._response is not None
+        return self._response
+    
+    async def aclose(self) -> None:
+        """停止迭代并关闭底层的流（openai 的 AsyncStream.close() 关闭HTTP响应，连接不再被占用）"""
+        if self._iterator is not None:
+            await self._iterator.aclose()  # type: ignore[attr-defined]
+        stream, self._stream = self._stream, None
+        if stream is not None and hasattr(stream, "close"):
+            await stream.close()
+    
+    async def _iterate(self) -> AsyncIterator[StreamEvent]:
+        # 迭代跨越多次 yield，Span 不设为当前 Span，只记录首个分片的延迟和总耗时
+        span = self._tracer.start_span("llm.stream", model=self._model)
+        first_chunk = True
+        try:
+            stream = self._stream = await self._open_stream()
+            async for chunk in stream:
+                if first_chunk:
+                    span.set_attribute("first_chunk_ms", round(span.duration_ms, 3))
+                    first_chunk = False
+                # 请求了 include_usage 时，最后一个分片（choices 为空）带有用量
+                if getattr(chunk, "usage", None) is not None:
+                    self._usage = parse_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                
+                if delta.content:
+                    self._content.append(delta.content)
+                    yield StreamEvent(type="content", delta=delta.content)
+                
+                for fragment in delta.tool_calls or []:
+                    # 新的调用出现时，之前的调用都已接收完整
+                    for event in self._flush_tool_calls(before=fragment.index):
+                        yield event
+                    event = self._add_fragment(fragment)
+                    if event:
+                        yield event
+            
+            for event in self._flush_tool_calls():
+                yield event
+            
+            self._response = LLMResponse(
+                content="".join(self._content) or None,
+                tool_calls=[self._tool_calls[i] for i in sorted(self._tool_calls)] or None,
+                usage=self._usage
+            )
+            if self._on_usage is not None:
+                self._on_usage(self._usage)
+            if self._usage:
+                span.set_attribute("prompt_tokens", self._usage["prompt_tokens"])
+                span.set_attribute("completion_tokens", self._usage["completion_tokens"])
+                span.set_attribute("cached_tokens", self._usage["cached_tokens"])
+        except transport_errors() as e:
+            # 建立连接时的错误已在 _create 中重试；接收途中断开时直接失败
+            error = to_llm_error(e)
+            span.record_error(error)
+            raise error from e
+        except (Exception, asyncio.CancelledError) as e:
+            span.record_error(e)
+            raise
+        finally:
+            self._tracer.end_span(span)
+    
+    def _add_fragment(self, fragment: Any) -> Optional[StreamEvent]:
+        """拼接工具调用的参数片段，参数JSON完整时立即返回就绪事件"""
+        tool_call = self._tool_calls.setdefault(fragment.index, {
+            "id": None,
+            "type": "function",
+            "function": {"name": "", "arguments": ""}
+        })
+        if fragment.id:
+            tool_call["id"] = fragment.id
+        if fragment.function:
+            if fragment.function.name:
+                tool_call["function"]["name"] += fragment.function.name
+            if fragment.function.arguments:
+                tool_call["function"]["arguments"] += fragment.function.arguments
+        
+        arguments = tool_call["function"]["arguments"]
+        if fragment.index not in self._emitted and arguments.rstrip().endswith("}"):
+            try:
+                fastjson.loads(arguments)
+            except ValueError:
+                return None
+            self._emitted.add(fragment.index)
+            return StreamEvent(type="tool_call", tool_call=tool_call)
+        return None
+    
+    def _flush_tool_calls(self, before: Optional[int] = None) -> List[StreamEvent]:
+        """为尚未发出就绪事件的调用补发事件"""
+        events = []
+        for index in sorted(self._tool_calls):
+            if before is not None and index >= before:
+                break
+            if index not in self._emitted:
+                self._emitted.add(index)
+                events.append(StreamEvent(type="tool_call", tool_call=self._tool_calls[index]))
+        return events
+
+
+async def close_stream(stream: Any) -> None:
+    """关闭流式调用；不支持关闭的流（例如测试用的模拟流）直接跳过，关闭失败不影响调用方"""
+    close = getattr(stream, "aclose", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception:
+        pass
 
 
 class SimpleLLM:
     """简化的LLM接口"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = "https://api.openai.com/v1"):
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o-mini",
+        base_url: str = "https://api.openai.com/v1",
+        temperature: float = 0.7,
+        cache: Optional[ResponseCache] = None,
+        cache_nondeterministic: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        client: Optional["AsyncOpenAI"] = None,
+        registry: Optional[ClientRegistry] = None,
+        retry: Optional[RetryPolicy] = None,
+        tracer: Optional[Tracer] = None,
+        events: Optional[EventBus] = None,
+        stream_usage: bool = True
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
         self.model = model
+        self.temperature = temperature
+        
+        # 流式请求是否要求服务端在最后一个分片中返回用量（stream_options.include_usage）
+        self.stream_usage = stream_usage
+        
+        # 所有调用的token用量合计（多个代理共享同一实例时是它们的总和）
+        self.usage = UsageStats()
+        self._system_message: Dict[str, Any] = {}
+        
+        # 响应缓存：默认只缓存 temperature 为 0 的确定性请求
+        self.cache = cache
+        self.cache_nondeterministic = cache_nondeterministic
+        
+        # 限流器可以在多个 SimpleLLM 实例之间共享
+        self.rate_limiter = rate_limiter
+        
+        # 限流、超时、连接失败和服务端错误按退避策略重试
+        self.retry = retry or RetryPolicy()
+        
+        # 追踪器，默认使用全局追踪器（默认关闭）
+        self.tracer = tracer if tracer is not None else get_tracer()
+        self.events = events if events is not None else get_event_bus()
+        
+        # 默认从注册表借用共享客户端，复用连接池
+        self._client = client
+        self.registry = registry
     
-    async def chat(
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """API客户端：显式传入的客户端，或从注册表借用的共享客户端"""
+        if self._client is not None:
+            return self._client
+        registry = self.registry if self.registry is not None else get_default_registry()
+        return registry.get(self.api_key, self.base_url)
+    
+    def _build_request(
         self, 
         messages: List[Dict[str, Any]], 
         system_prompt: Optional[str] = None,
         tools: Optional[List[Dict[str, Any]]] = None
-    ) -> LLMResponse:
-        """发送聊天请求"""
+    ) -> Dict[str, Any]:
+        """构建请求参数
         
-        # 构建消息列表
-        chat_messages = []
+        顺序固定为 系统提示 -> 对话历史，工具定义单独传入（ToolCollection 缓存，顺序不变），
+        历史消息原样引用而不复制或改写，相邻两步请求的前缀逐字节相同，服务端的提示缓存才能命中。
+        """
         
-        # 添加系统消息
+        # 构建消息列表，系统消息对象在提示词不变时复用
         if system_prompt:
-            chat_messages.append({"role": "system", "content": system_prompt})
-        
-        # 添加对话历史
-        chat_messages.extend(messages)
+            if self._system_message.get("content") != system_prompt:
+                self._system_message = {"role": "system", "content": system_prompt}
+            chat_messages = [self._system_message]
+            chat_messages.extend(messages)
+        else:
+            chat_messages = list(messages)
         
         # 构建请求参数
         request_params = {
             "model": self.model,
             "messages": chat_messages,
-            "temperature": 0.7,
+            "temperature": self.temperature,
         }
         
         # 如果有工具，添加工具调用参数
@@ -52,31 +326,135 @@ class SimpleLLM:
             request_params["tools"] = tools
             request_params["tool_choice"] = "auto"
         
-        try:
-            # 调用OpenAI API
-            response = await self.client.chat.completions.create(**request_params)
-            
-            message = response.choices[0].message
-            
-            # 解析响应
-            result = LLMResponse()
-            result.content = message.content
-            
-            # 解析工具调用
-            if message.tool_calls:
-                result.tool_calls = []
-                for tool_call in message.tool_calls:
-                    result.tool_calls.append({
-                        "id": tool_call.id,
-                        "type": "function",
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments
-                        }
-                    })
-            
+        return request_params
+    
+    async def chat(
+        self, 
+        messages: List[Dict[str, Any]], 
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> LLMResponse:
+        """发送聊天请求，重试后仍失败时抛出 LLMError"""
+        request_params = self._build_request(messages, system_prompt, tools)
+        with self.tracer.span("llm.chat", model=self.model) as span:
+            result = await self._chat(request_params, span)
+            self.usage.record(result)
+            if result.usage:
+                span.set_attribute("prompt_tokens", result.usage["prompt_tokens"])
+                span.set_attribute("completion_tokens", result.usage["completion_tokens"])
+                span.set_attribute("cached_tokens", result.usage.get("cached_tokens", 0))
             return result
-            
-        except Exception as e:
-            print(f"LLM调用错误: {e}")
-            return LLMResponse(content=f"LLM调用失败: {str(e)}")
\ No newline at end of file
+    
+    async def _chat(self, request_params: Dict[str, Any], span: Any) -> LLMResponse:
+        cache_key = self._cache_key(request_params)
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            span.set_attribute("cache_hit", cached is not None)
+            if cached is not None:
+                # 重放的响应不计入token用量，否则用量和费用统计会把缓存命中算作真实调用
+                return LLMResponse(**dict(cached, usage=None, replayed=True))
+        
+        # 调用OpenAI API
+        response = await self._create(request_params)
+        
+        message = response.choices[0].message
+        
+        # 解析响应
+        result = LLMResponse()
+        result.content = message.content
+        
+        # 解析工具调用
+        if message.tool_calls:
+            result.tool_calls = []
+            for tool_call in message.tool_calls:
+                result.tool_calls.append({
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    }
+                })
+        
+        result.usage = parse_usage(response.usage)
+        
+        if cache_key is not None:
+            await self.cache.aput(cache_key, result.model_dump(exclude={"replayed"}))
+        return result
+    
+    async def _create(self, request_params: Dict[str, Any]) -> Any:
+        """调用API，可重试的错误按退避策略重试
+
+        设置了截止时间（mini_agent.deadline）时，每次请求的超时不超过剩余时间，
+        剩余时间不够等待退避时不再重试。
+        """
+        attempt = 0
+        while True:
+            left = deadline.remaining()
+            if left is not None and left <= 0:
+                raise LLMDeadlineError("超出截止时间", attempts=attempt)
+            try:
+                return await self._create_once(request_params if left is None else dict(request_params, timeout=left))
+            except LLMError as error:
+                if not error.retryable or attempt >= self.retry.max_retries:
+                    error.attempts = attempt + 1
+                    raise
+                delay = self.retry.backoff(attempt, error.retry_after)
+                left = deadline.remaining()
+                if left is not None and delay >= left:
+                    raise LLMDeadlineError(f"超出截止时间，不再重试: {error}", error.status_code, attempts=attempt + 1) from error
+                attempt += 1
+                current_span().set_attribute("retries", attempt)
+                self.events.emit(
+                    EventType.LLM_RETRY, error=f"{type(error).__name__}: {error}", delay=delay, attempt=attempt
+                )
+                await asyncio.sleep(delay)
+    
+    async def _create_once(self, request_params: Dict[str, Any]) -> Any:
+        """在限流器的配额内调用一次API，异常统一转换为 LLMError"""
+        limiter = self.rate_limiter
+        if limiter is None:
+            try:
+                return await self.client.chat.completions.create(**request_params)
+            except transport_errors() as e:
+                raise to_llm_error(e) from e
+        
+        # 只有按token限流时才需要预估token数
+        estimated = count_messages_tokens(request_params["messages"]) if limiter.tokens_per_minute else 0
+        async with limiter.limit(estimated):
+            try:
+                response = await self.client.chat.completions.create(**request_params)
+            except transport_errors() as e:
+                error = to_llm_error(e)
+                if isinstance(error, LLMRateLimitError):
+                    limiter.on_rate_limited(error.retry_after)
+                raise error from e
+        limiter.on_success()
+        usage = getattr(response, "usage", None)
+        if estimated and usage is not None:
+            limiter.record_usage(estimated, usage.total_tokens)
+        return response
+    
+    def _cache_key(self, request_params: Dict[str, Any]) -> Optional[str]:
+        """可以使用缓存时返回缓存键，否则返回None"""
+        if self.cache is None:
+            return None
+        if request_params.get("temperature", 0) > 0 and not self.cache_nondeterministic:
+            self.cache.stats.bypassed += 1
+            return None
+        return self.cache.make_key({"base_url": self.base_url, **request_params})
+    
+    def chat_stream(
+        self, 
+        messages: List[Dict[str, Any]], 
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> LLMStream:
+        """发送流式聊天请求，文本片段和完整的工具调用到达后立即产出"""
+        request_params = self._build_request(messages, system_prompt, tools)
+        request_params["stream"] = True
+        if self.stream_usage:
+            request_params["stream_options"] = {"include_usage": True}
+        return LLMStream(
+            lambda: self._create(request_params), tracer=self.tracer, model=self.model, on_usage=self.usage.add
+        )
@@ -0,0 +1,143 @@
+"""
+LLM请求限流
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+
+class TokenBucket:
+    """令牌桶：以固定速率补充令牌，取不到时异步等待"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """取出 amount 个令牌；等待者按先来后到排队"""
+        amount = min(amount, self.capacity)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """不等待地扣除（或退还）令牌，余额可以为负，之后的请求相应地多等"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    def set_rate(self, rate: float) -> None:
+        """调整补充速率（已累积的令牌按旧速率结算）"""
+        self._refill()
+        self.rate = rate
+
+
+class RateLimiter:
+    """多个代理共享的LLM请求限流器
+
+    按每分钟请求数和每分钟token数两个令牌桶限流。adaptive 为 True 时，
+    收到 429 会把速率减半并让所有请求暂停到 Retry-After 之后，
+    之后每次成功的请求逐步恢复速率（AIMD），使吞吐稳定在服务端实际配额附近。
+
+    Args:
+        requests_per_minute: 每分钟最多发出的请求数，None表示不限制
+        max_concurrent: 同时进行中的请求数上限，None表示不限制
+        tokens_per_minute: 每分钟最多消耗的token数，None表示不限制
+        adaptive: 是否根据 429 自动调整速率
+        min_rate_ratio: 自动降速的下限（相对配置速率的比例）
+        recovery_ratio: 每次成功请求恢复的速率（相对配置速率的比例）
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        max_concurrent: Optional[int] = None,
+        tokens_per_minute: Optional[float] = None,
+        adaptive: bool = True,
+        min_rate_ratio: float = 0.1,
+        recovery_ratio: float = 0.05,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrent = max_concurrent
+        self.tokens_per_minute = tokens_per_minute
+        self.adaptive = adaptive
+        self.min_rate_ratio = min_rate_ratio
+        self.recovery_ratio = recovery_ratio
+        self.rate_limited = 0
+        self._requests = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    @property
+    def _buckets(self) -> List[TokenBucket]:
+        return [bucket for bucket in (self._requests, self._tokens) if bucket is not None]
+
+    async def acquire(self, tokens: float = 0) -> None:
+        """等待发出一个请求的配额；tokens 为预估的token消耗"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self._requests is not None:
+            await self._requests.acquire()
+        if self._tokens is not None and tokens > 0:
+            await self._tokens.acquire(tokens)
+
+    @asynccontextmanager
+    async def limit(self, tokens: float = 0) -> AsyncIterator[None]:
+        """在配额和并发上限内执行一次请求"""
+        if self.max_concurrent and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore is not None:
+            async with self._semaphore:
+                await self.acquire(tokens)
+                yield
+        else:
+            await self.acquire(tokens)
+            yield
+
+    def record_usage(self, estimated: float, actual: float) -> None:
+        """用响应中的实际token数修正预估值"""
+        if self._tokens is not None:
+            self._tokens.consume(actual - estimated)
+
+    def on_success(self) -> None:
+        """请求成功：逐步恢复速率"""
+        if not self.adaptive:
+            return
+        for bucket in self._buckets:
+            if bucket.rate < bucket.max_rate:
+                bucket.set_rate(min(bucket.max_rate, bucket.rate + bucket.max_rate * self.recovery_ratio))
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """收到 429：所有请求暂停到 Retry-After 之后，并把速率减半"""
+        self.rate_limited += 1
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else 1.0
+        self._paused_until = max(self._paused_until, now + pause)
+        if not self.adaptive:
+            return
+        # 同一波并发请求会同时收到 429，只按一次降速
+        if now - self._last_decrease < max(pause, 1.0):
+            return
+        self._last_decrease = now
+        for bucket in self._buckets:
+            bucket.set_rate(max(bucket.max_rate * self.min_rate_ratio, bucket.rate / 2))
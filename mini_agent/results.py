@@ -0,0 +1,228 @@
+"""
+超大工具结果的落盘存储
+
+工具结果原样写入记忆后，之后的每一步都会把它再发给模型。超过阈值的结果改为写入
+本地的内容寻址存储（按 SHA-256 命名，相同内容只保存一份），记忆中只保留开头和结尾的
+预览以及一个句柄，模型需要时再通过 read_result 工具分页查看完整内容。
+
+工具输出可能包含密钥等敏感内容：存储目录只允许当前用户访问（0700），默认是每个进程
+私有的临时目录，关闭时删除；总大小超过上限或超过保留期的结果被淘汰，对应的句柄随之失效。
+
+代理通过 acompact() 在线程池中落盘，写文件、统计目录大小和淘汰都不阻塞事件循环。
+"""
+import asyncio
+import atexit
+import hashlib
+import os
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+HANDLE_PREFIX = "result:"
+HANDLE_PATTERN = re.compile(r"^(?:result:)?([0-9a-f]{16,64})$")
+
+
+class ResultStore:
+    """内容寻址的工具结果存储
+
+    Args:
+        directory: 存放结果的目录，不存在时以 0700 权限创建，已存在时必须属于当前用户；
+            默认在第一次使用时创建进程私有的临时目录，close() 时删除（代理设置了会话日志时
+            使用会话旁边的目录，恢复的会话中的句柄依然有效）
+        threshold: 超过该字符数的结果才落盘，None 表示从不落盘
+        head_chars: 预览保留的开头字符数
+        tail_chars: 预览保留的结尾字符数
+        max_bytes: 目录中结果的总大小上限，超出时淘汰最早写入的结果，None 表示不限制
+        max_age: 结果的保留时间（秒），None 表示不限制
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        threshold: Optional[int] = 16 * 1024,
+        head_chars: int = 2000,
+        tail_chars: int = 1000,
+        max_bytes: Optional[int] = 256 * 1024 * 1024,
+        max_age: Optional[float] = 7 * 24 * 3600,
+    ):
+        self._directory = directory
+        self._owned = False  # 目录是否由本对象创建（关闭时删除）
+        self._checked = False
+        self.threshold = threshold
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.spilled = 0
+        self.saved_chars = 0  # 因落盘而没有写入记忆的字符数
+        self.evicted = 0
+        self._size: Optional[int] = None  # 目录中结果的总大小，第一次写入时统计
+        self._lock = threading.RLock()  # 线程池中的多个线程同时落盘
+
+    @property
+    def directory(self) -> str:
+        """存放结果的目录，第一次访问时创建并检查权限"""
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="mini_agent_results-")  # mkdtemp 以 0700 创建
+            self._owned = True
+            self._checked = True
+            atexit.register(self.close)
+        elif not self._checked:
+            os.makedirs(self._directory, mode=0o700, exist_ok=True)
+            self._check_private(self._directory)
+            self._checked = True
+        return self._directory
+
+    @staticmethod
+    def _check_private(directory: str) -> None:
+        """目录必须属于当前用户，组和其他用户的权限被收回"""
+        info = os.stat(directory)
+        if hasattr(os, "getuid") and info.st_uid != os.getuid():
+            raise PermissionError(f"结果目录不属于当前用户: {directory}")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(directory, stat.S_IMODE(info.st_mode) & 0o700)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold is not None
+
+    def should_spill(self, content: str) -> bool:
+        return self.threshold is not None and len(content) > max(self.threshold, self.head_chars + self.tail_chars)
+
+    def compact(self, content: str) -> Tuple[str, Optional[str]]:
+        """超过阈值的结果落盘，返回 (写入记忆的文本, 句柄)；未落盘时句柄为None"""
+        if not self.should_spill(content):
+            return content, None
+        handle = self.put(content)
+        omitted = len(content) - self.head_chars - self.tail_chars
+        preview = (
+            content[:self.head_chars]
+            + f"\n...[省略 {omitted} 个字符，完整结果共 {len(content)} 个字符，已保存为 {handle}，"
+            f"可用 read_result 工具按行/字节范围读取或搜索]...\n"
+            + (content[-self.tail_chars:] if self.tail_chars else "")
+        )
+        with self._lock:
+            self.spilled += 1
+            self.saved_chars += len(content) - len(preview)
+        return preview, handle
+
+    async def acompact(self, content: str) -> Tuple[str, Optional[str]]:
+        """异步版本的 compact()：需要落盘时在线程池中执行"""
+        if not self.should_spill(content):
+            return content, None
+        return await asyncio.get_running_loop().run_in_executor(None, self.compact, content)
+
+    def put(self, content: str) -> str:
+        """保存内容并返回句柄，相同内容只写一次"""
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            return self._put(data, digest)
+
+    def _put(self, data: bytes, digest: str) -> str:
+        path = self._path(digest)
+        if os.path.exists(path):
+            os.utime(path)  # 重新写入的结果按最近写入的时间淘汰
+        else:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            # 先写临时文件再改名，并发写入同一内容时不会读到半个文件；mkstemp 以 0600 创建
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self._size += len(data)
+            if self.max_bytes is not None and self._size > self.max_bytes:
+                self._cleanup()
+        return HANDLE_PREFIX + digest[:16]
+
+    def cleanup(self) -> int:
+        """删除超过保留期的结果，再按写入时间从早到晚删除，直到总大小降到上限的 80%，返回删除的数量"""
+        with self._lock:
+            return self._cleanup()
+
+    def _cleanup(self) -> int:
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+        target = self.max_bytes * 0.8 if self.max_bytes is not None else None
+        removed = 0
+        for path, size, mtime in entries:
+            if not ((cutoff is not None and mtime < cutoff) or (target is not None and total > target)):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        self._size = total
+        self.evicted += removed
+        return removed
+
+    def close(self) -> None:
+        """删除自己创建的临时目录；指定的目录保留，只淘汰超出上限和过期的结果"""
+        if self._directory is None:
+            return
+        if self._owned:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._owned = False
+            self._size = None
+        elif os.path.isdir(self._directory):
+            self.cleanup()
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """目录中的全部结果: (路径, 大小, 修改时间)"""
+        entries: List[Tuple[str, int, float]] = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, info.st_size, info.st_mtime))
+        return entries
+
+    def path_for(self, handle: str) -> str:
+        """句柄对应的文件路径，句柄无效或结果不存在时抛出 KeyError"""
+        match = HANDLE_PATTERN.match(handle.strip())
+        if match is None:
+            raise KeyError(f"无效的结果句柄: {handle}")
+        prefix = match.group(1)
+        directory = os.path.join(self.directory, prefix[:2])
+        try:
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and not name.endswith(".tmp"):
+                    return os.path.join(directory, name)
+        except FileNotFoundError:
+            pass
+        raise KeyError(f"结果不存在: {handle}")
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+
+_default_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> ResultStore:
+    """全局默认的结果存储"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore()
+    return _default_store
+
+
+def set_result_store(store: ResultStore) -> None:
+    """设置全局默认的结果存储（在创建代理之前设置）"""
+    global _default_store
+    _default_store = store
@@ -0,0 +1,40 @@
+"""
+LLM请求的重试策略
+"""
+import random
+from typing import Optional
+
+
+class RetryPolicy:
+    """带抖动的指数退避
+
+    第 n 次重试前等待 [0, min(max_delay, base_delay * 2^n)] 之间的随机时长（full jitter），
+    避免大量请求同时失败后又在同一时刻重试。服务端给出 Retry-After 时至少等待这么久，
+    再加一点随机偏移把重试错开。
+
+    Args:
+        max_retries: 最多重试次数，0 表示不重试
+        base_delay: 退避的基准时长（秒）
+        max_delay: 单次等待的上限（秒）
+        jitter: 是否加入随机抖动
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        jitter: bool = True,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试（从0开始）前的等待时长"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        if retry_after is not None:
+            spread = random.uniform(0, self.base_delay) if self.jitter else 0.0
+            return retry_after + spread
+        return random.uniform(0, ceiling) if self.jitter else ceiling
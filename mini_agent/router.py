@@ -0,0 +1,484 @@
+"""
+模型路由：在多个模型（端点）之间分配请求
+
+路由器与 SimpleLLM 接口相同（chat / chat_stream），可以直接交给 MiniAgent，也可以互相嵌套：
+
+- ModelRouter：每一步按自定义函数选择模型，例如工具调用失败后改用更强的模型
+- CascadeRouter：先用便宜、快速的模型，出现配置的信号（工具报错、拒绝回答、步数过多、
+  调用失败）时升级到下一级模型
+- HedgedLLM：主端点在最近延迟的分位数之内没有响应时，向备用端点发送相同的请求，
+  采用先返回的结果并取消较慢的一方
+
+每次路由决定都写入 DecisionLog（可选写入JSONL文件），用于事后调整路由规则：
+
+    router = CascadeRouter({
+        "small": SimpleLLM(api_key, model="gpt-4o-mini"),
+        "large": HedgedLLM(SimpleLLM(api_key, model="gpt-4o"), SimpleLLM(backup_key, model="gpt-4o", base_url=...)),
+    }, escalate_after_steps=6)
+    agent = MiniAgent(router)
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, IO, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from mini_agent import fastjson
+from mini_agent.errors import LLMError
+from mini_agent.llm import LLMResponse, StreamEvent, close_stream
+from mini_agent.tracing import Tracer, get_tracer
+
+# 代理把失败的工具结果写成 "错误: ..."
+TOOL_ERROR_PREFIX = "错误"
+
+# 拒绝回答的常见开头（只检查没有工具调用的回复的开头部分）
+REFUSAL_PATTERN = re.compile(
+    r"^\s*(抱歉|对不起|很抱歉)?[，,。\s]*(我)?(无法|不能|没办法)|"
+    r"^\s*(sorry[,.]?\s*)?i\s*(can'?t|cannot|am unable|'m unable|am not able)",
+    re.IGNORECASE,
+)
+
+
+class RouteContext:
+    """从请求的消息中提取的路由信号（只看当前任务，即最后一条用户消息之后的部分）"""
+
+    __slots__ = ("messages", "step", "tool_errors", "last_tools")
+
+    def __init__(self, messages: List[Dict[str, Any]], step: int, tool_errors: int, last_tools: List[str]):
+        self.messages = messages
+        self.step = step  # 当前是第几次思考，从1开始
+        self.tool_errors = tool_errors  # 当前任务中失败的工具调用数
+        self.last_tools = last_tools  # 上一轮调用的工具
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, Any]]) -> "RouteContext":
+        step, tool_errors = 1, 0
+        last_tools: List[str] = []
+        for message in reversed(messages):
+            role = message.get("role")
+            if role == "user":
+                break
+            if role == "assistant":
+                if step == 1:
+                    last_tools = [call["function"]["name"] for call in message.get("tool_calls") or []]
+                step += 1
+            elif role == "tool" and (message.get("content") or "").startswith(TOOL_ERROR_PREFIX):
+                tool_errors += 1
+        return cls(messages, step, tool_errors, last_tools)
+
+
+def is_refusal(response: LLMResponse) -> bool:
+    """没有工具调用、且以拒绝的措辞开头的回复"""
+    return not response.tool_calls and bool(response.content) and bool(REFUSAL_PATTERN.match(response.content[:200]))
+
+
+def model_name(llm: Any) -> str:
+    return getattr(llm, "model", None) or type(llm).__name__
+
+
+class RouteDecision(BaseModel):
+    """一次路由决定"""
+    router: str  # select / cascade / hedge
+    model: str  # 最终采用其回复的模型
+    reason: str
+    attempts: List[str] = []  # 依次尝试的模型
+    step: int = 0
+    tool_errors: int = 0
+    hedged: bool = False
+    stream: bool = False
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    timestamp: float = 0.0
+
+
+class DecisionLog:
+    """路由决定的记录：内存中保留最近 max_entries 条，指定 path 时每条追加为一行JSON"""
+
+    def __init__(self, max_entries: int = 1000, path: Optional[str] = None):
+        self.decisions: Deque[RouteDecision] = deque(maxlen=max_entries)
+        self.path = path
+        self._file: Optional[IO[bytes]] = open(path, "ab") if path else None
+
+    def record(self, decision: RouteDecision) -> None:
+        self.decisions.append(decision)
+        if self._file is not None:
+            self._file.write(fastjson.dumps(decision.model_dump()) + b"\n")
+            self._file.flush()
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """按模型、原因统计次数"""
+        models: Dict[str, int] = {}
+        reasons: Dict[str, int] = {}
+        for decision in self.decisions:
+            models[decision.model] = models.get(decision.model, 0) + 1
+            reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+        return {"models": models, "reasons": reasons}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ModelRouter:
+    """每一步选择一个模型
+
+    Args:
+        models: 名称 -> LLM（SimpleLLM 或其他路由器），第一个是默认模型
+        select: 根据 RouteContext 返回模型名称，省略时总是使用默认模型，例如
+            `lambda ctx: "large" if ctx.tool_errors else "small"`
+        log: 路由决定的记录，多个路由器可以共享
+    """
+
+    kind = "select"
+
+    def __init__(
+        self,
+        models: Dict[str, Any],
+        select: Optional[Callable[[RouteContext], str]] = None,
+        log: Optional[DecisionLog] = None,
+        tracer: Optional[Tracer] = None,
+    ):
+        if not models:
+            raise ValueError("至少需要一个模型")
+        self.models = dict(models)
+        self.names = list(self.models)
+        self.select = select
+        self.log = log if log is not None else DecisionLog()
+        self.tracer = tracer if tracer is not None else get_tracer()
+
+    @property
+    def model(self) -> str:
+        """默认模型的名称（MiniAgent 据此确定上下文窗口）"""
+        return model_name(self.models[self.names[0]])
+
+    def route(self, context: RouteContext) -> Tuple[str, str]:
+        """返回 (模型名称, 原因)"""
+        if self.select is None:
+            return self.names[0], "default"
+        name = self.select(context)
+        if name not in self.models:
+            raise ValueError(f"路由到未知的模型: {name}")
+        return name, "select"
+
+    def escalate(self, name: str, response: Optional[LLMResponse], error: Optional[LLMError]) -> Optional[Tuple[str, str]]:
+        """得到回复（或调用失败）后是否改用另一个模型，返回 (模型名称, 原因)"""
+        return None
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> LLMResponse:
+        context = RouteContext.from_messages(messages)
+        name, reason = self.route(context)
+        attempts: List[str] = []
+        start = time.perf_counter()
+        with self.tracer.span("llm.route", router=self.kind) as span:
+            while True:
+                attempts.append(name)
+                response: Optional[LLMResponse] = None
+                error: Optional[LLMError] = None
+                try:
+                    response = await self.models[name].chat(messages=messages, system_prompt=system_prompt, tools=tools)
+                except LLMError as e:
+                    error = e
+                following = self.escalate(name, response, error)
+                if following is None:
+                    break
+                name, reason = following
+            span.set_attribute("model", name)
+            span.set_attribute("reason", reason)
+            self._record(context, name, reason, attempts, start, error=error)
+        if error is not None:
+            raise error
+        assert response is not None
+        return response
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Any:
+        """流式请求只在开始前路由：已经产出的事件无法撤回，回复之后不再升级"""
+        context = RouteContext.from_messages(messages)
+        name, reason = self.route(context)
+        self._record(context, name, reason, [name], None, stream=True)
+        return self.models[name].chat_stream(messages=messages, system_prompt=system_prompt, tools=tools)
+
+    def _record(
+        self,
+        context: RouteContext,
+        name: str,
+        reason: str,
+        attempts: List[str],
+        start: Optional[float],
+        error: Optional[BaseException] = None,
+        stream: bool = False,
+    ) -> None:
+        self.log.record(RouteDecision(
+            router=self.kind,
+            model=name,
+            reason=reason,
+            attempts=attempts,
+            step=context.step,
+            tool_errors=context.tool_errors,
+            stream=stream,
+            latency_ms=round((time.perf_counter() - start) * 1000, 3) if start is not None else None,
+            error=f"{type(error).__name__}: {error}" if error is not None else None,
+            timestamp=time.time(),
+        ))
+
+
+class CascadeRouter(ModelRouter):
+    """级联：从最便宜的模型开始，出现信号时升级
+
+    请求前按当前任务的信号选择起始级别，每个信号升一级：
+    - 工具调用失败达到 escalate_on_tool_errors 次（0 表示不看这个信号）
+    - 第 escalate_after_steps 步之后（None 表示不看这个信号）
+
+    得到回复后，如果是拒绝回答（escalate_on_refusal）或调用失败（escalate_on_error），
+    立即用下一级模型重新请求。信号都从消息中提取，同一个路由器可以被多个代理共享。
+
+    Args:
+        models: 名称 -> LLM，按从便宜到昂贵的顺序
+    """
+
+    kind = "cascade"
+
+    def __init__(
+        self,
+        models: Dict[str, Any],
+        escalate_on_tool_errors: int = 1,
+        escalate_after_steps: Optional[int] = None,
+        escalate_on_refusal: bool = True,
+        escalate_on_error: bool = True,
+        log: Optional[DecisionLog] = None,
+        tracer: Optional[Tracer] = None,
+    ):
+        super().__init__(models, log=log, tracer=tracer)
+        self.escalate_on_tool_errors = escalate_on_tool_errors
+        self.escalate_after_steps = escalate_after_steps
+        self.escalate_on_refusal = escalate_on_refusal
+        self.escalate_on_error = escalate_on_error
+
+    def route(self, context: RouteContext) -> Tuple[str, str]:
+        reasons = []
+        if self.escalate_on_tool_errors and context.tool_errors >= self.escalate_on_tool_errors:
+            reasons.append("tool_errors")
+        if self.escalate_after_steps is not None and context.step > self.escalate_after_steps:
+            reasons.append("steps")
+        level = min(len(reasons), len(self.names) - 1)
+        return self.names[level], "+".join(reasons) or "default"
+
+    def escalate(self, name: str, response: Optional[LLMResponse], error: Optional[LLMError]) -> Optional[Tuple[str, str]]:
+        level = self.names.index(name)
+        if level + 1 >= len(self.names):
+            return None
+        if error is not None and self.escalate_on_error:
+            return self.names[level + 1], "error"
+        if response is not None and self.escalate_on_refusal and is_refusal(response):
+            return self.names[level + 1], "refusal"
+        return None
+
+
+class HedgedLLM:
+    """对冲请求：主端点超过延迟阈值仍未响应时，向备用端点发送相同的请求
+
+    阈值是主端点最近 window 次延迟的 percentile 分位数（样本少于 min_samples 时使用
+    initial_delay）；普通请求按完整响应计时，流式请求按首个事件计时。先成功的一方胜出，
+    另一方被取消；一方失败时等待另一方，主端点在阈值之前就失败时立即启动备用端点。
+
+    Args:
+        primary: 主端点
+        backup: 备用端点（通常是同一模型的另一个部署或服务商）
+    """
+
+    kind = "hedge"
+
+    def __init__(
+        self,
+        primary: Any,
+        backup: Any,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.0,
+        window: int = 200,
+        log: Optional[DecisionLog] = None,
+    ):
+        self.primary = primary
+        self.backup = backup
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.log = log if log is not None else DecisionLog()
+        self.hedges = 0  # 发出对冲请求的次数
+        self.backup_wins = 0
+        # 普通请求和流式请求（首个事件）的延迟分布不同，分开统计
+        self._latencies: Dict[bool, Deque[float]] = {False: deque(maxlen=window), True: deque(maxlen=window)}
+
+    @property
+    def model(self) -> str:
+        return model_name(self.primary)
+
+    def hedge_delay(self, stream: bool = False) -> float:
+        """当前的对冲阈值（秒）"""
+        samples = self._latencies[stream]
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(samples)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))])
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> LLMResponse:
+        kwargs = {"messages": messages, "system_prompt": system_prompt, "tools": tools}
+        winner, response, hedged, elapsed = await self._race(
+            lambda llm: llm.chat(**kwargs), lambda task: task, stream=False
+        )
+        self._record(messages, winner, hedged, elapsed, stream=False)
+        return response
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> "HedgedStream":
+        return HedgedStream(self, {"messages": messages, "system_prompt": system_prompt, "tools": tools})
+
+    async def _race(
+        self, start: Callable[[Any], Any], first: Callable[[Any], Any], stream: bool
+    ) -> Tuple[str, Any, bool, float]:
+        """启动主端点，超过阈值后（或主端点在阈值之前失败时）启动备用端点，返回 (胜出方, 结果, 是否对冲, 耗时)
+
+        start(llm) 返回一次调用（普通请求是协程，流式请求是流），first(call) 返回等待第一个
+        结果的可等待对象。胜出方是 "primary" 或 "backup"。
+        """
+        began = time.perf_counter()
+        calls = {"primary": start(self.primary)}
+        tasks = {asyncio.ensure_future(first(calls["primary"])): "primary"}
+        hedged = False
+        winner: Optional[str] = None
+        errors: Dict[str, BaseException] = {}
+
+        def start_backup() -> None:
+            calls["backup"] = start(self.backup)
+            tasks[asyncio.ensure_future(first(calls["backup"]))] = "backup"
+
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=self.hedge_delay(stream))
+            if not done:
+                hedged = True
+                self.hedges += 1
+                start_backup()
+            while tasks:
+                done, _ = await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is None or isinstance(task.exception(), StopAsyncIteration):
+                        winner = name
+                        elapsed = time.perf_counter() - began
+                        if name == "primary":
+                            self._latencies[stream].append(elapsed)
+                        else:
+                            self.backup_wins += 1
+                        result = None if task.exception() is not None else task.result()
+                        return name, (calls[name], result) if stream else result, hedged, elapsed
+                    errors[name] = task.exception()
+                    if name == "primary" and "backup" not in calls:
+                        # 主端点在阈值之前就失败了：改用备用端点，而不是直接放弃
+                        hedged = True
+                        start_backup()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if stream:
+                # 取消等待只停止了读取，落败一方的流（HTTP响应）需要显式关闭，否则连接一直被占用
+                for name, call in calls.items():
+                    if name != winner:
+                        await close_stream(call)
+        error = errors.get("primary") or next(iter(errors.values()))
+        self._record_error(error, hedged, time.perf_counter() - began, stream)
+        raise error
+
+    def _record(self, messages: List[Dict[str, Any]], winner: str, hedged: bool, elapsed: float, stream: bool) -> None:
+        context = RouteContext.from_messages(messages)
+        llm = self.primary if winner == "primary" else self.backup
+        self.log.record(RouteDecision(
+            router=self.kind,
+            model=model_name(llm),
+            reason=winner,
+            attempts=["primary", "backup"] if hedged else ["primary"],
+            step=context.step,
+            tool_errors=context.tool_errors,
+            hedged=hedged,
+            stream=stream,
+            latency_ms=round(elapsed * 1000, 3),
+            timestamp=time.time(),
+        ))
+
+    def _record_error(self, error: BaseException, hedged: bool, elapsed: float, stream: bool) -> None:
+        self.log.record(RouteDecision(
+            router=self.kind,
+            model=model_name(self.primary),
+            reason="failed",
+            attempts=["primary", "backup"] if hedged else ["primary"],
+            hedged=hedged,
+            stream=stream,
+            latency_ms=round(elapsed * 1000, 3),
+            error=f"{type(error).__name__}: {error}",
+            timestamp=time.time(),
+        ))
+
+
+class HedgedStream:
+    """对冲的流式响应：先产出首个事件的一方胜出，之后只读取胜出方的流"""
+
+    def __init__(self, hedged: HedgedLLM, kwargs: Dict[str, Any]):
+        self._hedged = hedged
+        self._kwargs = kwargs
+        self._winner: Any = None
+        self._iterator: Optional[AsyncIterator[StreamEvent]] = None
+
+    def __aiter__(self) -> AsyncIterator[StreamEvent]:
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+
+    async def get_response(self) -> LLMResponse:
+        """消费剩余的事件并返回胜出方的完整响应"""
+        async for _ in self:
+            pass
+        return await self._winner.get_response()
+
+    async def aclose(self) -> None:
+        """停止迭代并关闭胜出方的流"""
+        if self._iterator is not None:
+            await self._iterator.aclose()  # type: ignore[attr-defined]
+        if self._winner is not None:
+            await close_stream(self._winner)
+
+    async def _iterate(self) -> AsyncIterator[StreamEvent]:
+        hedged = self._hedged
+        winner, (stream, event), was_hedged, elapsed = await hedged._race(
+            lambda llm: llm.chat_stream(**self._kwargs), lambda stream: stream.__aiter__().__anext__(), stream=True
+        )
+        hedged._record(self._kwargs["messages"], winner, was_hedged, elapsed, stream=True)
+        self._winner = stream
+        if event is None:
+            return
+        yield event
+        async for event in stream:
+            yield event
@@ -0,0 +1,275 @@
+"""
+常驻Python工作进程池
+
+每个会话（通常对应一个代理）固定使用一个工作进程，命名空间在多次调用之间保留，
+导入过的模块和加载过的数据不必重复准备。代码在独立进程中执行，不会阻塞事件循环，
+也不会与其他会话的输出混在一起。
+
+内存上限（RLIMIT_AS）作用于整个工作进程而不是单次调用：会话中之前调用留下的变量和
+导入的模块也占用额度。超出时代码得到 MemoryError，工作进程继续服务该会话。上限默认关闭：
+RLIMIT_AS 限制的是虚拟地址空间而不是实际占用的内存，numpy/OpenBLAS、torch 等库按线程
+预留大量地址空间，实际内存很少时也可能无法导入，需要时按工作负载设置。
+"""
+import asyncio
+import atexit
+import os
+import struct
+import sys
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from mini_agent import fastjson
+from mini_agent.shell import kill_process_group
+
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+_HEADER = struct.Struct(">I")
+
+
+class SandboxResult(BaseModel):
+    """一次代码执行的结果"""
+    stdout: str = ""
+    stderr: str = ""
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+    timed_out: bool = False
+    restarted: bool = False
+    duration: float = 0.0
+
+
+class PythonWorker:
+    """一个常驻的Python工作进程"""
+
+    def __init__(self, memory_limit_mb: Optional[int] = None, cwd: Optional[str] = None):
+        self.memory_limit_mb = memory_limit_mb
+        self.cwd = cwd
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        kwargs = {"start_new_session": True} if os.name == "posix" else {}
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", WORKER_SCRIPT, str(self.memory_limit_mb or 0),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=self.cwd,
+            **kwargs,
+        )
+        _live_processes.add(self.process.pid)
+        await self._receive()  # 等待就绪消息
+
+    async def execute(self, code: str, timeout: Optional[float], max_output: int) -> SandboxResult:
+        """执行代码；超时或进程异常退出时重启进程，此时会话状态丢失"""
+        start = time.monotonic()
+        restarted = False
+        if not self.alive:
+            restarted = self.process is not None
+            await self.start()
+
+        try:
+            await self._send({"code": code, "max_output": max_output})
+            reply = await asyncio.wait_for(self._receive(), timeout)
+        except asyncio.TimeoutError:
+            await self.kill()
+            return SandboxResult(
+                error=f"代码执行超时 ({timeout}秒)，会话状态已重置",
+                timed_out=True,
+                restarted=True,
+                duration=time.monotonic() - start,
+            )
+        except (asyncio.IncompleteReadError, ConnectionError, BrokenPipeError):
+            returncode = self.process.returncode if self.process else None
+            await self.kill()
+            return SandboxResult(
+                error=f"工作进程异常退出 (退出码 {returncode})，会话状态已重置",
+                restarted=True,
+                duration=time.monotonic() - start,
+            )
+        except BaseException:
+            # 被取消时不能留下正在执行的进程，否则后续的响应会错位
+            await self.kill()
+            raise
+        finally:
+            self.last_used = time.monotonic()
+
+        return SandboxResult(
+            stdout=reply.get("stdout", ""),
+            stderr=reply.get("stderr", ""),
+            error=reply.get("error"),
+            traceback=reply.get("traceback"),
+            restarted=restarted,
+            duration=time.monotonic() - start,
+        )
+
+    async def reset(self) -> None:
+        """清空命名空间"""
+        if self.alive:
+            await self._send({"op": "reset"})
+            await self._receive()
+
+    async def kill(self) -> None:
+        if self.process is None:
+            return
+        kill_process_group(self.process)
+        try:
+            await self.process.wait()
+        finally:
+            _live_processes.discard(self.process.pid)
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        assert self.process is not None and self.process.stdin is not None
+        data = fastjson.dumps(message)
+        self.process.stdin.write(_HEADER.pack(len(data)) + data)
+        await self.process.stdin.drain()
+
+    async def _receive(self) -> Dict[str, Any]:
+        assert self.process is not None and self.process.stdout is not None
+        header = await self.process.stdout.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        return fastjson.loads(await self.process.stdout.readexactly(length))
+
+
+class PythonWorkerPool:
+    """按会话分配工作进程的进程池
+
+    工作进程数达到上限时，淘汰最久未使用的空闲会话。进程池绑定创建它的事件循环。
+
+    Args:
+        max_workers: 工作进程数上限
+        memory_limit_mb: 每个工作进程的地址空间上限（MB），0 或 None 表示不限制
+    """
+
+    def __init__(self, max_workers: int = 8, memory_limit_mb: Optional[int] = None):
+        self.max_workers = max_workers
+        self.memory_limit_mb = memory_limit_mb
+        self._workers: "OrderedDict[str, PythonWorker]" = OrderedDict()
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def _released(self) -> asyncio.Condition:
+        # 延迟创建，保证绑定到实际运行的事件循环
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def execute(
+        self,
+        session_id: str,
+        code: str,
+        timeout: Optional[float] = 30.0,
+        max_output: int = 64 * 1024,
+        cwd: Optional[str] = None,
+        memory_limit_mb: Optional[int] = None,
+    ) -> SandboxResult:
+        """在会话对应的工作进程中执行代码
+
+        cwd 和 memory_limit_mb（None 表示使用进程池的设置）在新建工作进程时生效。
+        """
+        worker = await self._acquire_worker(session_id, cwd, memory_limit_mb)
+        try:
+            return await worker.execute(code, timeout, max_output)
+        finally:
+            worker.lock.release()
+            async with self._released:
+                self._released.notify_all()
+
+    async def reset_session(self, session_id: str) -> None:
+        """清空会话的命名空间"""
+        worker = self._workers.get(session_id)
+        if worker is not None:
+            async with worker.lock:
+                await worker.reset()
+
+    async def close_session(self, session_id: str) -> None:
+        """结束会话并终止其工作进程"""
+        worker = self._workers.pop(session_id, None)
+        if worker is not None:
+            await worker.kill()
+
+    async def close(self) -> None:
+        """终止所有工作进程"""
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            await worker.kill()
+
+    async def _acquire_worker(
+        self, session_id: str, cwd: Optional[str] = None, memory_limit_mb: Optional[int] = None
+    ) -> PythonWorker:
+        """获取会话的工作进程并加锁，同一会话的调用依次执行"""
+        while True:
+            worker = self._workers.get(session_id)
+            if worker is not None:
+                self._workers.move_to_end(session_id)
+                await worker.lock.acquire()
+                if self._workers.get(session_id) is worker:
+                    return worker
+                worker.lock.release()  # 等待期间被淘汰，重新获取
+                continue
+
+            evicted = self._pop_idle() if len(self._workers) >= self.max_workers else None
+            if len(self._workers) < self.max_workers:
+                # 先登记再等待：终止被淘汰的进程期间，同一会话的其他调用会等待这个工作进程
+                worker = PythonWorker(memory_limit_mb if memory_limit_mb is not None else self.memory_limit_mb, cwd)
+                self._workers[session_id] = worker
+                await worker.lock.acquire()
+                if evicted is not None:
+                    try:
+                        await evicted.kill()
+                    except BaseException:
+                        worker.lock.release()
+                        raise
+                return worker
+
+            # 所有工作进程都在执行，等待其中一个释放
+            async with self._released:
+                await self._released.wait()
+
+    def _pop_idle(self) -> Optional[PythonWorker]:
+        """从进程池中移除最久未使用的空闲工作进程，由调用方终止"""
+        for session_id, worker in self._workers.items():
+            if not worker.lock.locked():
+                del self._workers[session_id]
+                return worker
+        return None
+
+
+# 记录存活的工作进程，解释器退出时统一清理
+_live_processes: set = set()
+
+
+@atexit.register
+def _kill_live_processes() -> None:
+    import signal
+    for pid in list(_live_processes):
+        try:
+            if os.name == "posix":
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+
+
+_default_pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_default_pool() -> PythonWorkerPool:
+    """获取当前事件循环共享的默认进程池"""
+    loop = asyncio.get_running_loop()
+    pool = _default_pools.get(loop)
+    if pool is None:
+        pool = PythonWorkerPool()
+        _default_pools[loop] = pool
+    return pool
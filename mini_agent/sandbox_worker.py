@@ -0,0 +1,109 @@
+"""
+Python沙箱工作进程
+
+由 mini_agent.sandbox 以脚本方式启动，只依赖标准库，保证启动足够快。
+请求和响应都是 4 字节长度前缀 + UTF-8 JSON，经由原始的 stdin/stdout 传输；
+用户代码的输出被重定向，不会混入协议数据。
+"""
+import builtins
+import io
+import json
+import os
+import struct
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, BinaryIO, Dict, Optional
+
+_HEADER = struct.Struct(">I")
+
+
+def _read_message(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    data = b""
+    while len(data) < length:
+        chunk = stream.read(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return json.loads(data.decode("utf-8"))
+
+
+def _write_message(stream: BinaryIO, message: Dict[str, Any]) -> None:
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _cap(text: str, limit: int) -> str:
+    if limit and len(text) > limit:
+        return text[:limit] + f"\n...[输出超过 {limit} 个字符，已截断]"
+    return text
+
+
+def _new_namespace() -> Dict[str, Any]:
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+def _set_memory_limit(limit_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:  # 非POSIX平台不支持
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def main() -> None:
+    # 协议使用复制出来的文件描述符，原来的 0/1 交给用户代码（输入为空，输出并入stderr）
+    proto_in = os.fdopen(os.dup(0), "rb", buffering=0)
+    proto_out = os.fdopen(os.dup(1), "wb", buffering=0)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+    sys.stdin = open(os.devnull)
+
+    memory_limit = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    if memory_limit:
+        _set_memory_limit(memory_limit)
+
+    namespace = _new_namespace()
+    _write_message(proto_out, {"ready": True, "pid": os.getpid()})
+
+    while True:
+        request = _read_message(proto_in)
+        if request is None:
+            break
+        if request.get("op") == "reset":
+            namespace = _new_namespace()
+            _write_message(proto_out, {"error": None, "stdout": "", "stderr": ""})
+            continue
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        error = None
+        trace = None
+        try:
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                exec(compile(request["code"], "<agent>", "exec"), namespace)
+        except MemoryError:
+            error = "MemoryError: 超出内存限制"
+        except BaseException as e:  # 包括 SystemExit，工作进程本身不能退出
+            error = traceback.format_exception_only(type(e), e)[-1].strip()
+            trace = traceback.format_exc()
+
+        limit = request.get("max_output", 0)
+        _write_message(proto_out, {
+            "error": error,
+            "traceback": trace,
+            "stdout": _cap(stdout.getvalue(), limit),
+            "stderr": _cap(stderr.getvalue(), limit),
+        })
+
+
+if __name__ == "__main__":
+    # 以脚本方式运行时 sys.path[0] 是包目录，移除以免用户代码误导入包内模块
+    sys.path.pop(0)
+    main()
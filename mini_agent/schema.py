@@ -1,10 +1,16 @@
 """
 核心数据结构定义
 """
+import copy
+from array import array
+from collections.abc import MutableSequence
 from enum import Enum
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 from pydantic import BaseModel
 
+from mini_agent import fastjson
+from mini_agent.tokens import count_message_tokens
+
 
 class Role(str, Enum):
     SYSTEM = "system"
@@ -17,6 +23,18 @@ class AgentState(str, Enum):
     IDLE = "idle"
     RUNNING = "running"
     FINISHED = "finished"
+    ERROR = "error"
+
+
+class StopReason(str, Enum):
+    """一次运行结束的原因"""
+    COMPLETED = "completed"  # 模型给出了最终回答
+    MAX_STEPS = "max_steps"  # 达到最大步数
+    DEADLINE = "deadline"  # 超出整次运行的截止时间
+    STEP_DEADLINE = "step_deadline"  # 某一步超出了单步的截止时间
+    LLM_ERROR = "llm_error"  # LLM调用重试后仍失败
+    ERROR = "error"  # 其他异常
+    CANCELLED = "cancelled"  # 运行被取消
 
 
 class Message(BaseModel):
@@ -36,24 +54,273 @@ class Message(BaseModel):
     @classmethod
     def tool_message(cls, content: str, tool_call_id: str) -> "Message":
         return cls(role=Role.TOOL, content=content, tool_call_id=tool_call_id)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为OpenAI API格式"""
+        message_dict: Dict[str, Any] = {"role": self.role.value}
+        if self.content:
+            message_dict["content"] = self.content
+        if self.tool_calls:
+            message_dict["tool_calls"] = self.tool_calls
+        if self.tool_call_id:
+            message_dict["tool_call_id"] = self.tool_call_id
+        return message_dict
+
+
+# 角色字符串只保留一份（Role 的值），存储的每条消息都引用同一个对象
+_ROLE_VALUES: Dict[Any, str] = {**{role: role.value for role in Role}, **{role.value: role.value for role in Role}}
+_ROLES: Dict[str, Role] = {role.value: role for role in Role}
+
+
+def _to_message(message_dict: Dict[str, Any]) -> Message:
+    """把存储的API格式消息还原为 Message（数据已校验过，不再重复校验）"""
+    return Message.model_construct(
+        role=_ROLES[message_dict["role"]],
+        content=message_dict.get("content"),
+        tool_calls=message_dict.get("tool_calls"),
+        tool_call_id=message_dict.get("tool_call_id"),
+    )
+
+
+class MessageList(MutableSequence):
+    """Memory.messages 的兼容视图
+
+    读取时按需构造 Message，写入（append、赋值、删除）直接作用于底层存储。
+    取出的 Message 是副本，原地修改它不会影响记忆，需要修改时请赋值回去。
+    """
+
+    __slots__ = ("_memory",)
+
+    def __init__(self, memory: "Memory"):
+        self._memory = memory
+
+    def __len__(self) -> int:
+        return len(self._memory._wire)
 
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [_to_message(message_dict) for message_dict in self._memory._wire[index]]
+        return _to_message(self._memory._wire[index])
 
-class Memory(BaseModel):
+    def __setitem__(self, index: Any, value: Any) -> None:
+        wire = self._memory._wire
+        if isinstance(index, slice):
+            wire[index] = [message.to_dict() for message in value]
+        else:
+            wire[index] = value.to_dict()
+        self._memory.invalidate()
+
+    def __delitem__(self, index: Any) -> None:
+        memory = self._memory
+        if isinstance(index, slice) and index.step in (None, 1) and (index.stop is None or index.stop >= len(memory._wire)):
+            # 截断尾部（最常见的情况）只需丢掉对应的缓存
+            start = index.start or 0
+            memory._truncate(start if start >= 0 else max(0, len(memory._wire) + start))
+            return
+        del memory._wire[index]
+        memory.invalidate()
+
+    def insert(self, index: int, value: Message) -> None:
+        if index >= len(self._memory._wire):
+            self._memory.add_message(value)
+            return
+        self._memory._wire.insert(index, value.to_dict())
+        self._memory.invalidate()
+
+    def append(self, value: Message) -> None:
+        self._memory.add_message(value)
+
+    def __eq__(self, other: Any) -> bool:
+        return list(self) == list(other) if isinstance(other, (list, MessageList)) else NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class _MemoryModel(BaseModel):
+    """旧版 Memory（pydantic 模型）的结构，用于兼容接口的校验和序列化"""
     messages: List[Message] = []
-    
+
+
+class Memory:
+    """对话记忆
+
+    消息只以API格式的字典存储（不再为每条消息保留一个 pydantic 对象），token数存放在
+    紧凑数组中。每条消息在加入时计算一次token数，get_messages() 直接返回存储的列表，
+    JSON字节形式在首次请求时增量编码。
+
+    add_message(Message) 接收已校验的 Message；框架内部产生的可信数据（LLM响应、工具结果）
+    使用 add() 直接写入，跳过校验。messages 属性是兼容旧代码的 Message 列表视图。
+
+    Memory 不再是 pydantic 模型，但保留了旧代码常用的接口：Memory(messages=[...])（Message
+    或字典）、model_dump()、model_dump_json()、model_validate() 和 model_copy()，结构与
+    旧版相同（{"messages": [...]}）。
+    """
+
+    __slots__ = (
+        "_wire", "_tokens", "_total_tokens", "_json_buffer", "_json_count", "_json_cache", "_view", "_revision",
+    )
+
+    def __init__(self, messages: Optional[Iterable[Any]] = None):
+        self._wire: List[Dict[str, Any]] = []
+        self._view = MessageList(self)
+        self._revision = 0
+        self._reset_cache()
+        for message in messages or ():
+            self.add_message(message if isinstance(message, Message) else Message.model_validate(message))
+
+    @property
+    def messages(self) -> MessageList:
+        return self._view
+
+    @messages.setter
+    def messages(self, messages: Iterable[Message]) -> None:
+        self._wire = [message.to_dict() for message in messages]
+        self.invalidate()
+
     def add_message(self, message: Message):
-        self.messages.append(message)
-    
+        self._append(message.to_dict())
+
+    def add(
+        self,
+        role: Any,
+        content: Optional[str] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        tool_call_id: Optional[str] = None,
+    ) -> None:
+        """不经校验直接追加一条消息（用于框架内部产生的可信数据）"""
+        message_dict: Dict[str, Any] = {"role": _ROLE_VALUES[role]}
+        if content:
+            message_dict["content"] = content
+        if tool_calls:
+            message_dict["tool_calls"] = tool_calls
+        if tool_call_id:
+            message_dict["tool_call_id"] = tool_call_id
+        self._append(message_dict)
+
+    def restore(
+        self,
+        messages: List[Dict[str, Any]],
+        token_counts: Optional[Sequence[int]] = None,
+        messages_json: Optional[bytes] = None,
+    ) -> None:
+        """用已持久化的API格式消息替换全部记忆，不经校验
+
+        Args:
+            messages: API格式的消息列表，直接作为存储使用
+            token_counts: 与消息一一对应的token数，省略时重新计算
+            messages_json: 与消息列表等价的JSON字节串，提供时直接作为序列化缓存
+        """
+        self._wire = messages
+        if token_counts is None:
+            self.invalidate()
+        else:
+            self._reset_cache()
+            self._tokens = array("l", token_counts)
+            self._total_tokens = sum(self._tokens)
+            self._revision += 1
+        if messages_json is not None:
+            self._json_buffer = bytearray(messages_json)
+            self._json_count = len(messages)
+            self._json_cache = bytes(messages_json)
+
+    @property
+    def revision(self) -> int:
+        """非追加修改（替换、删除、插入、恢复）的次数，追加消息时不变"""
+        return self._revision
+
+    def __len__(self) -> int:
+        return len(self._wire)
+
     def get_messages(self) -> List[Dict[str, Any]]:
-        """转换为OpenAI API格式"""
-        result = []
-        for msg in self.messages:
-            message_dict = {"role": msg.role.value}
-            if msg.content:
-                message_dict["content"] = msg.content
-            if msg.tool_calls:
-                message_dict["tool_calls"] = msg.tool_calls
-            if msg.tool_call_id:
-                message_dict["tool_call_id"] = msg.tool_call_id
-            result.append(message_dict)
-        return result
\ No newline at end of file
+        """转换为OpenAI API格式（返回存储的列表，调用方不应修改）"""
+        return self._wire
+
+    def get_messages_json(self) -> bytes:
+        """API格式消息列表的JSON字节串，可直接用作原始请求体的一部分"""
+        if self._json_cache is None:
+            # 只编码新增的消息，追加到缓冲区末尾
+            buffer = self._json_buffer
+            if not buffer:
+                buffer += b"[]"
+            for message_dict in self._wire[self._json_count:]:
+                # 覆盖末尾的 "]"，追加新消息后再补上
+                buffer[-1:] = (b"," if self._json_count else b"") + fastjson.dumps(message_dict) + b"]"
+                self._json_count += 1
+            self._json_cache = bytes(buffer)
+        return self._json_cache
+
+    def get_token_counts(self) -> Sequence[int]:
+        """每条消息的token数（与 get_messages() 一一对应）"""
+        return self._tokens
+
+    def get_total_tokens(self) -> int:
+        """全部历史消息的token总数"""
+        return self._total_tokens
+
+    def invalidate(self) -> None:
+        """在原地修改了历史消息后调用，重建token数和JSON缓存"""
+        self._revision += 1
+        self._reset_cache()
+        for message_dict in self._wire:
+            tokens = count_message_tokens(message_dict)
+            self._tokens.append(tokens)
+            self._total_tokens += tokens
+
+    # ------------------------------------------------------------------ 兼容 pydantic 模型的接口
+
+    def model_dump(self, **kwargs: Any) -> Dict[str, Any]:
+        return _MemoryModel.model_construct(messages=self.messages[:]).model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs: Any) -> str:
+        return _MemoryModel.model_construct(messages=self.messages[:]).model_dump_json(**kwargs)
+
+    @classmethod
+    def model_validate(cls, obj: Any) -> "Memory":
+        if isinstance(obj, Memory):
+            return obj.model_copy()
+        return cls(_MemoryModel.model_validate(obj).messages)
+
+    def model_copy(self, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "Memory":
+        """复制记忆；update 只支持 messages"""
+        copied = Memory()
+        if update and "messages" in update:
+            copied.messages = update["messages"]
+        else:
+            copied.restore(copy.deepcopy(self._wire) if deep else list(self._wire), self._tokens)
+        return copied
+
+    def __eq__(self, other: Any) -> bool:
+        return self._wire == other._wire if isinstance(other, Memory) else NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Memory(messages={self.messages!r})"
+
+    def _append(self, message_dict: Dict[str, Any]) -> None:
+        tokens = count_message_tokens(message_dict)
+        self._wire.append(message_dict)
+        self._tokens.append(tokens)
+        self._total_tokens += tokens
+        self._json_cache = None
+
+    def _truncate(self, length: int) -> None:
+        """只保留前 length 条消息"""
+        if length >= len(self._wire):
+            return
+        self._revision += 1
+        del self._wire[length:]
+        del self._tokens[length:]
+        self._total_tokens = sum(self._tokens)
+        # JSON缓冲区无法简单回退，下次请求时重新编码
+        self._json_buffer = bytearray()
+        self._json_count = 0
+        self._json_cache = None
+
+    def _reset_cache(self) -> None:
+        self._tokens = array("l")
+        self._total_tokens = 0
+        self._json_buffer = bytearray()
+        self._json_count = 0
+        self._json_cache = None
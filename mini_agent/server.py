@@ -0,0 +1,729 @@
+"""
+多会话服务器：一个进程、一个事件循环托管大量并发的代理会话
+
+    python -m mini_agent.server --port 8765 --max-sessions 500
+    python -m mini_agent.server --unix /tmp/mini_agent.sock --session-dir sessions/
+
+HTTP/1.1 接口，请求和响应都是JSON，任务的运行过程以NDJSON（每行一个事件）流式返回:
+
+    POST   /sessions            创建会话 {"id"?, "system_prompt"?, "max_steps"?}
+    GET    /sessions            列出会话
+    GET    /sessions/{id}       会话状态
+    DELETE /sessions/{id}       关闭会话并删除其工作目录
+    POST   /sessions/{id}/run   执行任务 {"task": "...", "stream"?: true}
+    GET    /health              服务器统计
+
+每个会话有独立的代理（记忆）和工作目录：文件操作被限制在该目录内，命令和Python代码
+以该目录为当前目录执行（不是安全边界）。会话空闲超过 idle_timeout 后被淘汰；设置
+session_dir 时会话保存在会话日志中，被淘汰的会话在下次访问时自动恢复。会话数或排队
+的运行数达到上限时分别返回 503 / 429 和 Retry-After，而不是无限制地占用内存。
+"""
+import argparse
+import asyncio
+import http
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from mini_agent import fastjson
+from mini_agent.agent import MiniAgent
+from mini_agent.events import EventBus, EventType, NullSink
+from mini_agent.sandbox import PythonWorkerPool
+from mini_agent.schema import AgentState, Role
+from mini_agent.session import SessionLog
+from mini_agent.tools import BashExecutor, FileEditor, PythonExecutor, ToolCollection
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# 创建会话时可以指定的代理参数
+SESSION_OPTIONS = ("system_prompt", "max_steps")
+
+
+class HTTPError(Exception):
+    """以指定状态码返回给客户端的错误"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class ServerStats(BaseModel):
+    """服务器统计"""
+    sessions: int = 0
+    active_runs: int = 0
+    queued_runs: int = 0
+    created: int = 0
+    restored: int = 0
+    evicted: int = 0
+    closed: int = 0
+    completed_runs: int = 0
+    failed_runs: int = 0
+    rejected: int = 0
+    dropped_events: int = 0
+
+
+class EventStream:
+    """一次运行的事件缓冲区：代理同步写入，HTTP响应按批取出
+
+    客户端读取过慢时丢弃最早的事件，缓冲区不会无限增长，也不会拖慢代理。
+    """
+
+    __slots__ = ("max_items", "dropped", "closed", "_items", "_ready")
+
+    def __init__(self, max_items: int = 1000):
+        self.max_items = max_items
+        self.dropped = 0
+        self.closed = False
+        self._items: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, item: Dict[str, Any]) -> None:
+        if len(self._items) >= self.max_items:
+            self._items.popleft()
+            self.dropped += 1
+        self._items.append(item)
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """等待并取出缓冲的全部事件，关闭且取空后返回空列表"""
+        while not self._items and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        batch = list(self._items)
+        self._items.clear()
+        return batch
+
+
+class SessionEvents(EventBus):
+    """会话的事件总线：在事件循环线程中直接把事件交给当前运行的事件流
+
+    不启动后台线程，几百个会话也不会多出几百个线程；forward 不为None时同时转发给
+    该总线（例如服务器的日志）。
+    """
+
+    def __init__(self, forward: Optional[EventBus] = None):
+        super().__init__([NullSink()])
+        self.forward = forward
+        self.stream: Optional[EventStream] = None
+
+    def emit(self, event_type: EventType, agent: Optional[str] = None, **data: Any) -> None:
+        if self.forward is not None:
+            self.forward.emit(event_type, agent, **data)
+        if self.stream is not None:
+            self.stream.push({"type": event_type.value, "timestamp": time.time(), "data": data})
+
+
+class ServerSession:
+    """服务器中的一个会话"""
+
+    __slots__ = ("id", "agent", "events", "workdir", "created", "last_active", "runs", "running")
+
+    def __init__(self, session_id: str, agent: MiniAgent, events: SessionEvents, workdir: str):
+        self.id = session_id
+        self.agent = agent
+        self.events = events
+        self.workdir = workdir
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        self.runs = 0
+        self.running = False
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "state": self.agent.state.value,
+            "running": self.running,
+            "runs": self.runs,
+            "steps": self.agent.current_step,
+            "messages": len(self.agent.memory),
+            "tokens": self.agent.memory.get_total_tokens(),
+            "idle": round(time.monotonic() - self.last_active, 3),
+        }
+
+
+class AgentServer:
+    """托管多个代理会话的HTTP服务器
+
+    所有会话共享同一个 LLM 实例（连接池、限流）、一个Python工作进程池和一个工具并发上限，
+    每个会话只占用记忆和少量对象，几百个会话可以在同一个进程中并发运行。
+
+    Args:
+        llm: 所有会话共享的LLM
+        max_sessions: 会话数上限，达到上限时先淘汰最久未使用的空闲会话，没有可淘汰的返回 503
+        max_active_runs: 同时执行的任务数上限
+        max_queued_runs: 等待执行的任务数上限，超过时返回 429
+        idle_timeout: 会话空闲多少秒后被淘汰，None 表示不按时间淘汰
+        workdir: 会话工作目录的父目录，默认在系统临时目录下新建
+        session_dir: 会话日志目录，设置后被淘汰或服务器重启的会话可以恢复
+        max_tool_concurrency: 全局工具并发上限
+        max_python_workers: Python工作进程数上限（按会话分配，空闲时被其他会话复用）
+        max_body: 请求体大小上限（字节）
+        event_buffer: 每次运行缓冲的事件数上限，客户端读取过慢时丢弃最早的事件
+        events: 日志事件总线，所有会话的事件都会转发给它，默认不转发
+        agent_kwargs: 创建代理时的其他参数
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        max_sessions: int = 1000,
+        max_active_runs: int = 64,
+        max_queued_runs: int = 256,
+        idle_timeout: Optional[float] = 600.0,
+        workdir: Optional[str] = None,
+        session_dir: Optional[str] = None,
+        max_tool_concurrency: int = 32,
+        max_python_workers: int = 8,
+        max_body: int = 1024 * 1024,
+        event_buffer: int = 1000,
+        events: Optional[EventBus] = None,
+        agent_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.llm = llm
+        self.max_sessions = max_sessions
+        self.max_active_runs = max_active_runs
+        self.max_queued_runs = max_queued_runs
+        self.idle_timeout = idle_timeout
+        self.session_dir = session_dir
+        self.max_tool_concurrency = max_tool_concurrency
+        self.max_body = max_body
+        self.event_buffer = event_buffer
+        self.events = events
+        self.agent_kwargs = agent_kwargs or {}
+        self.stats = ServerStats()
+        self.pool = PythonWorkerPool(max_workers=max_python_workers)
+
+        self._owns_workdir = workdir is None
+        self.workdir = workdir or tempfile.mkdtemp(prefix="mini_agent_server_")
+        os.makedirs(self.workdir, exist_ok=True)
+        if session_dir:
+            os.makedirs(session_dir, exist_ok=True)
+
+        # 按最近使用排序，淘汰时从头部开始
+        self.sessions: "OrderedDict[str, ServerSession]" = OrderedDict()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._run_slots: Optional[asyncio.Semaphore] = None
+        self._tool_semaphore: Optional[asyncio.Semaphore] = None
+        self._evictor: Optional[asyncio.Task] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._runs: Set[asyncio.Task] = set()
+        self.address: Any = None
+
+    # ------------------------------------------------------------------ 生命周期
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None) -> "AgentServer":
+        """开始监听，指定 path 时监听 Unix 套接字"""
+        # 信号量在运行中的事件循环里创建
+        self._run_slots = asyncio.Semaphore(self.max_active_runs)
+        self._tool_semaphore = asyncio.Semaphore(self.max_tool_concurrency)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        if self.idle_timeout is not None:
+            self._evictor = asyncio.ensure_future(self._evict_loop())
+        return self
+
+    async def serve_forever(self) -> None:
+        assert self._server is not None, "请先调用 start()"
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """停止监听，取消正在执行的任务并释放所有会话"""
+        if self._server is not None:
+            self._server.close()
+        for task in [self._evictor, *self._connections, *self._runs]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in [self._evictor, *self._connections, *self._runs] if task is not None),
+            return_exceptions=True,
+        )
+        if self._server is not None:
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            await self._close_session(session, remove_files=self._owns_workdir)
+        await self.pool.close()
+        if self._owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    async def __aenter__(self) -> "AgentServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    # ------------------------------------------------------------------ 会话管理
+
+    async def create_session(self, session_id: Optional[str] = None, **options: Any) -> ServerSession:
+        """创建会话，会话数达到上限时淘汰最久未使用的空闲会话"""
+        session_id = session_id or uuid.uuid4().hex
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise HTTPError(400, f"无效的会话ID: {session_id}")
+        if session_id in self.sessions or (self.session_dir and os.path.exists(self._log_path(session_id))):
+            raise HTTPError(409, f"会话已存在: {session_id}")
+        unknown = set(options) - set(SESSION_OPTIONS)
+        if unknown:
+            raise HTTPError(400, f"未知的会话参数: {', '.join(sorted(unknown))}")
+        if not isinstance(options.get("system_prompt", ""), (str, type(None))):
+            raise HTTPError(400, "system_prompt 必须是字符串")
+        max_steps = options.get("max_steps", 1)
+        if max_steps is not None and (not isinstance(max_steps, int) or isinstance(max_steps, bool) or max_steps < 1):
+            raise HTTPError(400, "max_steps 必须是正整数")
+        await self._make_room()
+        if self.session_dir:
+            with open(self._options_path(session_id), "w", encoding="utf-8") as f:
+                json.dump(options, f, ensure_ascii=False)
+        session = self._open_session(session_id, options)
+        self.stats.created += 1
+        return session
+
+    async def get_session(self, session_id: str) -> ServerSession:
+        """获取会话并标记为最近使用，被淘汰的会话从会话日志恢复"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            session.last_active = time.monotonic()
+            return session
+        if self.session_dir and SESSION_ID_PATTERN.match(session_id) and os.path.exists(self._log_path(session_id)):
+            await self._make_room()
+            options: Dict[str, Any] = {}
+            try:
+                with open(self._options_path(session_id), "r", encoding="utf-8") as f:
+                    options = json.load(f)
+            except (OSError, ValueError):
+                pass
+            session = self._open_session(session_id, options)
+            self.stats.restored += 1
+            return session
+        raise HTTPError(404, f"会话不存在: {session_id}")
+
+    async def delete_session(self, session_id: str) -> None:
+        """关闭会话并删除它的工作目录、会话日志和落盘的工具结果"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            if session.running:
+                raise HTTPError(409, f"会话正在执行任务: {session_id}")
+            await self._close_session(session, remove_files=True)
+        elif self.session_dir and SESSION_ID_PATTERN.match(session_id) and os.path.exists(self._log_path(session_id)):
+            # 已被淘汰的会话：只需删除文件
+            shutil.rmtree(os.path.join(self.workdir, session_id), ignore_errors=True)
+        else:
+            raise HTTPError(404, f"会话不存在: {session_id}")
+        if self.session_dir:
+            for path in (self._log_path(session_id), self._log_path(session_id) + ".idx", self._options_path(session_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            shutil.rmtree(self._log_path(session_id) + ".results", ignore_errors=True)
+        self.stats.closed += 1
+
+    async def evict_idle(self, idle_timeout: Optional[float] = None) -> int:
+        """淘汰空闲超过 idle_timeout 秒的会话，返回淘汰的数量"""
+        timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        if timeout is None:
+            return 0
+        now = time.monotonic()
+        expired = [
+            session for session in self.sessions.values()
+            if not session.running and now - session.last_active >= timeout
+        ]
+        for session in expired:
+            await self._evict(session)
+        return len(expired)
+
+    def _open_session(self, session_id: str, options: Dict[str, Any]) -> ServerSession:
+        workdir = os.path.join(self.workdir, session_id)
+        os.makedirs(workdir, exist_ok=True)
+        events = SessionEvents(self.events)
+        kwargs = dict(self.agent_kwargs)
+        kwargs.update({key: value for key, value in options.items() if value is not None})
+        agent = MiniAgent(
+            llm=self.llm,
+            name=session_id,
+            tools=self._make_tools(session_id, workdir),
+            events=events,
+            session=SessionLog(self._log_path(session_id)) if self.session_dir else None,
+            **kwargs,
+        )
+        session = ServerSession(session_id, agent, events, workdir)
+        self.sessions[session_id] = session
+        self.stats.sessions = len(self.sessions)
+        return session
+
+    def _make_tools(self, session_id: str, workdir: str) -> ToolCollection:
+        """会话专属的工具：工作目录固定为会话目录，工具执行受全局并发上限约束"""
+        tools = ToolCollection(semaphore=self._tool_semaphore)
+        tools.register_tool(PythonExecutor(pool=self.pool, session_id=session_id, cwd=workdir))
+        tools.register_tool(FileEditor(root=workdir))
+        tools.register_tool(BashExecutor(cwd=workdir))
+        return tools
+
+    async def _make_room(self) -> None:
+        if len(self.sessions) < self.max_sessions:
+            return
+        for session in self.sessions.values():
+            if not session.running:
+                await self._evict(session)
+                return
+        self.stats.rejected += 1
+        raise HTTPError(503, f"会话数已达上限 ({self.max_sessions})，且所有会话都在执行任务", retry_after=1.0)
+
+    async def _evict(self, session: ServerSession) -> None:
+        # 有会话日志时保留工作目录，恢复后文件仍在
+        await self._close_session(session, remove_files=not self.session_dir)
+        self.stats.evicted += 1
+
+    async def _close_session(self, session: ServerSession, remove_files: bool) -> None:
+        self.sessions.pop(session.id, None)
+        self.stats.sessions = len(self.sessions)
+        await session.agent.tools.close()
+        if session.agent.session is not None:
+            session.agent.session.close()
+            if "result_store" not in self.agent_kwargs:
+                # 代理在会话日志旁边创建的结果存储：保留结果（恢复后句柄仍有效），只淘汰过期和超出上限的
+                await asyncio.get_running_loop().run_in_executor(None, session.agent.result_store.close)
+        if remove_files:
+            shutil.rmtree(session.workdir, ignore_errors=True)
+
+    async def _evict_loop(self) -> None:
+        assert self.idle_timeout is not None
+        interval = min(max(self.idle_timeout / 4, 0.05), 60.0)
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    def _log_path(self, session_id: str) -> str:
+        assert self.session_dir is not None
+        return os.path.join(self.session_dir, f"{session_id}.log")
+
+    def _options_path(self, session_id: str) -> str:
+        assert self.session_dir is not None
+        return os.path.join(self.session_dir, f"{session_id}.json")
+
+    # ------------------------------------------------------------------ 执行任务
+
+    def start_run(
+        self, session: ServerSession, task: str, stream: Optional[EventStream] = None,
+        timeout: Optional[float] = None,
+    ) -> "asyncio.Task[Dict[str, Any]]":
+        """在后台执行任务，返回结果的 Task；会话忙或排队已满时抛出 HTTPError
+
+        任务不随客户端断开而取消，记忆始终保持完整。timeout 是本次运行的截止时间（秒），
+        从开始执行算起，不含排队时间。
+        """
+        if session.running:
+            raise HTTPError(409, f"会话正在执行任务: {session.id}")
+        assert self._run_slots is not None, "请先调用 start()"
+        if self.stats.active_runs + self.stats.queued_runs >= self.max_active_runs + self.max_queued_runs:
+            self.stats.rejected += 1
+            raise HTTPError(429, "排队的任务过多，请稍后重试", retry_after=1.0)
+        session.running = True
+        session.events.stream = stream
+        run = asyncio.ensure_future(self._run(session, task, timeout))
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+        return run
+
+    async def _run(self, session: ServerSession, task: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        assert self._run_slots is not None
+        agent = session.agent
+        self.stats.queued_runs += 1
+        queued = True
+        try:
+            async with self._run_slots:
+                self.stats.queued_runs -= 1
+                queued = False
+                self.stats.active_runs += 1
+                try:
+                    summary = await agent.run(task, timeout=timeout)
+                    result: Dict[str, Any] = {"type": "result", "result": self._final_answer(agent) or summary}
+                    self.stats.completed_runs += 1
+                except Exception as e:
+                    result = {"type": "result", "error": f"{type(e).__name__}: {e}"}
+                    self.stats.failed_runs += 1
+                finally:
+                    self.stats.active_runs -= 1
+        finally:
+            if queued:
+                self.stats.queued_runs -= 1
+            session.running = False
+            session.runs += 1
+            session.last_active = time.monotonic()
+            stream = session.events.stream
+            session.events.stream = None
+            if stream is not None:
+                self.stats.dropped_events += stream.dropped
+                stream.close()
+        result.update(state=agent.state.value, steps=agent.current_step, session=session.id)
+        if agent.result is not None:
+            result["stop_reason"] = agent.result.stop_reason.value
+        return result
+
+    @staticmethod
+    def _final_answer(agent: MiniAgent) -> Optional[str]:
+        messages = agent.memory.get_messages()
+        if agent.state == AgentState.FINISHED and messages:
+            last = messages[-1]
+            if last["role"] == Role.ASSISTANT.value and not last.get("tool_calls"):
+                return last.get("content")
+        return None
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._write_error(writer, e)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    await self._dispatch(method, path, body, writer)
+                except HTTPError as e:
+                    await self._write_error(writer, e)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            if task is not None:
+                self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """读取一个请求，连接关闭时返回None"""
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return None
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                raise HTTPError(400, "无效的请求行")
+            method, target, _ = parts
+            headers: Dict[str, str] = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(400, "请求头过长")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "无效的 Content-Length")
+        if length > self.max_body:
+            raise HTTPError(413, f"请求体超过 {self.max_body} 字节")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        parts = [part for part in path.split("/") if part]
+        payload = self._parse_body(body)
+
+        if parts == ["health"] and method == "GET":
+            await self._write_json(writer, 200, self.stats.model_dump())
+        elif parts == ["sessions"] and method == "POST":
+            session_id = payload.pop("id", None)
+            session = await self.create_session(session_id, **payload)
+            await self._write_json(writer, 201, session.info())
+        elif parts == ["sessions"] and method == "GET":
+            await self._write_json(writer, 200, {"sessions": [session.info() for session in self.sessions.values()]})
+        elif len(parts) == 2 and parts[0] == "sessions" and method == "GET":
+            session = await self.get_session(parts[1])
+            await self._write_json(writer, 200, session.info())
+        elif len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            await self.delete_session(parts[1])
+            await self._write_json(writer, 200, {"id": parts[1], "deleted": True})
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "run" and method == "POST":
+            task = payload.get("task")
+            if not isinstance(task, str) or not task.strip():
+                raise HTTPError(400, "缺少任务: task")
+            timeout = payload.get("timeout")
+            if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0):
+                raise HTTPError(400, "timeout 必须是正数")
+            session = await self.get_session(parts[1])
+            if payload.get("stream", True):
+                await self._stream_run(session, task, writer, timeout)
+            else:
+                result = await asyncio.shield(self.start_run(session, task, timeout=timeout))
+                await self._write_json(writer, 200, result)
+        elif parts and parts[0] in ("health", "sessions"):
+            raise HTTPError(405, f"不支持的方法: {method} {path}")
+        else:
+            raise HTTPError(404, f"未知的路径: {path}")
+
+    @staticmethod
+    def _parse_body(body: bytes) -> Dict[str, Any]:
+        if not body:
+            return {}
+        try:
+            payload = fastjson.loads(body)
+        except ValueError as e:
+            raise HTTPError(400, f"请求体不是合法的JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        return payload
+
+    async def _stream_run(
+        self, session: ServerSession, task: str, writer: asyncio.StreamWriter, timeout: Optional[float] = None
+    ) -> None:
+        """执行任务并以分块传输的NDJSON流式返回事件，最后一行是结果"""
+        stream = EventStream(self.event_buffer)
+        run = self.start_run(session, task, stream, timeout)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        try:
+            while True:
+                batch = await stream.next_batch()
+                if not batch:
+                    break
+                self._write_chunk(writer, b"".join(self._encode(item) + b"\n" for item in batch))
+                await writer.drain()
+            # 客户端断开时 shield 保证任务继续执行
+            result = await asyncio.shield(run)
+            if stream.dropped:
+                result["dropped_events"] = stream.dropped
+            self._write_chunk(writer, self._encode(result) + b"\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except BaseException:
+            # 不再向断开的客户端推送事件，任务本身继续执行
+            if session.events.stream is stream:
+                session.events.stream = None
+            raise
+
+    @staticmethod
+    def _encode(item: Dict[str, Any]) -> bytes:
+        try:
+            return fastjson.dumps(item)
+        except TypeError:
+            return json.dumps(item, ensure_ascii=False, default=str).encode("utf-8")
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+
+    async def _write_json(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        data: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        body = self._encode(data)
+        head = [
+            f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        head += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _write_error(self, writer: asyncio.StreamWriter, error: HTTPError) -> None:
+        headers = {"Retry-After": f"{error.retry_after:g}"} if error.retry_after is not None else None
+        await self._write_json(writer, error.status, {"error": error.message}, headers)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="以HTTP服务的方式运行多个 MiniAgent 会话")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="监听该 Unix 套接字，而不是TCP端口")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="会话数上限")
+    parser.add_argument("--max-active-runs", type=int, default=64, help="同时执行的任务数上限")
+    parser.add_argument("--max-queued-runs", type=int, default=256, help="等待执行的任务数上限")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="会话空闲多少秒后被淘汰")
+    parser.add_argument("--workdir", default=None, help="会话工作目录的父目录")
+    parser.add_argument("--session-dir", default=None, help="会话日志目录，设置后会话可在淘汰或重启后恢复")
+    parser.add_argument("--tool-concurrency", type=int, default=32, help="全局工具并发上限")
+    parser.add_argument("--rpm", type=float, default=None, help="每分钟最多的LLM请求数")
+    parser.add_argument("--tpm", type=float, default=None, help="每分钟最多的LLM token数")
+    parser.add_argument("--max-llm-concurrency", type=int, default=None, help="同时进行的LLM请求上限")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+    parser.add_argument("--max-steps", type=int, default=10)
+    parser.add_argument("--events", default=None, help="把所有会话的运行事件写入该文件 (JSONL)")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口"""
+    from mini_agent.events import JSONLSink
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.ratelimit import RateLimiter
+
+    args = parse_args(argv)
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ 请设置环境变量 OPENAI_API_KEY")
+        return
+
+    llm = SimpleLLM(
+        api_key=api_key,
+        model=args.model,
+        base_url=args.base_url,
+        rate_limiter=RateLimiter(
+            requests_per_minute=args.rpm,
+            max_concurrent=args.max_llm_concurrency,
+            tokens_per_minute=args.tpm,
+        ),
+    )
+    bus = EventBus([JSONLSink(args.events)]) if args.events else None
+    server = AgentServer(
+        llm,
+        max_sessions=args.max_sessions,
+        max_active_runs=args.max_active_runs,
+        max_queued_runs=args.max_queued_runs,
+        idle_timeout=args.idle_timeout,
+        workdir=args.workdir,
+        session_dir=args.session_dir,
+        max_tool_concurrency=args.tool_concurrency,
+        events=bus,
+        agent_kwargs={"max_steps": args.max_steps},
+    )
+    await server.start(args.host, args.port, path=args.unix)
+    print(f"🌐 MiniAgent 服务已启动: {args.unix or f'http://{args.host}:{server.address[1]}'}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        if bus is not None:
+            bus.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 服务已停止")
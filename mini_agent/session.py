@@ -0,0 +1,381 @@
+"""
+会话持久化：只追加的记忆日志
+
+每一步结束时把新增的消息和 (步数, 状态) 检查点追加到日志文件，进程崩溃或重启后可以
+恢复 Memory、current_step 和 state，让代理从中断处继续：
+
+    session = SessionLog("session.log")
+    agent = MiniAgent(llm, session=session)   # 日志中已有内容时自动恢复
+    if agent.state == AgentState.RUNNING:
+        await agent.resume()
+
+日志由若干帧组成，每帧带长度和CRC校验，写到一半的尾部在打开时被截掉；只有检查点帧之前
+的消息才算提交，恢复出的记忆总是停在某一步的边界上。旁路索引文件（<path>.idx）记录
+已提交消息的偏移和token数，恢复时只需读取索引和其后的少量尾部帧，不必逐条扫描、校验
+和重新计数整个历史。
+"""
+import asyncio
+import gc
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional
+
+from mini_agent import fastjson
+from mini_agent.schema import Memory
+from mini_agent.tokens import count_message_tokens
+
+LOG_MAGIC = b"MASLOG1\n"
+INDEX_MAGIC = b"MASIDX1\n"
+
+# 帧头: 类型、标志、载荷长度、载荷CRC32
+FRAME = struct.Struct("<BBII")
+KIND_MESSAGE = 1
+KIND_CHECKPOINT = 2
+KIND_RESET = 3  # 记忆被整体替换或删改，之后的消息从头开始
+FLAG_ZLIB = 1
+
+SYNC_POLICIES = ("always", "batch", "never")
+
+
+class SessionError(Exception):
+    """会话日志损坏或格式不兼容"""
+
+
+class SessionSnapshot:
+    """从日志恢复出的会话状态"""
+    __slots__ = ("messages", "token_counts", "step", "state", "messages_json")
+
+    def __init__(
+        self,
+        messages: List[Dict[str, Any]],
+        token_counts: array,
+        step: int,
+        state: str,
+        messages_json: Optional[bytes] = None,
+    ):
+        self.messages = messages
+        self.token_counts = token_counts
+        self.step = step
+        self.state = state
+        self.messages_json = messages_json
+
+
+class _Scan:
+    """扫描日志得到的已提交状态"""
+    __slots__ = (
+        "offsets", "tokens", "step", "state", "end", "live", "live_tokens", "has_checkpoint", "indexed", "pending_reset",
+    )
+
+    def __init__(self) -> None:
+        self.offsets = array("q")  # 已提交消息的帧偏移
+        self.tokens = array("q")
+        self.step = 0
+        self.state = "idle"
+        self.end = len(LOG_MAGIC)  # 最后一个检查点帧之后的位置
+        self.live = array("q")  # 尚未提交的消息（含已提交的部分）
+        self.live_tokens = array("q")
+        self.has_checkpoint = False
+        self.indexed = 0  # 索引中已记录的消息数
+        self.pending_reset = False  # 读到重置帧但还没有读到其后的检查点
+
+
+class SessionLog:
+    """只追加的会话日志
+
+    Args:
+        path: 日志文件路径，已存在时打开并恢复
+        sync: 何时 fsync，"always" 每个检查点，"batch" 距上次超过 sync_interval 秒时，
+            "never" 交给操作系统（关闭时仍会 fsync）
+        sync_interval: 批量 fsync 的间隔（秒）
+        compress: 是否用 zlib 压缩较大的消息
+        compress_min_bytes: 超过该长度的消息才压缩
+        index_interval: 每提交这么多条消息重写一次索引，决定恢复时最多需要扫描的尾部长度
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sync: str = "batch",
+        sync_interval: float = 1.0,
+        compress: bool = False,
+        compress_min_bytes: int = 1024,
+        index_interval: int = 1000,
+    ):
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f"未知的 fsync 策略: {sync}")
+        self.path = path
+        self.index_path = path + ".idx"
+        self.sync = sync
+        self.sync_interval = sync_interval
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        self.index_interval = index_interval
+
+        scan = self._recover()
+        self.snapshot: Optional[SessionSnapshot] = self._load(scan) if scan.has_checkpoint else None
+        self._offsets = scan.offsets
+        self._tokens = scan.tokens
+        self._indexed = scan.indexed
+        self._step = scan.step
+        self._state = scan.state
+        self._file = open(path, "ab")
+        self._position = scan.end
+        self._written = 0  # 已写入日志的记忆消息数
+        self._revision: Optional[int] = None  # 写入时记忆的 revision，不一致说明记忆被改过
+        self._last_sync = time.monotonic()
+        self._closed = False
+
+    def restore(self, memory: Memory) -> Optional[SessionSnapshot]:
+        """把已提交的消息恢复到记忆中，之后的检查点只追加新增的消息"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        memory.restore(snapshot.messages, snapshot.token_counts, snapshot.messages_json)
+        self._written = len(memory)
+        self._revision = memory.revision
+        return snapshot
+
+    async def checkpoint(self, memory: Memory, step: int, state: str) -> None:
+        """追加记忆中新增的消息和一个检查点"""
+        if self._closed:
+            raise SessionError("会话日志已关闭")
+        frames: List[bytes] = []
+        if memory.revision != self._revision or len(memory) < self._written:
+            # 记忆被替换或删改过，无法只追加，写入重置帧后重新记录全部消息
+            frames.append(self._frame(KIND_RESET, b""))
+            self._offsets = array("q")
+            self._tokens = array("q")
+            self._indexed = 0
+            self._written = 0
+            self._revision = memory.revision
+
+        messages = memory.get_messages()
+        token_counts = memory.get_token_counts()
+        position = self._position + sum(len(frame) for frame in frames)
+        for index in range(self._written, len(messages)):
+            frame = self._frame(KIND_MESSAGE, fastjson.dumps(messages[index]))
+            self._offsets.append(position)
+            self._tokens.append(token_counts[index])
+            frames.append(frame)
+            position += len(frame)
+        self._written = len(messages)
+        frames.append(self._frame(KIND_CHECKPOINT, fastjson.dumps({
+            "messages": len(messages), "step": step, "state": state,
+        })))
+
+        data = b"".join(frames)
+        self._file.write(data)
+        self._file.flush()
+        self._position += len(data)
+        self._step, self._state = step, state
+
+        if self.sync == "always" or (
+            self.sync == "batch" and time.monotonic() - self._last_sync >= self.sync_interval
+        ):
+            await self._fsync()
+        if len(self._offsets) - self._indexed >= self.index_interval:
+            self._write_index()
+
+    def compact(self, memory: Memory, step: int, state: str) -> None:
+        """用当前记忆重写日志，丢掉重置帧之前的历史"""
+        temp_path = self.path + ".tmp"
+        offsets = array("q")
+        tokens = array("q")
+        token_counts = memory.get_token_counts()
+        with open(temp_path, "wb") as f:
+            f.write(LOG_MAGIC)
+            position = len(LOG_MAGIC)
+            for message, message_tokens in zip(memory.get_messages(), token_counts):
+                frame = self._frame(KIND_MESSAGE, fastjson.dumps(message))
+                offsets.append(position)
+                tokens.append(message_tokens)
+                f.write(frame)
+                position += len(frame)
+            checkpoint = self._frame(KIND_CHECKPOINT, fastjson.dumps({
+                "messages": len(offsets), "step": step, "state": state,
+            }))
+            f.write(checkpoint)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        # 先删除旧索引，避免替换日志后崩溃时索引指向新文件中错误的位置
+        self._remove_index()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "ab")
+        self._position = position + len(checkpoint)
+        self._offsets, self._tokens = offsets, tokens
+        self._written = len(offsets)
+        self._revision = memory.revision
+        self._step, self._state = step, state
+        self._last_sync = time.monotonic()
+        self._write_index()
+
+    def close(self) -> None:
+        """fsync 并写出最新的索引"""
+        if self._closed:
+            return
+        self._closed = True
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if len(self._offsets) != self._indexed:
+            self._write_index()
+
+    async def _fsync(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, os.fsync, self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def _frame(self, kind: int, payload: bytes) -> bytes:
+        flags = 0
+        if self.compress and kind == KIND_MESSAGE and len(payload) >= self.compress_min_bytes:
+            compressed = zlib.compress(payload, 1)
+            if len(compressed) < len(payload):
+                payload, flags = compressed, FLAG_ZLIB
+        return FRAME.pack(kind, flags, len(payload), zlib.crc32(payload)) + payload
+
+    # ---- 恢复 ----
+
+    def _recover(self) -> _Scan:
+        """读取索引和其后的尾部帧，截掉写到一半的尾部"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self._remove_index()
+            with open(self.path, "wb") as f:
+                f.write(LOG_MAGIC)
+            return _Scan()
+
+        with open(self.path, "rb") as f:
+            if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                raise SessionError(f"不是会话日志: {self.path}")
+            size = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                scan = self._read_index(size) or _Scan()
+                self._scan(view, scan, size)
+
+        if scan.end < size:
+            # 最后一个检查点之后的内容（未提交的消息或损坏的帧）全部丢弃
+            with open(self.path, "r+b") as f:
+                f.truncate(scan.end)
+        return scan
+
+    def _scan(self, view: mmap.mmap, scan: _Scan, size: int) -> None:
+        position = scan.end
+        while position + FRAME.size <= size:
+            kind, flags, length, crc = FRAME.unpack_from(view, position)
+            end = position + FRAME.size + length
+            if end > size:
+                break
+            payload = view[position + FRAME.size:end]
+            if zlib.crc32(payload) != crc:
+                break
+            if kind == KIND_MESSAGE:
+                message = fastjson.loads(zlib.decompress(payload) if flags & FLAG_ZLIB else payload)
+                scan.live.append(position)
+                scan.live_tokens.append(count_message_tokens(message))
+            elif kind == KIND_RESET:
+                # 重置和其后的消息在下一个检查点才算提交，崩溃在两者之间时保留之前已提交的消息
+                scan.live = array("q")
+                scan.live_tokens = array("q")
+                scan.pending_reset = True
+            elif kind == KIND_CHECKPOINT:
+                record = fastjson.loads(payload)
+                if scan.pending_reset:
+                    scan.offsets = array("q")
+                    scan.tokens = array("q")
+                    scan.pending_reset = False
+                committed = record["messages"] - len(scan.offsets)
+                scan.offsets.extend(scan.live[:committed])
+                scan.tokens.extend(scan.live_tokens[:committed])
+                scan.live = array("q")
+                scan.live_tokens = array("q")
+                scan.step = record["step"]
+                scan.state = record["state"]
+                scan.end = end
+                scan.has_checkpoint = True
+            else:
+                break
+            position = end
+
+    def _load(self, scan: _Scan) -> SessionSnapshot:
+        """按偏移直接从映射的文件中切出已提交消息的JSON"""
+        payloads: List[bytes] = []
+        compressed = False
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for offset in scan.offsets:
+                _, flags, length, _ = FRAME.unpack_from(view, offset)
+                payload = view[offset + FRAME.size:offset + FRAME.size + length]
+                if flags & FLAG_ZLIB:
+                    payload = zlib.decompress(payload)
+                    compressed = True
+                payloads.append(payload)
+        # 一次解码整个列表；未压缩的消息与 Memory 的JSON编码一致，可以直接作为其缓存
+        messages_json = b"[" + b",".join(payloads) + b"]"
+        # 一次创建大量字典时循环GC会被反复触发，解码期间暂停
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            messages = fastjson.loads(messages_json)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return SessionSnapshot(
+            messages,
+            array("l", scan.tokens),
+            scan.step,
+            scan.state,
+            None if compressed else messages_json,
+        )
+
+    # ---- 索引 ----
+
+    def _write_index(self) -> None:
+        header = fastjson.dumps({
+            "log_size": self._position, "messages": len(self._offsets), "step": self._step, "state": self._state,
+        })
+        body = struct.pack("<I", len(header)) + header + self._offsets.tobytes() + self._tokens.tobytes()
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(INDEX_MAGIC + struct.pack("<I", zlib.crc32(body)) + body)
+        os.replace(temp_path, self.index_path)
+        self._indexed = len(self._offsets)
+
+    def _read_index(self, size: int) -> Optional[_Scan]:
+        """读取索引，索引缺失、损坏或超出日志长度时返回None（退回全量扫描）"""
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        prefix = len(INDEX_MAGIC) + 4
+        if data[:len(INDEX_MAGIC)] != INDEX_MAGIC or len(data) < prefix + 4:
+            return None
+        (crc,) = struct.unpack_from("<I", data, len(INDEX_MAGIC))
+        body = data[prefix:]
+        if zlib.crc32(body) != crc:
+            return None
+        (header_size,) = struct.unpack_from("<I", body)
+        header = fastjson.loads(body[4:4 + header_size])
+        count = header["messages"]
+        if header["log_size"] > size or len(body) != 4 + header_size + count * 16:
+            return None
+
+        scan = _Scan()
+        start = 4 + header_size
+        scan.offsets.frombytes(body[start:start + count * 8])
+        scan.tokens.frombytes(body[start + count * 8:])
+        scan.step = header["step"]
+        scan.state = header["state"]
+        scan.end = header["log_size"]
+        scan.has_checkpoint = True  # 索引只在检查点之后写入
+        scan.indexed = count
+        return scan
+
+    def _remove_index(self) -> None:
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,217 @@
+"""
+异步子进程执行引擎
+"""
+import asyncio
+import codecs
+import os
+import re
+import signal
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+# 输出回调: (流名称 "stdout"/"stderr", 文本片段)
+OutputCallback = Callable[[str, str], None]
+
+
+class ShellResult(BaseModel):
+    """子进程执行结果"""
+    returncode: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    timed_out: bool = False
+    truncated: bool = False
+    duration: float = 0.0
+
+
+class _OutputBuffer:
+    """带上限的输出缓冲区，超出上限的部分只计数不保存"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.dropped = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, data: bytes) -> str:
+        """写入一段原始输出，返回解码后的文本片段"""
+        room = self.limit - self.size
+        if room > 0:
+            kept = data[:room]
+            self.chunks.append(kept)
+            self.size += len(kept)
+        self.dropped += max(0, len(data) - max(room, 0))
+        return self._decoder.decode(data)
+
+    def text(self) -> str:
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+
+# 输出只取决于参数中文件内容的命令，结果可以缓存
+READ_ONLY_COMMANDS = frozenset({"cat", "head", "tail", "wc", "ls", "file", "md5sum", "sha1sum", "sha256sum", "pwd"})
+# ls 只允许这些选项：-l 等选项的输出取决于目录中每个文件的属性，-R 取决于整棵目录树
+_LS_FLAGS = frozenset("1aAFp")
+# 管道、重定向、变量、通配符、引号等需要 shell 解释的字符
+_SHELL_SPECIAL = re.compile(r"[;&|<>$`*?\[\]{}~()\\\n'\"#=]")
+
+
+def read_only_paths(command: str) -> Optional[List[str]]:
+    """命令只读取文件时返回它读取的路径（相对于工作目录），否则返回None
+
+    只识别不含管道、重定向、变量和通配符的单个简单命令，无法确定时一律视为会修改状态。
+    """
+    if _SHELL_SPECIAL.search(command):
+        return None
+    words = command.split()
+    if not words or words[0] not in READ_ONLY_COMMANDS:
+        return None
+    program, args = words[0], words[1:]
+    flags = [arg for arg in args if arg.startswith("-")]
+    paths = [arg for arg in args if not arg.startswith("-")]
+    if program == "pwd":
+        return []
+    if program == "ls":
+        if any(flag == "-" or flag.startswith("--") or set(flag[1:]) - _LS_FLAGS for flag in flags):
+            return None
+        return paths or ["."]
+    if program == "tail" and any(flag.startswith(("-f", "-F", "--f")) for flag in flags):
+        return None  # 持续跟踪文件
+    # 没有文件参数时读取标准输入
+    return paths or None
+
+
+def kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    """终止子进程及其创建的整个进程组"""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        elif proc.returncode is None:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ShellRunner:
+    """基于 asyncio 子进程的命令执行器
+
+    所有命令共享一个并发上限，超出上限的调用在事件循环上排队等待，
+    不会阻塞其他协程。
+    """
+
+    def __init__(self, max_concurrency: int = 8, chunk_size: int = 4096):
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 信号量与事件循环绑定，每个循环各持有一个
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def run(
+        self,
+        command: str,
+        timeout: Optional[float] = 30.0,
+        max_output: int = 64 * 1024,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        on_output: Optional[OutputCallback] = None,
+    ) -> ShellResult:
+        """执行命令并流式读取输出
+
+        Args:
+            command: 要执行的shell命令
+            timeout: 超时时间（秒），None表示不限制
+            max_output: stdout/stderr 各自保留的最大字节数
+            cwd: 工作目录
+            env: 环境变量
+            on_output: 每读到一段输出就调用一次的回调
+
+        Returns:
+            ShellResult: 执行结果。超时后整个进程组会被终止。
+        """
+        async with self._get_semaphore():
+            return await self._run(command, timeout, max_output, cwd, env, on_output)
+
+    async def _run(
+        self,
+        command: str,
+        timeout: Optional[float],
+        max_output: int,
+        cwd: Optional[str],
+        env: Optional[Dict[str, str]],
+        on_output: Optional[OutputCallback],
+    ) -> ShellResult:
+        start = time.monotonic()
+        kwargs = {"start_new_session": True} if os.name == "posix" else {}
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            **kwargs,
+        )
+        stdout = _OutputBuffer(max_output)
+        stderr = _OutputBuffer(max_output)
+        timed_out = False
+
+        pumps = asyncio.gather(
+            self._pump(proc.stdout, "stdout", stdout, on_output),
+            self._pump(proc.stderr, "stderr", stderr, on_output),
+            proc.wait(),
+        )
+        # 调用方取消时 gather 以 CancelledError 结束，取走它，避免 "exception was never retrieved"
+        pumps.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            await asyncio.wait_for(pumps, timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill_process_group(proc)
+            await proc.wait()
+        except BaseException:
+            # 取消或其他异常：不留下孤儿进程
+            kill_process_group(proc)
+            raise
+
+        return ShellResult(
+            returncode=proc.returncode,
+            stdout=stdout.text(),
+            stderr=stderr.text(),
+            timed_out=timed_out,
+            truncated=bool(stdout.dropped or stderr.dropped),
+            duration=time.monotonic() - start,
+        )
+
+    async def _pump(
+        self,
+        stream: asyncio.StreamReader,
+        name: str,
+        buffer: _OutputBuffer,
+        on_output: Optional[OutputCallback],
+    ) -> None:
+        """持续读取管道直到EOF，超出上限的输出被丢弃但仍会读走，避免子进程阻塞"""
+        while True:
+            data = await stream.read(self.chunk_size)
+            if not data:
+                break
+            text = buffer.feed(data)
+            if on_output and text:
+                on_output(name, text)
+
+
+_default_runner = ShellRunner()
+
+
+def get_default_runner() -> ShellRunner:
+    """获取进程内共享的默认执行器"""
+    return _default_runner
@@ -0,0 +1,227 @@
+"""
+本地持久化任务队列（SQLite）
+
+多个工作进程通过同一个SQLite文件（WAL模式）共享任务。工作进程领取任务时获得一个
+有期限的租约，执行期间定期续约（心跳）；进程崩溃或卡住时租约过期，任务回到队列由
+其他进程重新执行。每次领取计为一次尝试，超过 max_attempts 的任务（例如每次都让
+工作进程崩溃的任务）标记为失败，不再重试。
+
+    queue = TaskQueue("tasks.db")
+    queue.put(read_tasks("tasks.jsonl"))
+    leased = queue.lease("worker-1", 8)
+    queue.heartbeat("worker-1", [task.id for task in leased])
+    queue.complete("worker-1", result)
+
+任务ID在队列中唯一，重复加入的任务被忽略，因此中断后可以用同样的任务文件继续。
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from mini_agent.batch import BatchResult, BatchTask
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueStats(BaseModel):
+    """队列统计，processed 和 by_worker 只统计 since 之后结束的任务"""
+    queued: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+    retried: int = 0  # 尝试过不止一次的任务数
+    processed: int = 0
+    by_worker: Dict[str, int] = {}
+    elapsed: float = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self.queued + self.leased
+
+    @property
+    def tasks_per_hour(self) -> float:
+        return self.processed / self.elapsed * 3600 if self.elapsed else 0.0
+
+
+class TaskQueue:
+    """SQLite 支持的任务队列，可被多个进程同时使用
+
+    每个进程（包括 fork 出的子进程）使用自己的数据库连接。连接可以在其他线程中使用
+    （例如事件循环把队列操作交给单线程的线程池），但调用方需要保证同一时间只有一个线程使用。
+
+    Args:
+        path: 数据库文件路径
+        lease_seconds: 租约期限，工作进程需要在期限内续约
+        max_attempts: 每个任务最多被领取的次数
+        busy_timeout: 等待其他进程释放写锁的时间（秒），超过时抛出 sqlite3.OperationalError；
+            默认为租约期限的四分之一，一次续约等锁不会拖到租约过期
+    """
+
+    def __init__(
+        self, path: str, lease_seconds: float = 60.0, max_attempts: int = 3, busy_timeout: Optional[float] = None
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.busy_timeout = busy_timeout if busy_timeout is not None else min(30.0, lease_seconds / 4)
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def put(self, tasks: Iterable[BatchTask]) -> int:
+        """加入任务，已存在的ID被忽略，返回新加入的任务数"""
+        now = time.time()
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO tasks (id, task, enqueued) VALUES (?, ?, ?)",
+                ((task.id, task.model_dump_json(), now) for task in tasks),
+            )
+            return db.total_changes - before
+
+    def lease(self, worker: str, limit: int) -> List[BatchTask]:
+        """领取最多 limit 个排队中或租约已过期的任务"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as db:
+            self._fail_exhausted(db, "租约过期", "state = ? AND lease_until < ?", (LEASED, now))
+            rows = db.execute(
+                "SELECT id, task FROM tasks WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY rowid LIMIT ?",
+                (QUEUED, LEASED, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                ((LEASED, worker, now + self.lease_seconds, task_id) for task_id, _ in rows),
+            )
+        return [BatchTask.model_validate_json(task) for _, task in rows]
+
+    def heartbeat(self, worker: str, task_ids: Iterable[str]) -> List[str]:
+        """为仍持有的任务续约，返回已经失去租约（被其他进程领取或已结束）的任务ID"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return []
+        with self._transaction() as db:
+            placeholders = ",".join("?" * len(task_ids))
+            db.execute(
+                f"UPDATE tasks SET lease_until = ? WHERE worker = ? AND state = ? AND id IN ({placeholders})",
+                (time.time() + self.lease_seconds, worker, LEASED, *task_ids),
+            )
+            owned = {row[0] for row in db.execute(
+                f"SELECT id FROM tasks WHERE worker = ? AND state = ? AND id IN ({placeholders})",
+                (worker, LEASED, *task_ids),
+            )}
+        return [task_id for task_id in task_ids if task_id not in owned]
+
+    def complete(self, worker: str, result: BatchResult) -> bool:
+        """记录任务结果；租约已被其他进程接手时不记录，返回 False"""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET state = ?, result = ?, finished = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (FAILED if result.error else DONE, result.model_dump_json(), time.time(), result.id, worker, LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, worker: Optional[str] = None) -> int:
+        """把某个工作进程（None 表示全部）持有的任务放回队列，返回放回的任务数
+
+        用于工作进程退出或崩溃后立即重新分配，不必等待租约过期；已用完尝试次数的任务标记为失败。
+        无法确定是哪个任务导致了崩溃，同一进程中的其他任务也计一次尝试。
+        """
+        condition, params = ("state = ?", (LEASED,)) if worker is None else ("state = ? AND worker = ?", (LEASED, worker))
+        with self._transaction() as db:
+            self._fail_exhausted(db, "工作进程异常退出", condition, params)
+            cursor = db.execute(f"UPDATE tasks SET state = ?, lease_until = NULL WHERE {condition}", (QUEUED, *params))
+            return cursor.rowcount
+
+    def pending(self) -> int:
+        """排队中和执行中的任务数"""
+        (count,) = self._connection().execute(
+            "SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)", (QUEUED, LEASED)
+        ).fetchone()
+        return count
+
+    def stats(self, since: Optional[float] = None) -> QueueStats:
+        """汇总各状态的任务数，since（time.time() 时刻）之后结束的任务按工作进程统计"""
+        db = self._connection()
+        stats = QueueStats()
+        for state, count in db.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"):
+            setattr(stats, state, count)
+        (stats.retried,) = db.execute("SELECT COUNT(*) FROM tasks WHERE attempts > 1").fetchone()
+        for worker, count in db.execute(
+            "SELECT worker, COUNT(*) FROM tasks WHERE finished >= ? GROUP BY worker", (since or 0.0,)
+        ):
+            stats.by_worker[worker] = count
+            stats.processed += count
+        return stats
+
+    def results(self) -> Iterator[BatchResult]:
+        """按结束顺序返回已结束任务的结果"""
+        rows = self._connection().execute(
+            "SELECT result FROM tasks WHERE state IN (?, ?) ORDER BY finished", (DONE, FAILED)
+        ).fetchall()
+        for (result,) in rows:
+            yield BatchResult.model_validate_json(result)
+
+    def close(self) -> None:
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = None
+
+    def _fail_exhausted(self, db: sqlite3.Connection, reason: str, condition: str, params: tuple) -> None:
+        """用完尝试次数的租约任务标记为失败"""
+        rows = db.execute(
+            f"SELECT id, task, attempts FROM tasks WHERE {condition} AND attempts >= ?", (*params, self.max_attempts)
+        ).fetchall()
+        now = time.time()
+        for task_id, task, attempts in rows:
+            result = BatchResult(
+                id=task_id,
+                task=json.loads(task)["task"],
+                state="error",
+                error=f"{reason}，已尝试 {attempts} 次",
+            )
+            db.execute(
+                "UPDATE tasks SET state = ?, result = ?, finished = ?, lease_until = NULL WHERE id = ?",
+                (FAILED, result.model_dump_json(), now, task_id),
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务：BEGIN IMMEDIATE 立即取得写锁，多个进程同时领取时不会领到同一个任务"""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # isolation_level=None：由 _transaction 显式管理事务；timeout：等待其他进程释放写锁
+            self._db = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False
+            )
+            self._pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id TEXT PRIMARY KEY, task TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'queued', "
+                "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, "
+                "enqueued REAL NOT NULL, finished REAL, result TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)")
+        return self._db
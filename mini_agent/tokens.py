@@ -0,0 +1,55 @@
+"""
+Token计数
+"""
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - 可选依赖
+    tiktoken = None
+
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+_encoding: Any = None
+
+
+def _get_encoding() -> Any:
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # 编码文件无法下载时退回估算
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """计算文本的token数
+
+    安装了 tiktoken 时精确计数，否则按UTF-8字节数估算：英文约4字节一个token，
+    中文约3字节（一个字）一个token，这里统一按3字节计，宁多勿少。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    """计算一条API格式消息的token数"""
+    tokens = MESSAGE_OVERHEAD + count_tokens(message.get("content"))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += MESSAGE_OVERHEAD + count_tokens(function.get("name")) + count_tokens(function.get("arguments"))
+    if message.get("tool_call_id"):
+        tokens += count_tokens(message["tool_call_id"])
+    return tokens
+
+
+def count_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """计算消息列表的token总数"""
+    return sum(count_message_tokens(message) for message in messages)
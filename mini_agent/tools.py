@@ -1,11 +1,21 @@
 """
 工具系统实现
 """
+import asyncio
+import functools
+import json
 import os
-import subprocess
+import uuid
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Tuple
+from pydantic import BaseModel, PrivateAttr
+
+from mini_agent import deadline, fastjson, fileops
+from mini_agent.results import ResultStore, get_result_store
+from mini_agent.sandbox import PythonWorkerPool, get_default_pool
+from mini_agent.shell import OutputCallback, ShellRunner, get_default_runner, read_only_paths
+from mini_agent.validation import Validator, compile_schema, json_type_name
 
 
 class ToolResult(BaseModel):
@@ -13,6 +23,7 @@ class ToolResult(BaseModel):
     success: bool = True
     output: str = ""
     error: str = ""
+    cached: bool = False  # 是否来自本次运行中相同只读调用的缓存
 
 
 class BaseTool(ABC, BaseModel):
@@ -25,6 +36,29 @@ class BaseTool(ABC, BaseModel):
     async def execute(self, **kwargs) -> ToolResult:
         """执行工具"""
         pass
+
+    def is_parallel_safe(self, **kwargs) -> bool:
+        """本次调用能否与同一轮的其他调用并发执行，默认不能"""
+        return False
+
+    def conflict_key(self, **kwargs) -> Optional[str]:
+        """并发执行时的资源标识，相同标识的调用按原顺序依次执行"""
+        return None
+    
+    def is_read_only(self, **kwargs) -> bool:
+        """本次调用是否只读取状态（不修改文件和环境），默认不是
+        
+        只读调用的结果在同一次运行中可以复用，流式响应中也可以在整轮结束前提前执行。
+        """
+        return False
+    
+    def dependencies(self, **kwargs) -> List[str]:
+        """只读调用读取的文件或目录，它们的 mtime/inode/大小 变化时缓存的结果失效"""
+        return []
+    
+    async def close(self) -> None:
+        """释放工具占用的资源"""
+        pass
     
     def to_function_def(self) -> Dict[str, Any]:
         """转换为OpenAI函数调用格式"""
@@ -39,7 +73,12 @@ class BaseTool(ABC, BaseModel):
 
 
 class PythonExecutor(BaseTool):
-    """Python代码执行工具"""
+    """Python代码执行工具
+    
+    代码在常驻的工作进程中执行，每个实例对应一个会话。memory_limit_mb 是会话工作进程的
+    地址空间上限（作用于整个进程，包括之前调用留下的变量），None 使用进程池的设置（默认
+    不限制），0 表示不限制。
+    """
     name: str = "python_execute"
     description: str = "执行Python代码并返回结果"
     parameters: Dict[str, Any] = {
@@ -53,40 +92,82 @@ class PythonExecutor(BaseTool):
         "required": ["code"]
     }
     
+    timeout: float = 30.0
+    max_output: int = 64 * 1024
+    cwd: Optional[str] = None
+    memory_limit_mb: Optional[int] = None
+    
+    _pool: Optional[PythonWorkerPool] = PrivateAttr(default=None)
+    _session_id: str = PrivateAttr(default="")
+    
+    def __init__(
+        self,
+        pool: Optional[PythonWorkerPool] = None,
+        session_id: Optional[str] = None,
+        **data: Any
+    ):
+        super().__init__(**data)
+        self._pool = pool
+        self._session_id = session_id or uuid.uuid4().hex
+    
+    @property
+    def pool(self) -> PythonWorkerPool:
+        if self._pool is None:
+            self._pool = get_default_pool()
+        return self._pool
+    
+    @property
+    def session_id(self) -> str:
+        return self._session_id
+    
     async def execute(self, code: str, **kwargs) -> ToolResult:
+        # 在会话专属的工作进程中执行，变量和导入的模块在多次调用之间保留
         try:
-            # 简化版本：使用exec执行代码
-            local_vars = {}
-            global_vars = {"__builtins__": __builtins__}
-            
-            # 捕获输出
-            import io
-            import sys
-            old_stdout = sys.stdout
-            sys.stdout = mystdout = io.StringIO()
-            
-            try:
-                exec(code, global_vars, local_vars)
-                output = mystdout.getvalue()
-            finally:
-                sys.stdout = old_stdout
-            
-            return ToolResult(success=True, output=output)
+            result = await self.pool.execute(
+                self.session_id,
+                code,
+                timeout=self.timeout,
+                max_output=self.max_output,
+                cwd=self.cwd,
+                memory_limit_mb=self.memory_limit_mb,
+            )
         except Exception as e:
             return ToolResult(success=False, error=str(e))
+        
+        output = result.stdout
+        if result.stderr:
+            output += f"\n[stderr]\n{result.stderr}"
+        if result.error:
+            return ToolResult(success=False, output=output, error=result.error)
+        return ToolResult(success=True, output=output)
+    
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close_session(self.session_id)
 
 
 class FileEditor(BaseTool):
-    """文件编辑工具"""
+    """文件编辑工具
+
+    读取类操作只读取需要的部分（按行/字节范围、head/tail、grep），所有输出都受
+    max_output 限制，大文件不会被整个读进内存或塞进上下文。涉及大文件的操作和需要
+    fsync 的写入在线程池中执行，不阻塞事件循环；小文件直接执行，省去线程切换的开销。
+    """
     name: str = "file_editor"
-    description: str = "查看、创建和编辑文件"
+    description: str = (
+        "查看、创建和编辑文件。大文件请用 head/tail/grep 或 start_line/max_lines 分段读取，"
+        "输出超过上限时会被截断"
+    )
     parameters: Dict[str, Any] = {
         "type": "object",
         "properties": {
             "action": {
                 "type": "string",
-                "enum": ["read", "write", "list"],
-                "description": "操作类型：read(读取), write(写入), list(列出目录)"
+                "enum": ["read", "head", "tail", "grep", "write", "append", "list"],
+                "description": (
+                    "操作类型：read(读取，可指定行或字节范围), head(前几行), tail(最后几行), "
+                    "grep(搜索匹配行), write(原子写入), append(追加), list(列出目录)"
+                )
             },
             "path": {
                 "type": "string",
@@ -94,38 +175,238 @@ class FileEditor(BaseTool):
             },
             "content": {
                 "type": "string",
-                "description": "写入时的文件内容"
+                "description": "write/append 的内容"
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "read: 起始行号（从1开始）"
+            },
+            "max_lines": {
+                "type": "integer",
+                "description": "read: 最多读取的行数"
+            },
+            "byte_offset": {
+                "type": "integer",
+                "description": "read: 起始字节偏移（与行范围二选一）"
+            },
+            "byte_length": {
+                "type": "integer",
+                "description": "read: 读取的字节数"
+            },
+            "lines": {
+                "type": "integer",
+                "description": "head/tail: 行数，默认20"
+            },
+            "pattern": {
+                "type": "string",
+                "description": "grep: 正则表达式"
+            },
+            "context": {
+                "type": "integer",
+                "description": "grep: 匹配行前后显示的行数，默认0"
+            },
+            "ignore_case": {
+                "type": "boolean",
+                "description": "grep: 是否忽略大小写"
+            },
+            "offset": {
+                "type": "integer",
+                "description": "list: 跳过的条目数，用于分页"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "list: 最多列出的条目数，默认200"
             }
         },
         "required": ["action", "path"]
     }
+    max_output: int = fileops.DEFAULT_MAX_OUTPUT
+    max_matches: int = 100
+    inline_max_bytes: int = 256 * 1024
+    # 工作目录：设置后相对路径相对于它解析，且不允许访问该目录之外的文件
+    root: Optional[str] = None
     
+    def is_parallel_safe(self, action: str = "", **kwargs) -> bool:
+        # 只有读取可以并发；写入还会改变所在目录的列表，单独执行，作为前后读取之间的屏障
+        return self.is_read_only(action)
+
+    def conflict_key(self, path: str = "", **kwargs) -> Optional[str]:
+        try:
+            return self.resolve(path)
+        except ValueError:
+            return path
+
+    def is_read_only(self, action: str = "", **kwargs) -> bool:
+        return action in ("read", "head", "tail", "grep", "list")
+
+    def dependencies(self, path: str = "", **kwargs) -> List[str]:
+        return [self.resolve(path)]
+
+    def resolve(self, path: str) -> str:
+        """把路径解析为绝对路径，超出工作目录时抛出 ValueError"""
+        if self.root is None:
+            return os.path.abspath(path)
+        root = os.path.realpath(self.root)
+        resolved = os.path.realpath(os.path.join(root, path))
+        if resolved != root and not resolved.startswith(root + os.sep):
+            raise ValueError(f"路径超出工作目录: {path}")
+        return resolved
+
     async def execute(self, action: str, path: str, content: str = "", **kwargs) -> ToolResult:
         try:
-            if action == "read":
-                with open(path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return ToolResult(success=True, output=content)
-            
-            elif action == "write":
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                return ToolResult(success=True, output=f"文件已写入: {path}")
-            
-            elif action == "list":
-                if os.path.isdir(path):
-                    files = os.listdir(path)
-                    output = "\n".join(files)
-                    return ToolResult(success=True, output=output)
-                else:
-                    return ToolResult(success=False, error="路径不是目录")
-            
+            path = self.resolve(path)
+            if not self._offload(action, path, content):
+                return self._run(action, path, content, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self._run, action, path, content, **kwargs))
+        except Exception as e:
+            return ToolResult(success=False, error=str(e))
+
+    def _offload(self, action: str, path: str, content: str) -> bool:
+        """是否放到线程池中执行"""
+        if action == "write":
+            return True  # 原子写入需要 fsync
+        if action == "append":
+            return len(content) > self.inline_max_bytes
+        if action == "list":
+            return False  # 每次最多列出 limit 个条目
+        try:
+            return os.stat(path).st_size > self.inline_max_bytes
+        except OSError:
+            return False  # 由 _run 报告错误
+
+    def _run(
+        self,
+        action: str,
+        path: str,
+        content: str,
+        start_line: Optional[int] = None,
+        max_lines: Optional[int] = None,
+        byte_offset: Optional[int] = None,
+        byte_length: Optional[int] = None,
+        lines: int = 20,
+        pattern: str = "",
+        context: int = 0,
+        ignore_case: bool = False,
+        offset: int = 0,
+        limit: int = 200,
+        **kwargs
+    ) -> ToolResult:
+        if action == "read":
+            output, _ = fileops.read(path, start_line, max_lines, byte_offset, byte_length, self.max_output)
+        elif action == "head":
+            output, _ = fileops.head(path, lines, self.max_output)
+        elif action == "tail":
+            output, _ = fileops.tail(path, lines, self.max_output)
+        elif action == "grep":
+            if not pattern:
+                return ToolResult(success=False, error="grep 需要 pattern 参数")
+            output, _ = fileops.grep(path, pattern, context, self.max_matches, ignore_case, self.max_output)
+        elif action == "write":
+            size = fileops.atomic_write(path, content)
+            output = f"文件已写入: {path} ({size} 字节)"
+        elif action == "append":
+            size = fileops.append(path, content)
+            output = f"已追加到文件: {path} ({size} 字节)"
+        elif action == "list":
+            if not os.path.isdir(path):
+                return ToolResult(success=False, error="路径不是目录")
+            output, _ = fileops.list_dir(path, offset, limit, self.max_output)
+        else:
+            return ToolResult(success=False, error=f"未知的操作: {action}")
+        return ToolResult(success=True, output=output)
+
+
+RESULT_READER_NAME = "read_result"
+
+
+class ResultReader(BaseTool):
+    """分页读取落盘的工具结果（见 mini_agent/results.py）"""
+    name: str = RESULT_READER_NAME
+    description: str = "读取因过大而被省略的工具结果，句柄形如 result:xxxx，支持按行/字节范围读取和搜索"
+    parameters: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "结果句柄，如 result:0123456789abcdef"
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "起始行号（从1开始）"
+            },
+            "max_lines": {
+                "type": "integer",
+                "description": "最多读取的行数"
+            },
+            "byte_offset": {
+                "type": "integer",
+                "description": "起始字节偏移（与行范围二选一）"
+            },
+            "byte_length": {
+                "type": "integer",
+                "description": "读取的字节数"
+            },
+            "pattern": {
+                "type": "string",
+                "description": "只返回匹配该正则表达式的行"
+            },
+            "context": {
+                "type": "integer",
+                "description": "搜索时匹配行前后显示的行数"
+            }
+        },
+        "required": ["handle"]
+    }
+
+    _store: Optional[ResultStore] = PrivateAttr(default=None)
+
+    def __init__(self, store: Optional[ResultStore] = None, **data: Any):
+        super().__init__(**data)
+        self._store = store
+
+    @property
+    def store(self) -> ResultStore:
+        return self._store if self._store is not None else get_result_store()
+
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return True
+
+    def is_read_only(self, **kwargs) -> bool:
+        return True  # 结果按内容寻址，保存后不会改变
+
+    async def execute(
+        self,
+        handle: str,
+        start_line: Optional[int] = None,
+        max_lines: Optional[int] = None,
+        byte_offset: Optional[int] = None,
+        byte_length: Optional[int] = None,
+        pattern: str = "",
+        context: int = 0,
+        **kwargs
+    ) -> ToolResult:
+        try:
+            path = self.store.path_for(handle)
+            # 每页都不超过落盘阈值，读取结果本身不会再被落盘
+            max_output = self.store.threshold or fileops.DEFAULT_MAX_OUTPUT
+            if pattern:
+                output, _ = fileops.grep(path, pattern, context, max_output=max_output)
+            else:
+                output, _ = fileops.read(path, start_line, max_lines, byte_offset, byte_length, max_output)
+            return ToolResult(success=True, output=output)
+        except KeyError as e:
+            return ToolResult(success=False, error=e.args[0])
         except Exception as e:
             return ToolResult(success=False, error=str(e))
 
 
 class BashExecutor(BaseTool):
-    """命令行执行工具"""
+    """命令行执行工具
+
+    基于 asyncio 子进程执行命令，不会阻塞事件循环。超时或被取消时
+    会终止命令创建的整个进程组。
+    """
     name: str = "bash_execute"
     description: str = "执行bash命令"
     parameters: Dict[str, Any] = {
@@ -134,36 +415,113 @@ class BashExecutor(BaseTool):
             "command": {
                 "type": "string",
                 "description": "要执行的bash命令"
+            },
+            "timeout": {
+                "type": "number",
+                "description": "超时时间（秒），可选"
             }
         },
         "required": ["command"]
     }
-    
-    async def execute(self, command: str, **kwargs) -> ToolResult:
+    timeout: float = 30.0
+    max_timeout: float = 600.0
+    max_output: int = 64 * 1024
+    cwd: Optional[str] = None
+
+    _runner: Optional[ShellRunner] = PrivateAttr(default=None)
+    _on_output: Optional[OutputCallback] = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        runner: Optional[ShellRunner] = None,
+        on_output: Optional[OutputCallback] = None,
+        **data: Any
+    ):
+        super().__init__(**data)
+        self._runner = runner
+        self._on_output = on_output
+
+    @property
+    def runner(self) -> ShellRunner:
+        return self._runner or get_default_runner()
+
+    def is_read_only(self, command: str = "", **kwargs) -> bool:
+        return read_only_paths(command) is not None
+
+    def dependencies(self, command: str = "", **kwargs) -> List[str]:
+        cwd = self.cwd or os.getcwd()
+        return [os.path.join(cwd, path) for path in read_only_paths(command) or []]
+
+    async def execute(
+        self,
+        command: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[OutputCallback] = None,
+        **kwargs
+    ) -> ToolResult:
+        timeout = min(timeout or self.timeout, self.max_timeout)
         try:
-            result = subprocess.run(
+            result = await self.runner.run(
                 command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30
+                timeout=timeout,
+                max_output=self.max_output,
+                cwd=self.cwd,
+                on_output=on_output or self._on_output,
             )
-            
-            if result.returncode == 0:
-                return ToolResult(success=True, output=result.stdout)
-            else:
-                return ToolResult(success=False, error=result.stderr)
-                
-        except subprocess.TimeoutExpired:
-            return ToolResult(success=False, error="命令执行超时")
         except Exception as e:
             return ToolResult(success=False, error=str(e))
 
+        stdout = result.stdout
+        if result.truncated:
+            stdout += f"\n...[输出超过 {self.max_output} 字节，已截断]"
+
+        if result.timed_out:
+            return ToolResult(success=False, output=stdout, error=f"命令执行超时 ({timeout}秒)")
+        if result.returncode == 0:
+            return ToolResult(success=True, output=stdout)
+        return ToolResult(
+            success=False,
+            output=stdout,
+            error=result.stderr or f"命令退出码: {result.returncode}"
+        )
+
+
+# 文件指纹: (路径, mtime_ns, inode, 大小)，文件不存在时后三项为None
+Fingerprint = Tuple[Tuple[str, Optional[int], Optional[int], Optional[int]], ...]
+
+
+def fingerprint(paths: List[str]) -> Fingerprint:
+    """文件的指纹，内容被修改、替换或删除后指纹随之改变"""
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result.append((path, stat.st_mtime_ns, stat.st_ino, stat.st_size))
+        except OSError:
+            result.append((path, None, None, None))
+    return tuple(result)
+
 
 class ToolCollection:
-    """工具集合管理"""
-    def __init__(self):
+    """工具集合管理
+    
+    传入 semaphore 时，所有工具调用都在该信号量的限制下执行，
+    多个代理共享同一个信号量即可限制全局的工具并发数。
+    
+    只读调用（见 BaseTool.is_read_only）的成功结果按 (工具, 参数) 缓存，命中时还要求
+    它读取的文件的指纹没有变化；执行任何非只读调用后清空缓存，因为它可能修改了任何东西。
+    memo_size 为0时不缓存。
+    """
+    def __init__(self, semaphore: Optional[asyncio.Semaphore] = None, memo_size: int = 128):
         self.tools: Dict[str, BaseTool] = {}
+        self.semaphore = semaphore
+        self.memo_size = memo_size
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self._memo: "OrderedDict[Tuple[str, str], Tuple[Fingerprint, ToolResult]]" = OrderedDict()
+        # 工具定义在注册时失效，每次思考直接复用；参数校验函数在注册时编译
+        self._definitions: Optional[List[Dict[str, Any]]] = None
+        self._validators: Dict[str, Validator] = {}
         
         # 注册默认工具
         self.register_tool(PythonExecutor())
@@ -173,15 +531,128 @@ class ToolCollection:
     def register_tool(self, tool: BaseTool):
         """注册工具"""
         self.tools[tool.name] = tool
+        self._validators[tool.name] = compile_schema(tool.parameters)
+        self._definitions = None
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
-        """获取所有工具的函数定义"""
-        return [tool.to_function_def() for tool in self.tools.values()]
+        """获取所有工具的函数定义（返回缓存的列表，调用方不应修改）"""
+        if self._definitions is None:
+            self._definitions = [tool.to_function_def() for tool in self.tools.values()]
+        return self._definitions
+    
+    def parse_arguments(self, name: str, arguments: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """解析并校验模型给出的参数（JSON字符串），返回 (参数, 错误信息)"""
+        if name not in self.tools:
+            return None, f"工具 {name} 不存在，可用的工具: {', '.join(self.tools)}"
+        if isinstance(arguments, (str, bytes)):
+            try:
+                arguments = fastjson.loads(arguments or "{}")
+            except ValueError as e:
+                return None, f"参数不是合法的JSON: {e}"
+        if not isinstance(arguments, dict):
+            return None, f"参数必须是JSON对象，实际为 {json_type_name(arguments)}"
+        error = self.validate(name, arguments)
+        return (None, error) if error is not None else (arguments, None)
+    
+    def validate(self, name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """按工具的 parameters 校验参数，通过时返回None"""
+        validator = self._validators.get(name)
+        if validator is None:
+            tool = self.tools[name]
+            validator = self._validators[name] = compile_schema(tool.parameters)
+        return validator(arguments)
+    
+    def is_parallel_safe(self, name: str, arguments: Dict[str, Any]) -> bool:
+        """判断一次工具调用能否并发执行"""
+        tool = self.tools.get(name)
+        if tool is None:
+            return False
+        try:
+            return tool.is_parallel_safe(**arguments)
+        except Exception:
+            return False
+
+    def is_read_only(self, name: str, arguments: Dict[str, Any]) -> bool:
+        """判断一次工具调用是否只读"""
+        tool = self.tools.get(name)
+        if tool is None:
+            return False
+        try:
+            return tool.is_read_only(**arguments)
+        except Exception:
+            return False
+
+    def clear_memo(self) -> None:
+        """清空只读调用的结果缓存（每次运行开始时调用）"""
+        self._memo.clear()
+
+    def conflict_key(self, name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """获取一次工具调用的资源标识"""
+        tool = self.tools.get(name)
+        if tool is None:
+            return None
+        try:
+            key = tool.conflict_key(**arguments)
+        except Exception:
+            return name
+        return f"{name}:{key}" if key is not None else None
+
+    async def close(self) -> None:
+        """释放所有工具占用的资源"""
+        for tool in self.tools.values():
+            await tool.close()
     
     async def execute_tool(self, name: str, **kwargs) -> ToolResult:
-        """执行指定工具"""
+        """执行指定工具，只读调用优先使用缓存的结果
+
+        设置了截止时间（mini_agent.deadline）时，超过剩余时间的调用被取消（子进程随之终止）。
+        """
         if name not in self.tools:
             return ToolResult(success=False, error=f"工具 {name} 不存在")
         
-        tool = self.tools[name]
-        return await tool.execute(**kwargs)
\ No newline at end of file
+        left = deadline.remaining()
+        if left is None:
+            return await self._execute_tool(self.tools[name], name, kwargs)
+        if left <= 0:
+            return ToolResult(success=False, error="超出截止时间，未执行")
+        try:
+            return await asyncio.wait_for(self._execute_tool(self.tools[name], name, kwargs), left)
+        except asyncio.TimeoutError:
+            return ToolResult(success=False, error=f"超出截止时间，已取消（{left:.1f}秒）")
+    
+    async def _execute_tool(self, tool: BaseTool, name: str, kwargs: Dict[str, Any]) -> ToolResult:
+        if not self.memo_size:
+            return await self._execute(tool, kwargs)
+        try:
+            read_only = tool.is_read_only(**kwargs)
+            if read_only:
+                key = (name, json.dumps(kwargs, sort_keys=True, ensure_ascii=False, separators=(",", ":")))
+                # 在执行之前取指纹，执行期间文件被修改时下次调用不会命中
+                current = fingerprint(tool.dependencies(**kwargs))
+        except Exception:
+            return await self._execute(tool, kwargs)  # 无法确定依赖，不缓存
+        
+        if not read_only:
+            result = await self._execute(tool, kwargs)
+            self._memo.clear()
+            return result
+        
+        cached = self._memo.get(key)
+        if cached is not None and cached[0] == current:
+            self._memo.move_to_end(key)
+            self.memo_hits += 1
+            return cached[1].model_copy(update={"cached": True})
+        self.memo_misses += 1
+        result = await self._execute(tool, kwargs)
+        if result.success:
+            self._memo[key] = (current, result)
+            self._memo.move_to_end(key)
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result
+    
+    async def _execute(self, tool: BaseTool, kwargs: Dict[str, Any]) -> ToolResult:
+        if self.semaphore is None:
+            return await tool.execute(**kwargs)
+        async with self.semaphore:
+            return await tool.execute(**kwargs)
\ No newline at end of file
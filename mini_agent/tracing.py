@@ -0,0 +1,289 @@
+"""
+执行过程的计时与追踪
+
+代理的每一步、每次LLM调用和每次工具执行都记录为一个 Span，按父子关系组成一棵树，
+结束时交给导出器（内存、JSONL、OpenTelemetry 的 OTLP/JSON 格式）。
+
+默认的 NoopTracer 不记录任何内容，开销只有一次方法调用：
+
+    from mini_agent.tracing import InMemoryExporter, Tracer, set_tracer
+    exporter = InMemoryExporter()
+    set_tracer(Tracer([exporter]))   # 在创建 SimpleLLM / MiniAgent 之前设置
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+from mini_agent import fastjson
+
+
+class Span:
+    """一段计时的操作"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_ns", "end_ns", "status", "error", "_start_counter",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        # 墙上时间用于对齐，耗时用单调时钟计算
+        self._start_counter = time.perf_counter_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else self.start_ns + self._elapsed_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = self.start_ns + self._elapsed_ns()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def _elapsed_ns(self) -> int:
+        return time.perf_counter_ns() - self._start_counter
+
+
+class _NoopSpan:
+    """关闭追踪时使用的空 Span"""
+
+    __slots__ = ()
+    duration_ms = 0.0
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("mini_agent_span", default=None)
+
+
+def current_span() -> Any:
+    """当前正在进行的 Span，没有时返回空 Span"""
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+
+class SpanExporter:
+    """导出器基类"""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """保存在内存中，便于测试和交互分析"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class JSONLExporter(SpanExporter):
+    """每个 Span 写成一行JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: IO[bytes] = open(path, "ab")
+
+    def export(self, span: Span) -> None:
+        self._file.write(fastjson.dumps(span.to_dict()) + b"\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class OTLPJSONExporter(SpanExporter):
+    """按 OTLP/JSON 格式写文件（每行一个 ExportTraceServiceRequest）
+
+    与 OpenTelemetry Collector 的 otlpjsonfile 接收器兼容，可转发到 Jaeger、Tempo 等后端。
+    """
+
+    def __init__(self, path: str, service_name: str = "mini-agent", batch_size: int = 64):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._pending: List[Span] = []
+        self._file: IO[bytes] = open(path, "ab")
+
+    def export(self, span: Span) -> None:
+        self._pending.append(span)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "mini_agent"},
+                    "spans": [self._encode(span) for span in self._pending],
+                }],
+            }]
+        }
+        self._pending = []
+        self._file.write(fastjson.dumps(request) + b"\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+    @staticmethod
+    def _encode(span: Span) -> Dict[str, Any]:
+        encoded: Dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": typed})
+    return encoded
+
+
+class Tracer:
+    """记录 Span 并交给导出器
+
+    span() 作为上下文管理器使用，嵌套的 Span 自动成为子 Span（基于 contextvars，
+    asyncio 任务会继承创建时的父 Span）。
+    """
+
+    enabled = True
+
+    def __init__(self, exporters: Optional[List[SpanExporter]] = None):
+        self.exporters = list(exporters or [])
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """开始一个 Span，但不把它设为当前 Span（用于跨越多次迭代的操作）"""
+        parent = _current_span.get()
+        if parent is None:
+            return Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def end_span(self, span: Any) -> None:
+        if not isinstance(span, Span):
+            return
+        span.finish()
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class NoopTracer(Tracer):
+    """不记录任何内容的追踪器（默认）"""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    def start_span(self, name: str, **attributes: Any) -> Any:
+        return NOOP_SPAN
+
+    def end_span(self, span: Any) -> None:
+        pass
+
+    def span(self, name: str, **attributes: Any) -> Any:  # type: ignore[override]
+        return NOOP_SPAN
+
+
+_tracer: Tracer = NoopTracer()
+
+
+def get_tracer() -> Tracer:
+    """全局默认追踪器"""
+    return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """设置全局默认追踪器，None 表示关闭追踪"""
+    global _tracer
+    _tracer = tracer if tracer is not None else NoopTracer()
@@ -0,0 +1,119 @@
+"""
+工具参数校验
+
+把工具的 JSON Schema（parameters）在注册时编译为校验函数，调用前快速检查模型给出的
+参数，出错时返回可以直接反馈给模型的精确错误信息。只支持工具定义中常用的关键字：
+type、enum、properties、required、additionalProperties、items、minimum、maximum，
+其余关键字（description 等）忽略。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 校验函数：通过时返回None，否则返回错误信息
+Validator = Callable[[Any], Optional[str]]
+
+# JSON类型 -> Python类型；bool 是 int 的子类，integer/number 需要单独排除
+_PYTHON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+_JSON_TYPE_NAMES = {
+    str: "string", bool: "boolean", int: "integer", float: "number", dict: "object", list: "array", type(None): "null",
+}
+
+
+def json_type_name(value: Any) -> str:
+    return _JSON_TYPE_NAMES.get(type(value), type(value).__name__)
+
+
+# 只含这些关键字的属性在对象校验中内联检查，不再调用子校验函数
+_SIMPLE_KEYWORDS = {"type", "enum", "description", "title", "default"}
+
+
+def _type_spec(schema: Dict[str, Any]) -> Tuple[Tuple[type, ...], bool, List[str]]:
+    """(Python类型, 是否排除bool, JSON类型名)"""
+    types = schema.get("type")
+    names = [] if types is None else [types] if isinstance(types, str) else list(types)
+    names = [name for name in names if name in _PYTHON_TYPES]
+    python_types = tuple(t for name in names for t in _PYTHON_TYPES[name])
+    # 允许 integer/number 但不允许 boolean 时要排除 bool
+    reject_bool = bool(names) and "boolean" not in names and int in python_types
+    return python_types, reject_bool, names
+
+
+def compile_schema(schema: Dict[str, Any], label: str = "参数") -> Validator:
+    """把 JSON Schema 编译为校验函数，label 是错误信息中的字段名
+
+    每个 schema 编译为一个闭包，各项检查需要的数据都预先算好，校验时不再解释 schema。
+    """
+    python_types, reject_bool, names = _type_spec(schema)
+    expected = " 或 ".join(names)
+
+    enum: Optional[List[Any]] = list(schema["enum"]) if "enum" in schema else None
+    enum_text = ", ".join(str(item) for item in enum) if enum is not None else ""
+    minimum = schema.get("minimum")
+    maximum = schema.get("maximum")
+    check_range = minimum is not None or maximum is not None
+
+    properties: Dict[str, Any] = schema.get("properties") or {}
+    required: Tuple[str, ...] = tuple(schema.get("required") or ())
+    closed = schema.get("additionalProperties") is False
+    property_checks = {
+        name: compile_schema(subschema, f"参数 {name}" if label == "参数" else f"{label}.{name}")
+        for name, subschema in properties.items()
+    }
+    check_object = bool(properties or required or closed)
+    # 简单属性: 名称 -> (Python类型, 是否排除bool, 允许的取值)
+    simple: Dict[str, Tuple[Tuple[type, ...], bool, Optional[List[Any]]]] = {}
+    for name, subschema in properties.items():
+        if set(subschema) <= _SIMPLE_KEYWORDS:
+            sub_types, sub_reject_bool, _ = _type_spec(subschema)
+            simple[name] = (sub_types or (object,), sub_reject_bool, subschema.get("enum"))
+    item_check = compile_schema(schema["items"], f"{label}[]") if isinstance(schema.get("items"), dict) else None
+
+    def validate(value: Any) -> Optional[str]:
+        if python_types and (not isinstance(value, python_types) or (reject_bool and isinstance(value, bool))):
+            return f"{label} 的类型应为 {expected}，实际为 {json_type_name(value)}"
+        if enum is not None and value not in enum:
+            return f"{label} 的取值应为 {enum_text} 之一，实际为 {value!r}"
+        if check_range and isinstance(value, (int, float)) and not isinstance(value, bool):
+            if minimum is not None and value < minimum:
+                return f"{label} 不能小于 {minimum}，实际为 {value}"
+            if maximum is not None and value > maximum:
+                return f"{label} 不能大于 {maximum}，实际为 {value}"
+        if check_object and isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    owner = "" if label == "参数" else f"{label} "
+                    return f"{owner}缺少必需参数: {', '.join(n for n in required if n not in value)}"
+            for name, item in value.items():
+                spec = simple.get(name)
+                if spec is not None:
+                    # 内联检查，只有失败时才调用子校验函数生成错误信息
+                    if (
+                        isinstance(item, spec[0])
+                        and not (spec[1] and isinstance(item, bool))
+                        and (spec[2] is None or item in spec[2])
+                    ):
+                        continue
+                    return property_checks[name](item)
+                property_check = property_checks.get(name)
+                if property_check is not None:
+                    error = property_check(item)
+                    if error is not None:
+                        return error
+                elif closed:
+                    return f"未知参数: {name}（可用参数: {', '.join(properties)}）"
+        if item_check is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                error = item_check(item)
+                if error is not None:
+                    return error.replace(f"{label}[]", f"{label}[{index}]", 1)
+        return None
+
+    return validate
@@ -0,0 +1,376 @@
+"""
+多进程任务执行：监督进程启动 N 个工作进程，从本地持久化队列领取任务
+
+    python -m mini_agent.workers tasks.jsonl --queue tasks.db -o results.jsonl --workers 4 --concurrency 8
+
+单个进程中代理的编排、工具结果处理和 JSON 解析都占用同一个 GIL，任务再多也只能用到
+一个核心。这里每个工作进程运行自己的事件循环，同时执行 concurrency 个 MiniAgent 任务，
+吞吐量随进程数（核心数）增长。
+
+- 队列（mini_agent.taskqueue）保存在 SQLite 文件中，中断后用同样的命令继续，已完成的任务不会重复执行
+- 工作进程领取任务时获得租约并定期续约；进程崩溃时监督进程立即放回它的任务并启动替代进程，
+  进程卡住不再续约时租约过期，任务由其他进程接手
+- 每个任务最多尝试 max_attempts 次，总是让工作进程崩溃的任务标记为失败
+- 结果和统计（按状态、按工作进程）汇总在队列中，结束时写入结果文件
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from mini_agent.batch import BatchRunner, BatchTask, read_tasks
+from mini_agent.events import EventBus, EventType, get_event_bus
+from mini_agent.taskqueue import QueueStats, TaskQueue
+
+# 在工作进程中创建LLM的函数，必须可以被 pickle（模块级函数、类或它们的 functools.partial）
+LLMFactory = Callable[[], Any]
+
+T = TypeVar("T")
+
+
+class Worker:
+    """在一个事件循环中并发执行队列中的任务
+
+    队列操作（SQLite，可能要等待其他进程的写锁）在单独的线程中依次执行，不阻塞事件循环，
+    等锁时心跳和进行中的任务照常运行。等锁超时（sqlite3.OperationalError）时本轮领取或
+    续约跳过，结果提交则重试。
+
+    Args:
+        queue: 任务队列
+        llm: 所有任务共享的LLM
+        worker_id: 工作进程的唯一标识，记录在租约和结果中
+        concurrency: 同时执行的任务数
+        max_tool_concurrency: 工具并发上限
+        agent_kwargs: 传给 MiniAgent 的参数
+        poll_interval: 队列为空时的轮询间隔（秒）
+        heartbeat_interval: 续约间隔（秒），默认为租约期限的三分之一
+    """
+
+    def __init__(
+        self,
+        queue: TaskQueue,
+        llm: Any,
+        worker_id: str,
+        concurrency: int = 8,
+        max_tool_concurrency: int = 16,
+        agent_kwargs: Optional[Dict[str, Any]] = None,
+        poll_interval: float = 0.2,
+        heartbeat_interval: Optional[float] = None,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.max_tool_concurrency = max_tool_concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else queue.lease_seconds / 3
+        self.runner = BatchRunner(llm, concurrency, max_tool_concurrency, agent_kwargs)
+        self.completed = 0
+        self.lost = 0  # 失去租约而放弃的任务数
+        self._running: Dict[str, "asyncio.Task[None]"] = {}
+        self._stopping = False
+        # 单线程：同一个连接上的操作依次执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mini-agent-queue")
+
+    def stop(self) -> None:
+        """不再领取新任务，取消进行中的任务并放回队列"""
+        self._stopping = True
+        for running in self._running.values():
+            running.cancel()
+
+    async def run(self) -> int:
+        """执行任务直到队列中没有排队和执行中的任务（或被 stop()），返回完成的任务数"""
+        tool_semaphore = asyncio.Semaphore(self.max_tool_concurrency)
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            while not self._stopping:
+                free = self.concurrency - len(self._running)
+                leased = await self._try(self.queue.lease, self.worker_id, free) if free > 0 else []
+                for task in leased or []:
+                    self._running[task.id] = asyncio.ensure_future(self._run_task(task, tool_semaphore))
+                if leased:
+                    continue
+                if not self._running:
+                    # 其他进程持有的任务也可能因租约过期回到队列，全部结束才退出
+                    if await self._try(self.queue.pending) == 0:
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                else:
+                    await asyncio.wait(
+                        list(self._running.values()), timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+                    )
+        finally:
+            heartbeat.cancel()
+            for running in self._running.values():
+                running.cancel()
+            await asyncio.gather(heartbeat, *self._running.values(), return_exceptions=True)
+            await self._try(self.queue.release, self.worker_id)  # 失败时等租约过期
+            self._executor.shutdown(wait=False)
+        return self.completed
+
+    async def _call(self, method: Callable[..., T], *args: Any) -> T:
+        """在队列线程中执行队列操作"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def _try(self, method: Callable[..., T], *args: Any) -> Optional[T]:
+        """执行队列操作，等锁超时时返回 None"""
+        try:
+            return await self._call(method, *args)
+        except sqlite3.OperationalError:
+            return None
+
+    async def _run_task(self, task: BatchTask, tool_semaphore: asyncio.Semaphore) -> None:
+        try:
+            result = await self.runner.run_task(task, tool_semaphore)
+            while True:
+                try:
+                    if await self._call(self.queue.complete, self.worker_id, result):
+                        self.completed += 1
+                    break
+                except sqlite3.OperationalError:
+                    await asyncio.sleep(self.poll_interval)  # 等锁超时，结果不能丢，重试到成功或失去租约
+        finally:
+            self._running.pop(task.id, None)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            # 等锁超时时本轮跳过，下一轮仍在租约期限之内
+            lost = await self._try(self.queue.heartbeat, self.worker_id, list(self._running))
+            # 租约已被其他进程接手（例如本进程曾长时间卡住）的任务不再继续执行
+            for task_id in lost or []:
+                running = self._running.get(task_id)
+                if running is not None:
+                    running.cancel()
+                    self.lost += 1
+
+
+def run_worker(
+    worker_id: str,
+    queue_path: str,
+    llm_factory: LLMFactory,
+    queue_options: Dict[str, Any],
+    worker_options: Dict[str, Any],
+) -> None:
+    """工作进程入口：SIGTERM/SIGINT 时放回进行中的任务后退出"""
+    from mini_agent.events import NullSink, set_event_bus
+
+    # 多个进程的运行过程交错输出没有意义，结果和统计都在队列中
+    set_event_bus(EventBus([NullSink()]))
+    queue = TaskQueue(queue_path, **queue_options)
+    worker = Worker(queue, llm_factory(), worker_id, **worker_options)
+
+    async def main() -> None:
+        loop = asyncio.get_running_loop()
+        if os.name == "posix":
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(signum, worker.stop)
+        await worker.run()
+
+    try:
+        asyncio.run(main())
+    finally:
+        queue.close()
+
+
+class Supervisor:
+    """启动并看护一组工作进程，直到队列中的任务全部结束
+
+    每个队列同时只应有一个监督进程：启动时上次运行遗留的租约会被直接放回队列。
+
+    Args:
+        queue_path: 任务队列（SQLite文件）
+        llm_factory: 在每个工作进程中创建LLM的函数，必须可以被 pickle
+        workers: 工作进程数，默认为CPU核心数
+        concurrency: 每个工作进程同时执行的任务数
+        max_tool_concurrency: 每个工作进程的工具并发上限
+        agent_kwargs: 传给 MiniAgent 的参数
+        lease_seconds: 任务租约期限
+        max_attempts: 每个任务最多尝试的次数
+        max_restarts: 最多重启崩溃的工作进程的次数，默认为工作进程数的两倍
+        poll_interval: 检查工作进程状态的间隔（秒）
+        start_method: multiprocessing 的启动方式，默认 spawn（不继承父进程的事件循环和连接）
+        events: 事件总线，记录工作进程的崩溃和重启
+    """
+
+    def __init__(
+        self,
+        queue_path: str,
+        llm_factory: LLMFactory,
+        workers: Optional[int] = None,
+        concurrency: int = 8,
+        max_tool_concurrency: int = 16,
+        agent_kwargs: Optional[Dict[str, Any]] = None,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        max_restarts: Optional[int] = None,
+        poll_interval: float = 0.5,
+        start_method: str = "spawn",
+        events: Optional[EventBus] = None,
+    ):
+        self.queue_path = queue_path
+        self.llm_factory = llm_factory
+        self.workers = workers or os.cpu_count() or 1
+        self.max_restarts = max_restarts if max_restarts is not None else self.workers * 2
+        self.poll_interval = poll_interval
+        self.events = events if events is not None else get_event_bus()
+        self.queue = TaskQueue(queue_path, lease_seconds, max_attempts)
+        self.restarts = 0
+        self._context = multiprocessing.get_context(start_method)
+        self._queue_options = {"lease_seconds": lease_seconds, "max_attempts": max_attempts}
+        self._worker_options = {
+            "concurrency": concurrency,
+            "max_tool_concurrency": max_tool_concurrency,
+            "agent_kwargs": agent_kwargs or {},
+        }
+        self._spawned = 0
+
+    def run(self) -> QueueStats:
+        """执行队列中的全部任务，返回本次运行的统计"""
+        start, started_at = time.monotonic(), time.time()
+        self.queue.release()
+        processes: Dict[str, Any] = {}
+        try:
+            for _ in range(self.workers):
+                self._spawn(processes)
+            while processes:
+                time.sleep(self.poll_interval)
+                self._reap(processes)
+        finally:
+            for process in processes.values():
+                process.terminate()
+            for process in processes.values():
+                process.join()
+            self.queue.release()
+
+        stats = self.queue.stats(since=started_at)
+        stats.elapsed = time.monotonic() - start
+        self.queue.close()
+        return stats
+
+    def _spawn(self, processes: Dict[str, Any]) -> None:
+        worker_id = f"{os.getpid()}-{self._spawned}"
+        self._spawned += 1
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_id, self.queue_path, self.llm_factory, self._queue_options, self._worker_options),
+            name=f"mini-agent-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        processes[worker_id] = process
+
+    def _reap(self, processes: Dict[str, Any]) -> None:
+        """回收退出的工作进程；崩溃的进程的任务立即放回队列，并按需启动替代进程"""
+        for worker_id, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del processes[worker_id]
+            if process.exitcode == 0:
+                continue
+            requeued = self.queue.release(worker_id)
+            message = f"工作进程 {worker_id} 异常退出 (exitcode={process.exitcode})，放回 {requeued} 个任务"
+            if self.queue.pending() and self.restarts < self.max_restarts:
+                self.restarts += 1
+                self._spawn(processes)
+                message += "，已启动替代进程"
+            self.events.emit(EventType.WARNING, "supervisor", message=message)
+
+
+def openai_llm(
+    model: str,
+    base_url: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    max_concurrent: Optional[int] = None,
+) -> Any:
+    """在工作进程中创建 SimpleLLM，API key 从环境变量读取，不经过进程间传递"""
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.ratelimit import RateLimiter
+
+    return SimpleLLM(
+        api_key=os.environ["OPENAI_API_KEY"],
+        model=model,
+        base_url=base_url,
+        rate_limiter=RateLimiter(
+            requests_per_minute=requests_per_minute,
+            max_concurrent=max_concurrent,
+            tokens_per_minute=tokens_per_minute,
+        ),
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="多进程执行 MiniAgent 任务")
+    parser.add_argument("tasks", nargs="?", help="任务文件 (JSONL)，加入队列后执行；省略时只执行队列中已有的任务")
+    parser.add_argument("--queue", required=True, help="任务队列 (SQLite文件)，中断后用同样的命令继续")
+    parser.add_argument("-o", "--output", default=None, help="结束时把全部结果写入该文件 (JSONL)")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核心数")
+    parser.add_argument("--concurrency", type=int, default=8, help="每个工作进程同时执行的任务数")
+    parser.add_argument("--tool-concurrency", type=int, default=16, help="每个工作进程的工具并发上限")
+    parser.add_argument("--rpm", type=float, default=None, help="每分钟最多的LLM请求数（所有进程合计）")
+    parser.add_argument("--tpm", type=float, default=None, help="每分钟最多的LLM token数（所有进程合计）")
+    parser.add_argument("--max-llm-concurrency", type=int, default=None, help="每个工作进程同时进行的LLM请求上限")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+    parser.add_argument("--max-steps", type=int, default=10)
+    parser.add_argument("--task-timeout", type=float, default=None, help="每个任务的截止时间（秒），任务文件中的 timeout 优先")
+    parser.add_argument("--step-timeout", type=float, default=None, help="每一步的截止时间（秒）")
+    parser.add_argument("--lease", type=float, default=60.0, help="任务租约期限（秒）")
+    parser.add_argument("--max-attempts", type=int, default=3, help="每个任务最多尝试的次数")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    args = parse_args(argv)
+    if not os.getenv("OPENAI_API_KEY"):
+        print("❌ 请设置环境变量 OPENAI_API_KEY")
+        return 1
+
+    workers = args.workers or os.cpu_count() or 1
+    if args.tasks:
+        added = TaskQueue(args.queue).put(read_tasks(args.tasks))
+        print(f"📥 加入 {added} 个新任务")
+
+    supervisor = Supervisor(
+        args.queue,
+        # 限流按进程平分，合计不超过设定值
+        partial(
+            openai_llm, args.model, args.base_url,
+            requests_per_minute=args.rpm / workers if args.rpm else None,
+            tokens_per_minute=args.tpm / workers if args.tpm else None,
+            max_concurrent=args.max_llm_concurrency,
+        ),
+        workers=workers,
+        concurrency=args.concurrency,
+        max_tool_concurrency=args.tool_concurrency,
+        agent_kwargs={"max_steps": args.max_steps, "run_timeout": args.task_timeout, "step_timeout": args.step_timeout},
+        lease_seconds=args.lease,
+        max_attempts=args.max_attempts,
+    )
+    stats = supervisor.run()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            for result in TaskQueue(args.queue).results():
+                output.write(result.model_dump_json() + "\n")
+    per_worker = "，".join(f"{worker}: {count}" for worker, count in sorted(stats.by_worker.items()))
+    print(
+        f"\n📊 完成 {stats.done}，失败 {stats.failed}，未完成 {stats.pending}，重试 {stats.retried}，"
+        f"重启工作进程 {supervisor.restarts} 次，本次耗时 {stats.elapsed:.1f}s（{stats.tasks_per_hour:.0f} 任务/小时）"
+    )
+    if per_worker:
+        print(f"   各工作进程: {per_worker}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,7 @@ async def test_tools():
     python_tool = PythonExecutor()
     result = await python_tool.execute(code="print('Hello from Python tool!')")
     print(f"Python工具测试: {result}")
+    await python_tool.close()
     
     # 测试文件编辑工具
     file_tool = FileEditor()
@@ -29,6 +30,167 @@ async def test_tools():
     print(f"Bash工具测试: {result}")
 
 
+async def test_file_editor():
+    """测试文件工具的分段读取、搜索、追加和输出上限"""
+    print("\n=== 测试文件工具 ===")
+    import os
+    import tempfile
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "app.log")
+    tool = FileEditor(max_output=2000)
+    lines = "".join(f"{i} {'ERROR 超时' if i % 1000 == 0 else 'ok'}\n" for i in range(1, 5001))
+    assert (await tool.execute(action="write", path=path, content=lines)).success
+    assert (await tool.execute(action="append", path=path, content="5001 结束")).success
+
+    result = await tool.execute(action="read", path=path)
+    print(f"整体读取: {len(result.output)} 字符")
+    assert result.success and "已截断" in result.output and len(result.output.encode()) < 2300
+    result = await tool.execute(action="read", path=path, start_line=2999, max_lines=3)
+    assert result.output == "2999 ok\n3000 ERROR 超时\n3001 ok\n"
+    result = await tool.execute(action="read", path=path, byte_offset=2, byte_length=3)
+    assert result.output == "ok\n"
+    assert (await tool.execute(action="head", path=path, lines=2)).output == "1 ok\n2 ok\n"
+    assert (await tool.execute(action="tail", path=path, lines=2)).output == "5000 ERROR 超时\n5001 结束"
+
+    result = await tool.execute(action="grep", path=path, pattern="error", ignore_case=True, context=1)
+    print(f"搜索结果:\n{result.output[:60]}...")
+    assert result.output.startswith("999-999 ok\n1000:1000 ERROR 超时\n1001-1001 ok\n--\n")
+    assert result.output.count(":") == 5
+    assert (await tool.execute(action="grep", path=path, pattern="不存在")).output == "没有匹配的行"
+
+    for i in range(5):
+        open(os.path.join(workdir, f"f{i}.txt"), "w").close()
+    first = await tool.execute(action="list", path=workdir, limit=4)
+    rest = await tool.execute(action="list", path=workdir, offset=4, limit=4)
+    assert "offset=4" in first.output and "offset" not in rest.output
+    names = first.output.splitlines()[:4] + rest.output.splitlines()
+    assert sorted(names) == sorted(os.listdir(workdir))
+
+    # 写入不修改进程的 umask；已存在的文件保留原来的权限，新文件按 umask 创建
+    import stat
+    mask = os.umask(0o027)
+    try:
+        os.chmod(path, 0o640)
+        assert (await tool.execute(action="write", path=path, content="x")).success
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+        new_path = os.path.join(workdir, "new.txt")
+        assert (await tool.execute(action="write", path=new_path, content="x")).success
+        assert stat.S_IMODE(os.stat(new_path).st_mode) == 0o640
+        assert os.umask(0o027) == 0o027
+    finally:
+        os.umask(mask)
+    assert not any(name.endswith((".tmp", ".mode")) for name in os.listdir(workdir))
+
+    # 写入符号链接时写入它指向的文件，链接保留
+    link = os.path.join(workdir, "link.txt")
+    os.symlink(new_path, link)
+    assert (await FileEditor().execute(action="write", path=link, content="经由链接")).success
+    assert os.path.islink(link)
+    with open(new_path, encoding="utf-8") as f:
+        assert f.read() == "经由链接"
+
+
+async def test_bash_executor():
+    """测试命令行工具的并发、超时和输出上限"""
+    print("\n=== 测试命令行工具 ===")
+    import time
+
+    bash_tool = BashExecutor()
+
+    # 多个命令并发执行，总耗时接近单个命令
+    start = time.monotonic()
+    results = await asyncio.gather(*[
+        bash_tool.execute(command="sleep 0.3 && echo done") for _ in range(4)
+    ])
+    elapsed = time.monotonic() - start
+    print(f"并发执行4个命令耗时: {elapsed:.2f}s")
+    assert all(r.success and r.output.strip() == "done" for r in results)
+    assert elapsed < 1.0
+
+    # 超时后整个进程组被终止
+    result = await bash_tool.execute(command="sleep 5 & sleep 5", timeout=0.3)
+    print(f"超时测试: {result.error}")
+    assert not result.success and "超时" in result.error
+
+    # 流式输出与输出上限
+    chunks = []
+    capped_tool = BashExecutor(max_output=100, on_output=lambda name, text: chunks.append(text))
+    result = await capped_tool.execute(command="yes x | head -c 10000")
+    print(f"输出上限测试: 保留 {len(result.output)} 字符, 回调 {len(chunks)} 次")
+    assert result.success and "已截断" in result.output
+    assert sum(len(c) for c in chunks) == 10000
+
+
+async def test_python_sandbox():
+    """测试常驻工作进程中的Python执行"""
+    print("\n=== 测试Python沙箱 ===")
+    import time
+
+    tool_a = PythonExecutor(timeout=1.0)
+    tool_b = PythonExecutor()
+    try:
+        # 命名空间在多次调用之间保留，且会话之间相互隔离
+        await tool_a.execute(code="import json\ncounter = 41")
+        result = await tool_a.execute(code="counter += 1\nprint(json.dumps({'counter': counter}))")
+        print(f"会话状态保留: {result.output.strip()}")
+        assert result.success and result.output.strip() == '{"counter": 42}'
+        result = await tool_b.execute(code="print(counter)")
+        assert not result.success and "NameError" in result.error
+
+        # 计算密集的代码不阻塞事件循环
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.ensure_future(ticker())
+        start = time.monotonic()
+        result = await tool_b.execute(code="print(sum(i * i for i in range(3_000_000)))")
+        elapsed = time.monotonic() - start
+        ticker_task.cancel()
+        print(f"计算耗时 {elapsed:.2f}s, 期间事件循环计时 {ticks} 次")
+        assert result.success and ticks >= elapsed / 0.01 * 0.5
+
+        # 超时后工作进程被重启，会话状态被重置
+        result = await tool_a.execute(code="while True: pass")
+        print(f"超时测试: {result.error}")
+        assert not result.success and "超时" in result.error
+        result = await tool_a.execute(code="print('counter' in globals())")
+        assert result.output.strip() == "False"
+
+        # 内存上限默认关闭，可以按工具设置；超出时得到 MemoryError，会话继续可用
+        import os
+        assert tool_b.pool.memory_limit_mb is None
+        if os.name == "posix":
+            limited = PythonExecutor(memory_limit_mb=256)
+            try:
+                result = await limited.execute(code="kept = 1\nblock = bytearray(512 * 1024 * 1024)")
+                print(f"内存上限: {result.error}")
+                assert not result.success and "MemoryError" in result.error
+                assert (await limited.execute(code="print(kept)")).output.strip() == "1"
+            finally:
+                await limited.close()
+
+        # 进程池已满时，同一个新会话的并发调用只创建一个工作进程
+        from mini_agent.sandbox import PythonWorkerPool
+        pool = PythonWorkerPool(max_workers=1)
+        try:
+            await pool.execute("old", "pass")
+            results = await asyncio.gather(*(pool.execute("new", "import os\nprint(os.getpid())") for _ in range(2)))
+            pids = {result.stdout.strip() for result in results}
+            print(f"并发创建工作进程: {pids}")
+            assert len(pids) == 1 and list(pool._workers) == ["new"]
+        finally:
+            await pool.close()
+    finally:
+        await tool_a.close()
+        await tool_b.close()
+
+
 async def test_agent_without_llm():
     """测试代理功能（不依赖真实LLM）"""
     print("\n=== 测试代理结构 ===")
@@ -49,13 +211,1347 @@ async def test_agent_without_llm():
     print(f"初始状态: {agent.state}")
 
 
+async def test_parallel_tool_calls():
+    """测试同一轮多个工具调用的并发执行"""
+    print("\n=== 测试并发工具调用 ===")
+    import json
+    import os
+    import tempfile
+    import time
+    from mini_agent.schema import Message
+    from mini_agent.tools import BaseTool, ToolResult
+
+    class SleepTool(BaseTool):
+        name: str = "sleep"
+        description: str = "等待一段时间"
+        parameters: dict = {"type": "object", "properties": {"seconds": {"type": "number"}}}
+
+        def is_parallel_safe(self, **kwargs) -> bool:
+            return True
+
+        async def execute(self, seconds: float = 0.2, **kwargs) -> ToolResult:
+            await asyncio.sleep(seconds)
+            return ToolResult(success=True, output=f"slept {seconds}")
+
+    def call(call_id, name, **arguments):
+        return {"id": call_id, "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+    agent = MiniAgent(llm=None, name="ParallelAgent")
+    agent.tools.register_tool(SleepTool())
+    path = os.path.join(tempfile.mkdtemp(), "parallel.txt")
+    agent.memory.add_message(Message.assistant_message(content=None, tool_calls=[
+        call("a", "file_editor", action="write", path=path, content="并发写入"),
+        call("b", "sleep", seconds=0.3),
+        call("c", "sleep", seconds=0.1),
+        call("d", "file_editor", action="read", path=path),
+        call("e", "file_editor", action="list", path=os.path.dirname(path)),
+        call("f", "sleep", seconds=0.3),
+    ]))
+
+    start = time.monotonic()
+    await agent.act()
+    elapsed = time.monotonic() - start
+    tool_messages = agent.memory.messages[-6:]
+    print(f"6个工具调用耗时: {elapsed:.2f}s")
+    assert elapsed < 0.6
+    assert [m.tool_call_id for m in tool_messages] == ["a", "b", "c", "d", "e", "f"]
+    # 写入在之后的读取和列出目录之前完成
+    assert tool_messages[3].content == "并发写入" and tool_messages[4].content == "parallel.txt"
+
+
+async def test_llm_stream():
+    """测试流式响应（本地模拟服务器）"""
+    print("\n=== 测试流式响应 ===")
+    import json
+    import time
+    from benchmarks.stub_server import FakeOpenAIServer, completion, stream_chunks
+    from mini_agent.llm import SimpleLLM
+
+    tool_call = {"id": "call_1", "type": "function", "function": {
+        "name": "bash_execute", "arguments": json.dumps({"command": "echo streamed"})}}
+
+    def handler(request):
+        if not request.get("stream"):
+            return completion(content="非流式响应")
+        if request["messages"][-1]["role"] == "tool":
+            return stream_chunks(["任务", "完成"])
+        return stream_chunks(["先执行", "命令"], tool_calls=[tool_call])
+
+    async with FakeOpenAIServer(handler, chunk_delay=0.01) as server:
+        llm = SimpleLLM(api_key="test", model="stub-model", base_url=server.base_url)
+
+        start = time.monotonic()
+        stream = llm.chat_stream(messages=[{"role": "user", "content": "hi"}])
+        events = []
+        async for event in stream:
+            events.append((time.monotonic() - start, event))
+        response = await stream.get_response()
+        total = time.monotonic() - start
+        print(f"首个片段 {events[0][0]:.3f}s, 总耗时 {total:.3f}s, 事件数 {len(events)}")
+        assert events[0][1].type == "content" and events[0][0] < total
+        assert response.content == "先执行命令"
+        assert response.tool_calls == [tool_call]
+        ready = [e for _, e in events if e.type == "tool_call"]
+        assert len(ready) == 1 and ready[0].tool_call["function"]["name"] == "bash_execute"
+
+        agent = MiniAgent(llm=llm, name="StreamAgent", stream=True)
+        await agent.run("执行命令")
+        assert agent.memory.messages[2].content.strip() == "streamed"
+        assert agent.memory.messages[-1].content == "任务完成"
+
+
+async def test_memory_cache():
+    """测试记忆的增量序列化缓存"""
+    print("\n=== 测试记忆缓存 ===")
+    import json
+    from mini_agent.schema import Memory, Message
+
+    memory = Memory()
+    memory.add_message(Message.user_message("你好"))
+    memory.add_message(Message.assistant_message(content=None, tool_calls=[
+        {"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}]))
+    first = memory.get_messages()
+    memory.add_message(Message.tool_message(content="结果", tool_call_id="c1"))
+    second = memory.get_messages()
+    print(f"缓存消息数: {len(second)}, JSON字节数: {len(memory.get_messages_json())}")
+    assert first is second and len(second) == 3
+    assert second == [m.to_dict() for m in memory.messages]
+    assert json.loads(memory.get_messages_json()) == second
+
+    # 直接操作 messages 列表也能被检测到
+    memory.messages.append(Message.user_message("继续"))
+    assert memory.get_messages()[-1] == {"role": "user", "content": "继续"}
+    del memory.messages[1:]
+    assert json.loads(memory.get_messages_json()) == [{"role": "user", "content": "你好"}]
+
+
+async def test_message_store():
+    """测试紧凑的消息存储和 messages 兼容视图"""
+    print("\n=== 测试消息存储 ===")
+    from mini_agent.schema import Memory, Message, Role
+    from mini_agent.tokens import count_message_tokens
+
+    memory = Memory([Message.user_message("你好")])
+    call = {"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}
+    memory.add(Role.ASSISTANT, tool_calls=[call])
+    memory.add("tool", content="结果", tool_call_id="c1")
+    assert memory.get_messages()[1:] == [
+        {"role": "assistant", "tool_calls": [call]},
+        {"role": "tool", "content": "结果", "tool_call_id": "c1"},
+    ]
+    assert memory.get_messages()[2]["role"] is Role.TOOL.value
+
+    # messages 视图按需构造 Message
+    view = memory.messages
+    assert len(view) == 3 and view[1].role == Role.ASSISTANT and view[1].tool_calls == [call]
+    assert [m.role for m in view[1:]] == [Role.ASSISTANT, Role.TOOL]
+    view[0] = Message.user_message("重新开始")
+    view.insert(1, Message.user_message("补充"))
+    del view[2:]
+    print(f"视图: {[m.content for m in view]}, token总数: {memory.get_total_tokens()}")
+    assert [m.content for m in view] == ["重新开始", "补充"]
+    assert list(memory.get_token_counts()) == [count_message_tokens(m) for m in memory.get_messages()]
+    assert memory.get_total_tokens() == sum(memory.get_token_counts())
+
+    memory.messages = [Message.user_message("替换")]
+    assert memory.get_messages() == [{"role": "user", "content": "替换"}]
+
+    # 保留旧版 pydantic 模型的常用接口
+    dumped = memory.model_dump()
+    assert dumped == {"messages": [{"role": Role.USER, "content": "替换", "tool_calls": None, "tool_call_id": None}]}
+    assert Memory.model_validate(dumped) == memory == Memory(messages=[{"role": "user", "content": "替换"}])
+    assert Memory.model_validate(memory) == memory and Memory.model_validate(memory) is not memory
+    assert '"content":"替换"' in memory.model_dump_json()
+    copied = memory.model_copy(deep=True)
+    copied.add(Role.ASSISTANT, content="回答")
+    assert len(memory) == 1 and len(copied) == 2 and copied.get_total_tokens() > memory.get_total_tokens()
+
+
+async def test_context_manager():
+    """测试上下文窗口管理"""
+    print("\n=== 测试上下文窗口管理 ===")
+    from mini_agent.context import ContextManager, SlidingWindowPolicy, SummarizePolicy
+    from mini_agent.llm import LLMResponse
+    from mini_agent.schema import Memory, Message
+    from mini_agent.tokens import count_messages_tokens
+
+    memory = Memory()
+    memory.add_message(Message.user_message("分析日志"))
+    for i in range(40):
+        calls = [{"id": f"c{i}_{j}", "type": "function",
+                  "function": {"name": "bash_execute", "arguments": '{"command": "cat log"}'}} for j in range(2)]
+        memory.add_message(Message.assistant_message(content=f"第{i}步", tool_calls=calls))
+        for call in calls:
+            memory.add_message(Message.tool_message(content="日志内容 " * 200, tool_call_id=call["id"]))
+
+    def check(window, budget):
+        assert count_messages_tokens(window) <= budget
+        assert window[0] == {"role": "user", "content": "分析日志"}
+        seen_ids = set()
+        for message in window:
+            for call in message.get("tool_calls") or []:
+                seen_ids.add(call["id"])
+            if message["role"] == "tool":
+                assert message["tool_call_id"] in seen_ids, "tool 消息失去了对应的 assistant 消息"
+
+    manager = ContextManager(max_tokens=6000, reserve_tokens=1000)
+    window = await manager.build(memory)
+    print(f"完整历史 {memory.get_total_tokens()} tokens -> 窗口 {count_messages_tokens(window)} tokens, "
+          f"{len(window)} 条消息")
+    check(window, manager.budget)
+    assert window[-1] == memory.get_messages()[-1]
+
+    class CountingLLM:
+        calls = 0
+
+        async def chat(self, messages, system_prompt=None, tools=None):
+            CountingLLM.calls += 1
+            return LLMResponse(content="已读取日志多次")
+
+    summarizer = ContextManager(max_tokens=6000, reserve_tokens=1000, policies=[
+        SummarizePolicy(llm=CountingLLM(), keep_recent=2), SlidingWindowPolicy()])
+    window = await summarizer.build(memory)
+    check(window, summarizer.budget)
+    assert any("早期对话摘要" in (m.get("content") or "") for m in window)
+    await summarizer.build(memory)
+    assert CountingLLM.calls == 1, "摘要应被缓存"
+
+
+async def test_response_cache():
+    """测试LLM响应缓存"""
+    print("\n=== 测试响应缓存 ===")
+    import os
+    import tempfile
+    import time
+    from benchmarks.stub_server import FakeOpenAIServer, completion
+    from mini_agent.cache import ResponseCache
+    from mini_agent.llm import SimpleLLM
+
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite")
+    messages = [{"role": "user", "content": "1+1=?"}]
+
+    async with FakeOpenAIServer(lambda request: completion(content="2"), delay=0.2) as server:
+        cache = ResponseCache(path=path)
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, temperature=0, cache=cache)
+        first = await llm.chat(messages)
+        start = time.monotonic()
+        second = await llm.chat(messages)
+        replay = time.monotonic() - start
+        print(f"缓存重放耗时: {replay * 1000:.2f}ms, 统计: {cache.stats}")
+        assert second.model_copy(update={"usage": first.usage, "replayed": False}) == first
+        assert len(server.requests) == 1 and replay < 0.05
+        # 重放的响应不计入token用量
+        assert second.replayed and second.usage is None and llm.usage.calls == 1 and llm.usage.replayed == 1
+        cache.close()
+
+        # 新进程（新的缓存对象）从磁盘命中
+        disk_cache = ResponseCache(path=path)
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, temperature=0, cache=disk_cache)
+        assert (await llm.chat(messages)).content == "2"
+        assert disk_cache.stats.disk_hits == 1 and len(server.requests) == 1
+
+        # 非确定性请求默认绕过缓存
+        hot_llm = SimpleLLM(api_key="test", base_url=server.base_url, temperature=0.7, cache=disk_cache)
+        await hot_llm.chat(messages)
+        assert disk_cache.stats.bypassed == 1 and len(server.requests) == 2
+
+        # 代理的用量统计同样不计入重放的响应
+        from mini_agent.events import EventBus, NullSink
+        for _ in range(2):
+            agent = MiniAgent(llm, events=EventBus([NullSink()]))
+            await agent.run("1+1=?")
+            await agent.tools.close()
+        print(f"代理用量: {agent.usage}")
+        assert agent.usage.calls == 0 and agent.usage.replayed == 1 and len(server.requests) == 3
+        disk_cache.close()
+
+    expiring = ResponseCache(ttl=0.05)
+    expiring.put("k", {"content": "v"})
+    assert expiring.get("k") == {"content": "v"}
+    await asyncio.sleep(0.1)
+    assert expiring.get("k") is None
+
+
+async def test_batch_runner():
+    """测试批量任务的并发执行和断点续跑"""
+    print("\n=== 测试批量执行 ===")
+    import json
+    import os
+    import tempfile
+    import time
+    from mini_agent.batch import BatchRunner, BatchTask, read_completed_ids
+    from mini_agent.llm import LLMResponse
+
+    class EchoLLM:
+        """第一步调用命令行工具，第二步返回最终答案"""
+        active = 0
+        peak = 0
+
+        async def chat(self, messages, system_prompt=None, tools=None):
+            EchoLLM.active += 1
+            EchoLLM.peak = max(EchoLLM.peak, EchoLLM.active)
+            await asyncio.sleep(0.05)
+            EchoLLM.active -= 1
+            if messages[-1]["role"] == "tool":
+                return LLMResponse(content=f"答案: {messages[-1]['content'].strip()}")
+            task = messages[-1]["content"]
+            return LLMResponse(content=None, tool_calls=[{
+                "id": "call_1", "type": "function",
+                "function": {"name": "bash_execute", "arguments": json.dumps({"command": f"echo {task}"})}}])
+
+    output = os.path.join(tempfile.mkdtemp(), "results.jsonl")
+    tasks = [BatchTask(id=str(i), task=f"task{i}") for i in range(12)]
+    runner = BatchRunner(EchoLLM(), concurrency=6, agent_kwargs={"max_steps": 3})
+
+    start = time.monotonic()
+    stats = await runner.run(tasks[:8], output)
+    elapsed = time.monotonic() - start
+    print(f"8个任务耗时 {elapsed:.2f}s, 最大LLM并发 {EchoLLM.peak}, 统计: {stats}")
+    assert stats.completed == 8 and EchoLLM.peak > 1
+    with open(output, encoding="utf-8") as f:
+        results = [json.loads(line) for line in f]
+    assert all(r["result"] == f"答案: task{r['id']}" for r in results)
+
+    # 模拟中断时写了一半的行，续跑时跳过已完成的任务
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "8", "ta')
+    stats = await runner.run(tasks, output)
+    print(f"续跑统计: {stats}")
+    assert stats.skipped == 8 and stats.completed == 4
+    assert read_completed_ids(output) == {str(i) for i in range(12)}
+
+    # 失败的任务（例如限流）续跑时重新执行，--skip-failed 时跳过
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "12", "task": "task12", "state": "error", "error": "LLMRateLimitError: 429"}) + "\n")
+    retry = tasks + [BatchTask(id="12", task="task12")]
+    assert (await runner.run(retry, output, retry_failed=False)).skipped == 13
+    stats = await runner.run(retry, output)
+    print(f"重试失败任务: {stats}")
+    assert stats.skipped == 12 and stats.completed == 1
+    assert read_completed_ids(output) == {str(i) for i in range(13)}
+
+    # LLM返回无法处理的响应时代理以 error 停止，任务记为失败，续跑时重新执行
+    class MalformedLLM:
+        async def chat(self, messages, system_prompt=None, tools=None):
+            return {"content": "不是 LLMResponse"}
+
+    failing = os.path.join(tempfile.mkdtemp(), "results.jsonl")
+    stats = await BatchRunner(MalformedLLM()).run(tasks[:2], failing)
+    results = [json.loads(line) for line in open(failing, encoding="utf-8")]
+    print(f"无效响应: {stats}, {results[0]['error']}")
+    assert stats.failed == 2 and stats.completed == 0
+    assert all(r["stop_reason"] == "error" and "AttributeError" in r["error"] for r in results)
+    assert read_completed_ids(failing) == set()
+
+
+async def test_client_registry():
+    """测试共享客户端和连接复用"""
+    print("\n=== 测试客户端连接复用 ===")
+    from benchmarks.stub_server import FakeOpenAIServer, completion
+    from mini_agent.clients import ClientRegistry
+    from mini_agent.llm import SimpleLLM
+
+    registry = ClientRegistry(max_connections=4)
+    async with FakeOpenAIServer(lambda request: completion(content="pong")) as server:
+        llms = [SimpleLLM(api_key="test", base_url=server.base_url, registry=registry) for _ in range(20)]
+        assert len({id(llm.client) for llm in llms}) == 1
+        responses = await asyncio.gather(*(llm.chat([{"role": "user", "content": "ping"}]) for llm in llms))
+        print(f"20个实例共 {len(server.requests)} 次请求，建立 {server.connections} 个连接")
+        assert all(r.content == "pong" for r in responses)
+        assert server.connections <= 4
+        await registry.aclose()
+        assert len(registry) == 0
+
+
+async def test_llm_retry():
+    """测试LLM重试、错误类型和自适应限流"""
+    print("\n=== 测试LLM重试与限流 ===")
+    import time
+    from benchmarks.stub_server import FakeOpenAIServer, completion
+    from mini_agent.clients import ClientRegistry
+    from mini_agent.errors import LLMAPIError, LLMRateLimitError, LLMServerError
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.ratelimit import RateLimiter
+    from mini_agent.retry import RetryPolicy
+
+    messages = [{"role": "user", "content": "ping"}]
+    statuses = [429, 503]
+
+    def flaky(request):
+        if statuses:
+            status = statuses.pop(0)
+            return {"_status": status, "_headers": {"Retry-After": "0.1"}, "error": {"message": "busy"}}
+        return completion(content="pong")
+
+    registry = ClientRegistry()
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600000)
+    async with FakeOpenAIServer(flaky) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, registry=registry,
+                        rate_limiter=limiter, retry=RetryPolicy(base_delay=0.01))
+        response = await llm.chat(messages)
+        print(f"重试后成功: {response.content}，共 {len(server.requests)} 次请求")
+        assert response.content == "pong" and len(server.requests) == 3
+        # 收到 429 后降速，成功后逐步恢复
+        assert limiter.rate_limited == 1 and limiter._requests.rate < limiter._requests.max_rate
+
+    async with FakeOpenAIServer(lambda request: {"_status": 500, "error": {"message": "down"}}) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, registry=registry,
+                        retry=RetryPolicy(max_retries=2, base_delay=0.01))
+        try:
+            await llm.chat(messages)
+            assert False, "应抛出 LLMServerError"
+        except LLMServerError as e:
+            print(f"重试耗尽: {type(e).__name__}, 尝试 {e.attempts} 次")
+            assert e.status_code == 500 and e.attempts == 3 and len(server.requests) == 3
+
+    async with FakeOpenAIServer(lambda request: {"_status": 400, "error": {"message": "bad"}}) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, registry=registry)
+        try:
+            await llm.chat(messages)
+            assert False, "应抛出 LLMAPIError"
+        except LLMAPIError:
+            assert len(server.requests) == 1, "请求错误不应重试"
+    await registry.aclose()
+
+    # 多个并发请求同时收到 429 只降速一次，并一起暂停到 Retry-After 之后
+    shared = RateLimiter(requests_per_minute=600)
+    for _ in range(5):
+        shared.on_rate_limited(retry_after=0.2)
+    assert shared._requests.rate == 5.0
+    start = time.monotonic()
+    await shared.acquire()
+    assert time.monotonic() - start >= 0.15
+    assert isinstance(LLMRateLimitError("x"), Exception) and LLMRateLimitError.retryable
+
+
+async def test_tracing():
+    """测试执行过程追踪"""
+    print("\n=== 测试追踪 ===")
+    import json
+    import os
+    import tempfile
+    from benchmarks.stub_server import FakeOpenAIServer, completion
+    from mini_agent.clients import ClientRegistry
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.tracing import InMemoryExporter, JSONLExporter, OTLPJSONExporter, Tracer
+
+    def handler(request):
+        if request["messages"][-1]["role"] == "user":
+            return completion(tool_calls=[{"id": "call_1", "type": "function", "function": {
+                "name": "file_editor", "arguments": json.dumps({"action": "list", "path": "."})}}],
+                usage={"prompt_tokens": 120, "completion_tokens": 20, "total_tokens": 140})
+        return completion(content="完成")
+
+    directory = tempfile.mkdtemp()
+    memory = InMemoryExporter()
+    otlp = OTLPJSONExporter(os.path.join(directory, "trace.otlp.jsonl"))
+    tracer = Tracer([memory, JSONLExporter(os.path.join(directory, "trace.jsonl")), otlp])
+    registry = ClientRegistry()
+    async with FakeOpenAIServer(handler) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url, registry=registry, tracer=tracer)
+        agent = MiniAgent(llm, name="TracedAgent", tracer=tracer)
+        await agent.run("列出当前目录")
+    await registry.aclose()
+    tracer.close()
+
+    for span in memory.spans:
+        print(f"  {span.name:<16} {span.duration_ms:8.2f}ms {span.attributes}")
+    run = memory.find("agent.run")[0]
+    steps = memory.find("agent.step")
+    chats = memory.find("llm.chat")
+    tool = memory.find("tool.execute")[0]
+    assert len(steps) == 2 and len(chats) == 2
+    assert all(span.trace_id == run.trace_id for span in memory.spans)
+    assert all(step.parent_id == run.span_id for step in steps)
+    assert chats[0].attributes["prompt_tokens"] == 120 and chats[0].attributes["completion_tokens"] == 20
+    assert tool.attributes["tool"] == "file_editor" and tool.attributes["success"] is True
+    assert tool.parent_id == memory.find("agent.act")[0].span_id
+
+    with open(os.path.join(directory, "trace.jsonl"), encoding="utf-8") as f:
+        assert len(f.readlines()) == len(memory.spans)
+    with open(otlp.path, encoding="utf-8") as f:
+        exported = json.loads(f.readline())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(exported) == len(memory.spans) and exported[0]["traceId"] == run.trace_id
+
+
+async def test_event_bus():
+    """测试事件总线"""
+    print("\n=== 测试事件总线 ===")
+    import json
+    import os
+    import tempfile
+    import time
+    from mini_agent.events import EventBus, EventSink, EventType, JSONLSink
+    from mini_agent.llm import LLMResponse
+
+    class SlowSink(EventSink):
+        def __init__(self):
+            self.events = []
+
+        def handle(self, events):
+            time.sleep(0.05)  # 模拟很慢的终端
+            self.events.extend(events)
+
+    slow = SlowSink()
+    bus = EventBus([slow], max_queue=10, overflow="drop_oldest")
+    start = time.monotonic()
+    for i in range(200):
+        bus.emit(EventType.WARNING, "Agent", message=str(i))
+    elapsed = time.monotonic() - start
+    bus.flush()
+    messages = [e.data["message"] for e in slow.events if e.agent == "Agent"]
+    print(f"发出200个事件耗时 {elapsed * 1000:.2f}ms，写出 {len(messages)} 个，丢弃 {bus.dropped} 个")
+    assert elapsed < 0.05 and bus.dropped > 0 and messages[-1] == "199"
+    bus.close()
+
+    newest = SlowSink()
+    bus = EventBus([newest], max_queue=10, overflow="drop_newest")
+    for i in range(200):
+        bus.emit(EventType.WARNING, "Agent", message=str(i))
+    bus.close()
+    assert [e.data["message"] for e in newest.events if e.agent == "Agent"][0] == "0"
+
+    class MockLLM:
+        async def chat(self, messages, system_prompt=None, tools=None):
+            return LLMResponse(content="完成")
+
+    path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+    bus = EventBus([JSONLSink(path)])
+    await MiniAgent(MockLLM(), name="EventAgent", events=bus).run("测试")
+    bus.close()
+    with open(path, encoding="utf-8") as f:
+        types = [json.loads(line)["type"] for line in f]
+    assert types == ["run_started", "step_started", "llm_response", "run_finished"]
+
+
+async def test_benchmark_suite():
+    """测试离线基准测试套件"""
+    print("\n=== 测试基准测试套件 ===")
+    import json
+    import os
+    import tempfile
+    from benchmarks.fake_llm import ScriptedLLM
+    from benchmarks.suite import compare, run_scenario
+
+    path = os.path.join(tempfile.mkdtemp(), "trajectory.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"tool_calls": [{"name": "file_editor", "arguments": {"action": "list", "path": "."}}]}], f)
+    llm = ScriptedLLM.from_file(path, latency=0.01, jitter=0.5, seed=7)
+    first = await llm.chat([{"role": "user", "content": "任务"}])
+    assert first.tool_calls[0]["function"]["name"] == "file_editor"
+    history = [{"role": "user", "content": "任务"}, {"role": "assistant", "tool_calls": first.tool_calls},
+               {"role": "tool", "tool_call_id": first.tool_calls[0]["id"], "content": "..."}]
+    assert (await llm.chat(history)).content == llm.final_answer
+
+    metrics = await run_scenario("multi_tool")
+    print(f"multi_tool: {metrics['steps']} 步, {metrics['steps_per_sec']} 步/秒, 阶段 {metrics['phases']}")
+    assert metrics["steps"] == 41 and metrics["p99_step_ms"] >= metrics["p50_step_ms"] > 0
+    slower = dict(metrics, steps_per_sec=metrics["steps_per_sec"] / 3)
+    assert compare({"multi_tool": slower}, {"multi_tool": metrics}, 0.5)
+    assert not compare({"multi_tool": metrics}, {"multi_tool": metrics}, 0.5)
+
+
+async def test_session_log():
+    """测试会话日志的持久化和恢复"""
+    print("\n=== 测试会话日志 ===")
+    import os
+    import tempfile
+    from benchmarks.fake_llm import ScriptedLLM
+    from mini_agent.errors import LLMServerError
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.schema import AgentState
+    from mini_agent.session import SessionLog
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "session.log")
+    call = {"name": "file_editor", "arguments": {"action": "list", "path": workdir}}
+    turns = [{"content": "x" * 3000, "tool_calls": [call]}] * 3
+
+    class CrashingLLM(ScriptedLLM):
+        async def chat(self, messages, system_prompt=None, tools=None):
+            if self.calls == 2:
+                raise LLMServerError("模拟崩溃", status_code=500)
+            return await super().chat(messages, system_prompt, tools)
+
+    def make_agent(llm, session):
+        return MiniAgent(llm, max_steps=10, session=session, events=EventBus([NullSink()]))
+
+    session = SessionLog(path, sync="always", compress=True, index_interval=2)
+    agent = make_agent(CrashingLLM(turns), session)
+    try:
+        await agent.run("列出目录")
+        raise AssertionError("应当抛出 LLMServerError")
+    except LLMServerError:
+        pass
+    expected = list(agent.memory.get_messages())
+    session.close()
+    assert os.path.exists(path + ".idx")
+
+    # 模拟写到一半的尾部
+    with open(path, "ab") as f:
+        f.write(b"\x01\x00\xff\xff")
+
+    session = SessionLog(path, compress=True, index_interval=2)
+    resumed = make_agent(ScriptedLLM(turns), session)
+    print(f"恢复: 第 {resumed.current_step} 步, 状态 {resumed.state.value}, {len(resumed.memory)} 条消息")
+    assert resumed.state == AgentState.RUNNING and resumed.current_step == 2
+    assert resumed.memory.get_messages() == expected
+    assert resumed.memory.get_total_tokens() == agent.memory.get_total_tokens()
+    await resumed.resume()
+    assert resumed.state == AgentState.FINISHED and resumed.current_step == 4
+    await resumed.tools.close()
+    session.close()
+
+    # 记忆被删改后写入重置帧，恢复出的是删改后的内容
+    session = SessionLog(path)
+    memory = resumed.memory
+    session.restore(memory)
+    del memory.messages[1:]
+    await session.checkpoint(memory, 0, "idle")
+    session.close()
+    reopened = SessionLog(path)
+    assert reopened.snapshot.messages == [{"role": "user", "content": "列出目录"}]
+    reopened.close()
+
+    # 崩溃在重置帧和其后的检查点之间：恢复出重置之前已提交的消息，而不是空记忆
+    from mini_agent.schema import Memory, Message
+    from mini_agent.session import FRAME
+    path = os.path.join(workdir, "reset.log")
+    session = SessionLog(path)
+    memory = Memory()
+    for content in ("第一条", "第二条", "第三条"):
+        memory.add_message(Message.user_message(content))
+    await session.checkpoint(memory, 1, "running")
+    committed = list(memory.get_messages())
+    size = os.path.getsize(path)
+    del memory.messages[2:]
+    await session.checkpoint(memory, 2, "running")
+    session.close()
+    with open(path, "r+b") as f:
+        f.truncate(size + FRAME.size + 5)  # 重置帧之后写到一半的消息
+    reopened = SessionLog(path)
+    restored = Memory()
+    reopened.restore(restored)
+    print(f"重置中途崩溃: 恢复 {len(restored)} 条消息, 第 {reopened.snapshot.step} 步")
+    assert restored.get_messages() == committed and reopened.snapshot.step == 1
+    reopened.close()
+
+
+async def test_result_store():
+    """测试超大工具结果落盘和分页读取"""
+    print("\n=== 测试结果落盘 ===")
+    import tempfile
+    from benchmarks.fake_llm import ScriptedLLM
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.results import ResultStore
+
+    store = ResultStore(tempfile.mkdtemp(), threshold=1000, head_chars=100, tail_chars=50)
+    output = "".join(f"{i}\n" for i in range(1, 3001))
+    handle = store.put(output)
+    assert store.put(output) == handle and store.compact("短结果") == ("短结果", None)
+
+    turns = [
+        {"tool_calls": [{"name": "bash_execute", "arguments": {"command": "seq 1 3000"}}]},
+        {"tool_calls": [{"name": "read_result", "arguments": {"handle": handle, "pattern": "^2999$"}},
+                        {"name": "read_result", "arguments": {"handle": handle, "start_line": 10, "max_lines": 2}}]},
+    ]
+    agent = MiniAgent(ScriptedLLM(turns), events=EventBus([NullSink()]), result_store=store)
+    # 落盘在线程池中执行，不阻塞事件循环
+    import threading
+    threads = []
+    put = store.put
+    store.put = lambda content: threads.append(threading.get_ident()) or put(content)
+    await agent.run("统计")
+    del store.put
+    assert threads and threading.get_ident() not in threads
+    await agent.tools.close()
+    tool_outputs = [m["content"] for m in agent.memory.get_messages() if m["role"] == "tool"]
+    print(f"落盘 {store.spilled} 个结果, 记忆中的预览 {len(tool_outputs[0])} 字符, 节省 {store.saved_chars} 字符")
+    assert handle in tool_outputs[0] and len(tool_outputs[0]) < 400
+    assert await store.acompact("短结果") == ("短结果", None)
+    assert tool_outputs[0].startswith("1\n2\n") and tool_outputs[0].endswith("2999\n3000\n")
+    assert tool_outputs[1:] == ["2999:2999\n", "10\n11\n"]
+
+    reader = agent.tools.tools["read_result"]
+    assert not (await reader.execute(handle="result:ffffffffffffffff")).success
+
+    # 默认目录是进程私有的（0700），结果文件只有当前用户可读，关闭时删除
+    import os
+    import stat
+    import time
+    private = ResultStore(threshold=10)
+    path = private.path_for(private.put("x" * 100))
+    assert stat.S_IMODE(os.stat(private.directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) & 0o077 == 0
+    directory = private.directory
+    private.close()
+    assert not os.path.exists(directory)
+
+    # 已存在的目录收回其他用户的权限；超过大小上限时淘汰最早写入的结果
+    shared = tempfile.mkdtemp()
+    os.chmod(shared, 0o777)
+    capped = ResultStore(shared, max_bytes=2500)
+    handles = []
+    for i in range(4):
+        handles.append(capped.put(str(i) * 1000))
+        os.utime(capped.path_for(handles[-1]), (1000.0 + i, time.time() - 100 + i))  # 写入顺序不依赖时间戳精度
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o700
+    print(f"容量上限: 淘汰 {capped.evicted} 个结果")
+    assert capped.evicted == 2 and capped.path_for(handles[-1])
+    try:
+        capped.path_for(handles[0])
+        raise AssertionError("最早的结果应当被淘汰")
+    except KeyError:
+        pass
+
+
+async def test_tool_registry():
+    """测试工具定义缓存和参数校验"""
+    print("\n=== 测试工具注册表 ===")
+    import json
+    from benchmarks.fake_llm import ScriptedLLM
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.tools import ResultReader, ToolCollection
+
+    tools = ToolCollection()
+    definitions = tools.get_tool_definitions()
+    assert tools.get_tool_definitions() is definitions
+    tools.register_tool(ResultReader())
+    assert tools.get_tool_definitions() is not definitions and len(tools.get_tool_definitions()) == 4
+
+    assert tools.parse_arguments("bash_execute", '{"command": "ls", "timeout": 5}') == ({"command": "ls", "timeout": 5}, None)
+    _, error = tools.parse_arguments("file_editor", '{"action": "head", "path": "a", "lines": "10"}')
+    print(f"校验错误: {error}")
+    assert error == "参数 lines 的类型应为 integer，实际为 string"
+    assert "缺少必需参数: path" in tools.parse_arguments("file_editor", '{"action": "read"}')[1]
+    assert "不是合法的JSON" in tools.parse_arguments("file_editor", '{"action": ')[1]
+    assert "工具 missing 不存在" in tools.parse_arguments("missing", "{}")[1]
+
+    # 无效的调用不会被分发，错误原样返回给模型
+    calls = [{"name": "file_editor", "arguments": {"action": "remove", "path": "x"}}]
+    agent = MiniAgent(ScriptedLLM([{"tool_calls": calls}]), events=EventBus([NullSink()]))
+    await agent.run("删除文件")
+    await agent.tools.close()
+    tool_message = next(m for m in agent.memory.get_messages() if m["role"] == "tool")
+    assert tool_message["content"].startswith("错误: 参数 action 的取值应为") and "'remove'" in tool_message["content"]
+    assert json.loads(agent.memory.get_messages_json())[-1]["content"] == "任务完成"
+
+
+async def test_agent_server():
+    """测试多会话服务器：流式事件、会话隔离、背压和空闲淘汰后恢复"""
+    print("\n=== 测试多会话服务器 ===")
+    import os
+    import tempfile
+    from benchmarks.fake_llm import ScriptedLLM
+    from benchmarks.load_server import HTTPClient
+    from mini_agent.server import AgentServer
+
+    turns = [{"tool_calls": [
+        {"name": "file_editor", "arguments": {"action": "write", "path": "note.txt", "content": "hello"}},
+        {"name": "file_editor", "arguments": {"action": "read", "path": "../escape.txt"}},
+    ]}]
+    session_dir = tempfile.mkdtemp()
+    server = AgentServer(
+        ScriptedLLM(turns, latency=0.05), max_active_runs=1, max_queued_runs=0,
+        idle_timeout=None, session_dir=session_dir,
+    )
+    await server.start()
+    host, port = server.address
+    first, second = await HTTPClient.connect(host, port), await HTTPClient.connect(host, port)
+    try:
+        status, _, body = await first.request("POST", "/sessions", {"id": "alice", "max_steps": 3})
+        assert status == 201 and body[0]["id"] == "alice"
+        assert (await first.request("POST", "/sessions", {"id": "alice"}))[0] == 409
+        assert (await first.request("POST", "/sessions", {"max_steps": "3"}))[0] == 400
+        await second.request("POST", "/sessions", {"id": "bob"})
+
+        # 同时只能执行一个任务且不允许排队，第二个会话被拒绝
+        run = asyncio.ensure_future(first.request("POST", "/sessions/alice/run", {"task": "写笔记"}))
+        await asyncio.sleep(0.01)
+        status, headers, body = await second.request("POST", "/sessions/bob/run", {"task": "写笔记"})
+        assert status == 429 and headers["retry-after"] == "1"
+        status, _, events = await run
+        types = [event["type"] for event in events]
+        print(f"事件: {types}")
+        assert status == 200 and types[0] == "run_started" and types[-1] == "result"
+        assert events[-1]["result"] == "任务完成" and events[-1]["state"] == "finished"
+        errors = sorted(event["data"]["error"] or "" for event in events if event["type"] == "tool_finished")
+        assert errors == ["", "路径超出工作目录: ../escape.txt"]
+        with open(os.path.join(server.workdir, "alice", "note.txt")) as f:
+            assert f.read() == "hello"
+        assert not os.path.exists(os.path.join(server.workdir, "bob", "note.txt"))
+
+        # 淘汰空闲会话后再次访问时从会话日志恢复
+        assert await server.evict_idle(0) == 2 and not server.sessions
+        status, _, body = await first.request("GET", "/sessions/alice")
+        assert status == 200 and body[0]["messages"] == 5 and server.stats.restored == 1
+        status, _, body = await first.request("POST", "/sessions/alice/run", {"task": "再写一次", "stream": False})
+        assert status == 200 and body[0]["result"] == "任务完成"
+
+        assert (await first.request("DELETE", "/sessions/bob"))[0] == 200
+        assert (await first.request("GET", "/sessions/bob"))[0] == 404
+        assert (await first.request("GET", "/nowhere"))[0] == 404
+        status, _, body = await first.request("GET", "/health")
+        print(f"统计: {body[0]}")
+        assert body[0]["completed_runs"] == 2 and body[0]["rejected"] == 1 and body[0]["sessions"] == 1
+
+        # 删除会话时落盘的工具结果一并删除
+        server.sessions["alice"].agent.result_store.put("x" * 100)
+        assert (await first.request("DELETE", "/sessions/alice"))[0] == 200
+        assert os.listdir(session_dir) == []
+    finally:
+        await first.close()
+        await second.close()
+        await server.close()
+    assert not os.path.exists(server.workdir)
+
+
+async def test_tool_memo():
+    """测试只读工具调用的结果缓存和流式响应中的提前执行"""
+    print("\n=== 测试工具结果缓存 ===")
+    import json
+    import os
+    import tempfile
+    import time
+    from benchmarks.stub_server import FakeOpenAIServer, stream_chunks
+    from mini_agent.events import EventBus, EventSink
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.tools import BaseTool, ToolCollection, ToolResult
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "data.txt")
+    with open(path, "w") as f:
+        f.write("v1\n")
+    tools = ToolCollection()
+    read = {"action": "read", "path": path}
+    first = await tools.execute_tool("file_editor", **read)
+    second = await tools.execute_tool("file_editor", **read)
+    assert not first.cached and second.cached and second.output == "v1\n"
+    await tools.execute_tool("bash_execute", command=f"cat {path}")
+    assert (await tools.execute_tool("bash_execute", command=f"cat {path}")).cached
+    assert not (await tools.execute_tool("bash_execute", command=f"cat {path} | wc -l")).cached
+
+    # 文件被其他进程修改后指纹变化，缓存失效
+    with open(path, "a") as f:
+        f.write("v2\n")
+    third = await tools.execute_tool("file_editor", **read)
+    assert not third.cached and third.output == "v1\nv2\n"
+    # 执行非只读调用后清空缓存
+    await tools.execute_tool("python_execute", code="pass")
+    assert not (await tools.execute_tool("file_editor", **read)).cached
+    print(f"命中 {tools.memo_hits} 次, 未命中 {tools.memo_misses} 次")
+    assert tools.memo_hits == 2
+    await tools.close()
+
+    class SlowReader(BaseTool):
+        name: str = "slow_read"
+        description: str = "慢速读取"
+        parameters: dict = {"type": "object", "properties": {"key": {"type": "string"}}}
+        started: list = []
+
+        def is_read_only(self, **kwargs) -> bool:
+            return True
+
+        async def execute(self, key: str = "", **kwargs) -> ToolResult:
+            self.started.append(time.time())
+            await asyncio.sleep(0.1)
+            return ToolResult(output=f"value of {key}")
+
+    class Recorder(EventSink):
+        def __init__(self):
+            self.events = []
+
+        def handle(self, events):
+            self.events.extend(events)
+
+    tool_calls = [
+        {"id": "call_1", "type": "function", "function": {"name": "slow_read", "arguments": json.dumps({"key": "a"})}},
+        {"id": "call_2", "type": "function", "function": {
+            "name": "file_editor", "arguments": json.dumps({"action": "write", "path": path, "content": "x" * 200})}},
+        {"id": "call_3", "type": "function", "function": {"name": "slow_read", "arguments": json.dumps({"key": "b"})}},
+    ]
+
+    def handler(request):
+        if request["messages"][-1]["role"] == "tool":
+            return stream_chunks(["完成"])
+        return stream_chunks(tool_calls=tool_calls)
+
+    async with FakeOpenAIServer(handler, chunk_delay=0.002) as server:
+        recorder = Recorder()
+        bus = EventBus([recorder])
+        reader = SlowReader()
+        agent = MiniAgent(SimpleLLM(api_key="test", base_url=server.base_url), stream=True, events=bus)
+        agent.tools.register_tool(reader)
+        await agent.run("读取")
+        await agent.tools.close()
+        bus.close()
+    response_at = next(e.timestamp for e in recorder.events if e.type.value == "llm_response")
+    ready = [e.data["speculative"] for e in recorder.events if e.type.value == "tool_call_ready"]
+    print(f"提前执行: {ready}, 第一次读取比整轮响应早 {(response_at - reader.started[0]) * 1000:.0f}ms")
+    # 第一个只读调用在整轮结束前开始；写入之后的调用不提前执行
+    assert ready == [True, False, False] and reader.started[0] < response_at < reader.started[1]
+    tool_messages = [m["content"] for m in agent.memory.get_messages() if m["role"] == "tool"]
+    assert tool_messages[0] == "value of a" and tool_messages[2] == "value of b"
+
+
+async def test_prompt_cache_usage():
+    """测试请求前缀稳定和token用量统计"""
+    print("\n=== 测试提示缓存与用量统计 ===")
+    import json
+    from benchmarks.stub_server import FakeOpenAIServer, stream_chunks
+    from mini_agent.context import ContextManager, SlidingWindowPolicy, TruncateToolOutputPolicy
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.schema import Memory, Message
+    from mini_agent.tokens import count_messages_tokens
+
+    # 超出预算后每次追加一轮：淘汰时腾出余量，之后几步只在末尾追加，请求前缀不变
+    async def prefix_ratio(manager):
+        memory = Memory()
+        memory.add_message(Message.user_message("分析日志"))
+        stable = total = 0
+        for i in range(40):
+            call = {"id": f"c{i}", "type": "function", "function": {"name": "bash_execute", "arguments": "{}"}}
+            memory.add_message(Message.assistant_message(content=f"第{i}步", tool_calls=[call]))
+            memory.add_message(Message.tool_message(content="日志内容 " * 120, tool_call_id=call["id"]))
+            window = await manager.build(memory)
+            assert count_messages_tokens(window) <= manager.budget
+            stable += count_messages_tokens(window[:manager.stable_prefix])
+            total += count_messages_tokens(window)
+        return memory, stable / total
+
+    eager = ContextManager(max_tokens=5000, reserve_tokens=1000, policies=[
+        TruncateToolOutputPolicy(headroom=0), SlidingWindowPolicy(headroom=0)])
+    _, eager_ratio = await prefix_ratio(eager)
+    manager = ContextManager(max_tokens=5000, reserve_tokens=1000)
+    memory, ratio = await prefix_ratio(manager)
+    print(f"请求中与上一次相同的前缀: 无余量 {eager_ratio:.0%}, 默认余量 {ratio:.0%}")
+    assert ratio > 0.4 and ratio > eager_ratio * 3
+    # 记忆被删改后策略状态重置
+    del memory.messages[1:]
+    assert await manager.build(memory) == memory.get_messages() and manager.stable_prefix == 1
+    # 未超预算时不逐条比较也不复制历史：只追加过消息时上一次请求整体是前缀，原地修改后重新计算
+    memory.add_message(Message.user_message("继续"))
+    assert await manager.build(memory) is memory.get_messages() and manager.stable_prefix == 1
+    memory.messages[0] = Message.user_message("改写")
+    await manager.build(memory)
+    assert manager.stable_prefix == 0
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        cached = 0 if len(requests) == 1 else 96
+        usage = {"prompt_tokens": 120, "completion_tokens": 10, "total_tokens": 130,
+                 "prompt_tokens_details": {"cached_tokens": cached}}
+        if len(requests) < 3:
+            call = {"id": f"call_{len(requests)}", "type": "function",
+                    "function": {"name": "python_execute", "arguments": json.dumps({"code": "print(1)"})}}
+            return stream_chunks(tool_calls=[call], usage=usage)
+        return stream_chunks(["完成"], usage=usage)
+
+    async with FakeOpenAIServer(handler) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url)
+        agent = MiniAgent(llm, stream=True, events=EventBus([NullSink()]))
+        await agent.run("计算")
+        await agent.tools.close()
+    assert all(r.get("stream_options") == {"include_usage": True} for r in requests)
+    # 前一次请求的消息是后一次请求的前缀
+    for before, after in zip(requests, requests[1:]):
+        assert after["messages"][:len(before["messages"])] == before["messages"]
+    usage = agent.usage
+    print(f"用量: {usage.calls} 次, 输入 {usage.prompt_tokens}, 缓存命中 {usage.cached_tokens} "
+          f"({usage.cache_hit_rate:.0%}), 输出 {usage.completion_tokens}")
+    assert (usage.calls, usage.prompt_tokens, usage.cached_tokens, usage.completion_tokens) == (3, 360, 192, 30)
+    assert llm.usage.cached_tokens == 192
+
+
+async def test_lazy_imports():
+    """测试包的按需加载：导入代理和工具不导入 openai"""
+    print("\n=== 测试按需导入 ===")
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, mini_agent\n"
+        "assert 'mini_agent.agent' not in sys.modules\n"
+        "from mini_agent import MiniAgent, ToolCollection, SimpleLLM\n"
+        "llm = SimpleLLM(api_key='test')\n"
+        "print(sorted(m for m in ('openai', 'httpx') if m in sys.modules))\n"
+        "llm.client\n"
+        "print('openai' in sys.modules)\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    print(f"构造代理前导入的重量级依赖: {output.splitlines()[0]}, 创建客户端后导入 openai: {output.splitlines()[1]}")
+    assert output.splitlines() == ["[]", "True"]
+    import mini_agent
+    assert "MiniAgent" in dir(mini_agent)
+    try:
+        mini_agent.NoSuchThing
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("未知属性应抛出 AttributeError")
+
+
+async def test_model_router():
+    """测试模型路由：级联升级、按步选择和对冲请求"""
+    print("\n=== 测试模型路由 ===")
+    import json
+    import time
+    from benchmarks.stub_server import FakeOpenAIServer, completion, stream_chunks
+    from mini_agent.errors import LLMError
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.llm import LLMResponse, SimpleLLM, StreamEvent
+    from mini_agent.retry import RetryPolicy
+    from mini_agent.router import CascadeRouter, HedgedLLM, ModelRouter, RouteContext
+
+    def large(request):
+        if request["messages"][-1]["role"] == "user":
+            arguments = json.dumps({"action": "read", "path": "/nonexistent/notes.txt"})
+            return completion(tool_calls=[{"id": "call_1", "type": "function",
+                                           "function": {"name": "file_editor", "arguments": arguments}}])
+        return completion(content="文件不存在")
+
+    # 小模型拒绝回答时立即升级；工具调用失败后的一步直接使用大模型
+    async with FakeOpenAIServer(lambda request: completion(content="抱歉，我无法读取文件")) as small_server, \
+            FakeOpenAIServer(large) as large_server:
+        router = CascadeRouter({
+            "small": SimpleLLM(api_key="test", model="small", base_url=small_server.base_url),
+            "large": SimpleLLM(api_key="test", model="large", base_url=large_server.base_url),
+        })
+        agent = MiniAgent(router, events=EventBus([NullSink()]))
+        await agent.run("读取笔记")
+        await agent.tools.close()
+    decisions = list(router.log.decisions)
+    print(f"级联: {[(d.model, d.reason, d.attempts) for d in decisions]}")
+    assert agent.memory.get_messages()[-1]["content"] == "文件不存在"
+    assert [(d.model, d.reason, d.attempts) for d in decisions] == [
+        ("large", "refusal", ["small", "large"]), ("large", "tool_errors", ["large"])]
+    assert len(small_server.requests) == 1 and router.log.summary()["models"] == {"large": 2}
+
+    select = ModelRouter({"a": None, "b": None}, select=lambda ctx: "b" if ctx.step > 1 else "a")
+    history = [{"role": "user", "content": "x"},
+               {"role": "assistant", "content": None, "tool_calls": [{"function": {"name": "bash_execute"}}]},
+               {"role": "tool", "content": "错误: 超时", "tool_call_id": "1"}]
+    context = RouteContext.from_messages(history)
+    assert (context.step, context.tool_errors, context.last_tools) == (2, 1, ["bash_execute"])
+    assert select.route(context) == ("b", "select") and select.route(RouteContext.from_messages(history[:1]))[0] == "a"
+
+    # 主端点超过阈值未响应时请求备用端点，采用先返回的结果
+    async def slow(request):
+        await asyncio.sleep(0.5)
+        return stream_chunks(["慢"]) if request.get("stream") else completion(content="慢")
+
+    def fast(request):
+        return stream_chunks(["快"]) if request.get("stream") else completion(content="快")
+
+    async with FakeOpenAIServer(slow) as slow_server, FakeOpenAIServer(fast) as fast_server:
+        hedged = HedgedLLM(
+            SimpleLLM(api_key="test", model="m", base_url=slow_server.base_url),
+            SimpleLLM(api_key="test", model="m", base_url=fast_server.base_url),
+            initial_delay=0.05,
+        )
+        messages = [{"role": "user", "content": "你好"}]
+        start = time.perf_counter()
+        response = await hedged.chat(messages)
+        elapsed = time.perf_counter() - start
+        stream = hedged.chat_stream(messages)
+        deltas = [event.delta async for event in stream if event.type == "content"]
+        streamed = await stream.get_response()
+        print(f"对冲: {response.content} ({elapsed * 1000:.0f}ms), 流式 {deltas}, 对冲 {hedged.hedges} 次")
+        assert response.content == "快" and elapsed < 0.4 and deltas == ["快"] and streamed.content == "快"
+        assert hedged.hedges == hedged.backup_wins == 2
+        assert [(d.reason, d.hedged, d.stream) for d in hedged.log.decisions] == [
+            ("backup", True, False), ("backup", True, True)]
+
+        # 主端点足够快时不发出对冲请求，阈值随主端点的延迟分布调整
+        fast_first = HedgedLLM(
+            SimpleLLM(api_key="test", base_url=fast_server.base_url),
+            SimpleLLM(api_key="test", base_url=slow_server.base_url),
+            min_samples=3, initial_delay=1.0,
+        )
+        for _ in range(3):
+            assert (await fast_first.chat(messages)).content == "快"
+        assert fast_first.hedges == 0 and fast_first.hedge_delay() < 0.5
+
+    # 放弃读取的流关闭底层的HTTP响应
+    async with FakeOpenAIServer(lambda request: stream_chunks(["一", "二", "三"]), chunk_delay=0.2) as server:
+        llm_stream = SimpleLLM(api_key="test", base_url=server.base_url).chat_stream(messages)
+        assert (await llm_stream.__aiter__().__anext__()).delta == "一"
+        raw = llm_stream._stream
+        await llm_stream.aclose()
+        assert raw.response.is_closed
+
+    # 流式对冲中落败一方的流被关闭，而不只是停止读取
+    class FakeStream:
+        def __init__(self, delay, text):
+            self.delay, self.text, self.closed = delay, text, False
+            self._iterator = None
+
+        def __aiter__(self):
+            if self._iterator is None:
+                self._iterator = self._events()
+            return self._iterator
+
+        async def _events(self):
+            await asyncio.sleep(self.delay)
+            yield StreamEvent(type="content", delta=self.text)
+
+        async def aclose(self):
+            self.closed = True
+
+        async def get_response(self):
+            return LLMResponse(content=self.text)
+
+    class FakeStreamLLM:
+        def __init__(self, delay, text):
+            self.model, self.delay, self.text, self.streams = text, delay, text, []
+
+        def chat_stream(self, messages, system_prompt=None, tools=None):
+            self.streams.append(FakeStream(self.delay, self.text))
+            return self.streams[-1]
+
+    primary, backup = FakeStreamLLM(1.0, "慢"), FakeStreamLLM(0.0, "快")
+    stream = HedgedLLM(primary, backup, initial_delay=0.05).chat_stream(messages)
+    assert (await stream.get_response()).content == "快"
+    print(f"落败的流已关闭: {primary.streams[0].closed}")
+    assert primary.streams[0].closed and not backup.streams[0].closed
+
+    # 步骤超出截止时间时，代理关闭进行中的流
+    slow = FakeStreamLLM(5.0, "慢")
+    agent = MiniAgent(slow, stream=True, step_timeout=0.05, events=EventBus([NullSink()]))
+    agent.DEADLINE_GRACE = 0.05
+    await agent.run("你好")
+    assert agent.result.stop_reason.value == "step_deadline" and slow.streams[0].closed
+
+    async with FakeOpenAIServer(lambda request: {"_status": 400, "error": {"message": "bad"}}) as bad_server:
+        failing = HedgedLLM(
+            SimpleLLM(api_key="test", base_url=bad_server.base_url, retry=RetryPolicy(max_retries=0)),
+            SimpleLLM(api_key="test", base_url=bad_server.base_url, retry=RetryPolicy(max_retries=0)),
+        )
+        try:
+            await failing.chat(messages)
+        except LLMError:
+            pass
+        else:
+            raise AssertionError("两个端点都失败时应抛出 LLMError")
+        assert failing.log.decisions[-1].reason == "failed"
+
+        # 主端点在对冲阈值之前失败时改用备用端点，普通请求和流式请求都一样
+        def ok(request):
+            return stream_chunks(["备用"]) if request.get("stream") else completion(content="备用")
+
+        async with FakeOpenAIServer(ok) as good_server:
+            failover = HedgedLLM(
+                SimpleLLM(api_key="test", base_url=bad_server.base_url, retry=RetryPolicy(max_retries=0)),
+                SimpleLLM(api_key="test", base_url=good_server.base_url), initial_delay=5.0,
+            )
+            start = time.monotonic()
+            response = await failover.chat(messages)
+            streamed = await failover.chat_stream(messages).get_response()
+            print(f"主端点失败后改用备用端点: {response.content}, 耗时 {time.monotonic() - start:.2f}s")
+            assert response.content == streamed.content == "备用" and time.monotonic() - start < 2.0
+            assert [d.reason for d in failover.log.decisions] == ["backup", "backup"] and failover.backup_wins == 2
+
+
+async def test_deadlines():
+    """测试截止时间：超时的步骤被取消，子进程终止，返回部分结果和停止原因"""
+    print("\n=== 测试截止时间 ===")
+    import os
+    import time
+    from benchmarks.fake_llm import ScriptedLLM
+    from benchmarks.stub_server import FakeOpenAIServer, completion
+    from mini_agent.deadline import deadline_scope, remaining
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.llm import SimpleLLM
+    from mini_agent.schema import AgentState, StopReason
+
+    with deadline_scope(timeout=10) as outer:
+        with deadline_scope(timeout=60) as inner:
+            assert inner == outer and remaining() <= 10  # 嵌套的作用域不能延长截止时间
+    assert remaining() is None
+
+    # 每步截止时间：慢工具被取消，子进程随之终止，记忆中的工具调用都有结果
+    marker = "deadline_marker.txt"
+    turns = [{"tool_calls": [{"name": "bash_execute", "arguments": {"command": f"sleep 1 && echo done > {marker}"}}]}]
+    agent = MiniAgent(ScriptedLLM(turns), events=EventBus([NullSink()]), step_timeout=0.3)
+    start = time.monotonic()
+    await agent.run("执行慢命令")
+    elapsed = time.monotonic() - start
+    await asyncio.sleep(1.2)
+    await agent.tools.close()
+    messages = agent.memory.get_messages()
+    print(f"每步截止: {agent.result.stop_reason.value}，耗时 {elapsed:.2f}s，结果: {messages[-1]['content']}")
+    assert agent.result.stop_reason == StopReason.STEP_DEADLINE and not agent.result.completed
+    assert elapsed < 1.0 and not os.path.exists(marker)
+    assert messages[-1]["role"] == "tool" and "截止时间" in messages[-1]["content"]
+
+    # 整体截止时间：进行中的LLM请求被取消，不再重试
+    async def slow(request):
+        await asyncio.sleep(2)
+        return completion(content="太晚了")
+
+    async with FakeOpenAIServer(slow) as server:
+        llm = SimpleLLM(api_key="test", base_url=server.base_url)
+        agent = MiniAgent(llm, events=EventBus([NullSink()]))
+        start = time.monotonic()
+        summary = await agent.run("你好", timeout=0.3)
+        elapsed = time.monotonic() - start
+        await agent.tools.close()
+    print(f"整体截止: {agent.result.stop_reason.value}，耗时 {elapsed:.2f}s")
+    assert agent.result.stop_reason == StopReason.DEADLINE and elapsed < 1.5
+    assert len(server.requests) <= 1 and "deadline" in summary
+
+    # 其他异常停止为 ERROR，而不是当作完成
+    class Broken:
+        model = "broken"
+
+        async def chat(self, messages, system_prompt=None, tools=None):
+            raise ValueError("坏掉了")
+
+    agent = MiniAgent(Broken(), events=EventBus([NullSink()]))
+    await agent.run("你好")
+    await agent.tools.close()
+    assert agent.result.stop_reason == StopReason.ERROR and agent.state == AgentState.ERROR
+    assert "坏掉了" in agent.result.error
+
+
+async def test_workers():
+    """测试多进程工作队列：租约、心跳、崩溃后重新分配和结果汇总"""
+    print("\n=== 测试多进程工作队列 ===")
+    import os
+    import tempfile
+    import time
+    from functools import partial
+    from mini_agent.batch import BatchResult, BatchTask
+    from mini_agent.events import EventBus, NullSink
+    from mini_agent.taskqueue import TaskQueue
+    from mini_agent.workers import Supervisor
+
+    directory = tempfile.mkdtemp()
+    queue = TaskQueue(os.path.join(directory, "queue.db"), lease_seconds=0.2, max_attempts=2)
+    tasks = [BatchTask(id=str(index), task=f"任务 {index}") for index in range(3)]
+    assert queue.put(tasks) == 3 and queue.put(tasks) == 0  # 重复的任务ID被忽略
+
+    # 租约过期的任务被其他工作进程接手，原来的进程不能再提交结果
+    first = queue.lease("a", 2)
+    assert [task.id for task in first] == ["0", "1"] and queue.heartbeat("a", ["0", "1"]) == []
+    await asyncio.sleep(0.25)
+    second = queue.lease("b", 3)
+    assert [task.id for task in second] == ["0", "1", "2"] and queue.heartbeat("a", ["0", "1"]) == ["0", "1"]
+    assert not queue.complete("a", BatchResult(id="0", task="任务 0", state="finished"))
+    assert queue.complete("b", BatchResult(id="0", task="任务 0", state="finished"))
+    # 崩溃的进程的任务立即放回队列，用完尝试次数的任务标记为失败
+    assert queue.release("b") == 1
+    stats = queue.stats()
+    print(f"队列统计: {stats}")
+    assert (stats.done, stats.queued, stats.failed, stats.retried) == (1, 1, 1, 2)
+    assert stats.by_worker == {"b": 2}
+    queue.close()
+
+    # 多个工作进程执行任务；"崩溃"任务的 bash 命令杀死所在的工作进程，监督进程放回任务并启动替代进程，
+    # 用完尝试次数后标记为失败，其他任务不受影响
+    path = os.path.join(directory, "supervised.db")
+    queue = TaskQueue(path)
+    crash = [{"tool_calls": [{"name": "bash_execute", "arguments": {"command": "kill -9 $PPID"}}]}]
+    queue.put([BatchTask(id="crash", task="崩溃", max_steps=3)])
+    queue.put(BatchTask(id=str(index), task=f"任务 {index}") for index in range(8))
+    turns = [{"tool_calls": [{"name": "file_editor", "arguments": {"action": "list", "path": "."}}]}]
+    supervisor = Supervisor(
+        path, partial(CrashingLLM, turns, crash), workers=2, concurrency=1,
+        max_attempts=2, poll_interval=0.05, events=EventBus([NullSink()]),
+    )
+    start = time.monotonic()
+    stats = supervisor.run()
+    results = {result.id: result for result in TaskQueue(path).results()}
+    print(f"多进程: 完成 {stats.done}，失败 {stats.failed}，重启 {supervisor.restarts} 次，"
+          f"耗时 {time.monotonic() - start:.2f}s，各进程 {stats.by_worker}")
+    assert stats.pending == 0 and stats.done == 8 and stats.failed == 1
+    assert supervisor.restarts == 2 and len(stats.by_worker) >= 2
+    assert "异常退出" in results["crash"].error
+    assert all(results[str(index)].result == "任务完成" for index in range(8))
+
+    # 其他进程长时间持有写锁时，队列操作在线程中等锁，事件循环不被阻塞；等锁超时后重试，任务照常完成
+    import sqlite3
+    from benchmarks.fake_llm import ScriptedLLM
+    from mini_agent.workers import Worker
+    path = os.path.join(directory, "locked.db")
+    queue = TaskQueue(path, lease_seconds=1.0)
+    assert queue.busy_timeout == 0.25
+    queue.put(BatchTask(id=str(index), task=f"任务 {index}") for index in range(4))
+    worker = Worker(queue, ScriptedLLM(turns, latency=0.05), "w", concurrency=2, poll_interval=0.05)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    gaps = []
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+
+    ticking = asyncio.ensure_future(ticker())
+    running = asyncio.ensure_future(worker.run())
+    await asyncio.sleep(0.6)  # 超过 busy_timeout，领取等锁超时
+    blocker.execute("COMMIT")
+    blocker.close()
+    assert await asyncio.wait_for(running, 10) == 4
+    ticking.cancel()
+    print(f"写锁被占用时事件循环最长停顿: {max(gaps) * 1000:.0f}ms")
+    assert max(gaps) < 0.2 and queue.stats().done == 4
+    queue.close()
+
+
+class CrashingLLM:
+    """多进程测试用：任务"崩溃"回放 crash 轨迹，其他任务回放 turns（模块级，可被 pickle）"""
+
+    def __init__(self, turns, crash):
+        from benchmarks.fake_llm import ScriptedLLM
+        self.model = "crashing"
+        self.normal = ScriptedLLM(turns, latency=0.05)
+        self.crash = ScriptedLLM(crash)
+
+    async def chat(self, messages, system_prompt=None, tools=None):
+        task = next(message["content"] for message in messages if message["role"] == "user")
+        llm = self.crash if task == "崩溃" else self.normal
+        return await llm.chat(messages, system_prompt, tools)
+
+
 async def main():
     """主测试函数"""
     print("🧪 MiniAgent 功能测试")
     print("注意: 这个测试不需要API密钥，只测试基础功能")
     
     await test_tools()
+    await test_file_editor()
+    await test_bash_executor()
+    await test_python_sandbox()
     await test_agent_without_llm()
+    await test_parallel_tool_calls()
+    await test_llm_stream()
+    await test_memory_cache()
+    await test_message_store()
+    await test_context_manager()
+    await test_response_cache()
+    await test_batch_runner()
+    await test_client_registry()
+    await test_llm_retry()
+    await test_tracing()
+    await test_event_bus()
+    await test_benchmark_suite()
+    await test_session_log()
+    await test_result_store()
+    await test_tool_registry()
+    await test_agent_server()
+    await test_tool_memo()
+    await test_prompt_cache_usage()
+    await test_lazy_imports()
+    await test_model_router()
+    await test_deadlines()
+    await test_workers()
     
     print("\n✅ 基础功能测试完成!")
     print("💡 要测试完整功能，请运行 main_mini.py 并设置 OPENAI_API_KEY")